@@ -1,32 +1,76 @@
+import json
 import os
 import shlex
+import signal
+import sys
 import time
 import subprocess
 
+from monotonic import monotonic  # Monotonic time to avoid issues from NTP adjustments
+
+import background
+import calibration
+import captures
+import fct
+import kernel_counters
+import owd
+from link_events import LinkEventScheduler
+from resource_monitor import ResourceMonitor, is_saturated
+from supervisor import Scope
 from MPTopoligies import MPMininetWrapper
 from mininet.cli import CLI
-from mininet.log import error, info, debug, output
+from mininet.log import error, info, debug, output, warn
 from mininet.util import errFail
 from mininet.link import TCLink
 
-from utils import MPTCP_CCS, system_call
+from topo_config import SUBFLOW_PATH_MANAGERS, path_bottleneck, path_delay, path_serialization
+from utils import MPTCP_CCS, MPTCP_MODULES, MPTCP_SYSCTLS, SUBFLOWS_PARAMETER, get_system_mptcp_settings, \
+    get_system_subflows, load_mptcp_module, system_call
 
 
 class MPMininetExp:
     """Create and run a multi-path network"""
-    def __init__(self, repetition_number, topology, start_cli=False, use_tcpdump=True, keep_tcpdumps=True):
+    def __init__(self, repetition_number, topology, start_cli=False, use_tcpdump=True, keep_tcpdumps=True,
+                 queue_rate=None, runtime=60, time_interval=0.1, base_folder='./logs', scope=None, compression='gzip',
+                 snaplen=None, keep_filter=None, one_way=False, processes=None, fct_workload=None):
         """
         :param repetition_number: number to distinguish different runs of same configuration
         :param topology:        Topology given to Mininet to build network
         :param start_cli:       Start Minient CLI instead of running iperf3
         :param use_tcpdump:     capture pcap file with tcpdump
         :param keep_tcpdumps:   keep pcap files in the end after extracting pkt rtts
+        :param queue_rate:      sample the bottleneck queues with given rate [Hz] during the experiment, None disables
+        :param runtime:         how long [seconds] to run iperf
+        :param time_interval:   time step between iperf output lines
+        :param base_folder:     root of the log tree
+        :param scope:           supervisor.Scope recording what the experiment creates, a failed experiment is cleaned
+                                up through it
+        :param compression:     compress captures on the fly, see captures.COMPRESSORS, None stores them uncompressed
+        :param snaplen:         bytes captured per packet, None captures whole packets
+        :param keep_filter:     tshark display filter, kept captures are reduced to the matching packets
+        :param one_way:         capture at the servers as well and derive one-way and queueing delays per packet
+        :param processes:       cores used to analyze the captures, default all
+        :param fct_workload:    run the short transfers of this FCT workload instead of iperf bulk transfers and log
+                                below <base_folder>/fct, see fct.py
         """
-        self.base_folder = './logs'
+        self.base_folder = base_folder
         self.topo = topology
         self.rep_num = repetition_number
         self.use_tcpdump, self.keep_dumps = use_tcpdump, keep_tcpdumps
+        self.compression, self.snaplen = captures.check_compression(compression), snaplen
+        self.keep_filter = keep_filter
+        self.one_way = one_way and use_tcpdump
+        self.processes = processes
+        self.fct_workload = fct_workload
+        if self.one_way and getattr(topology, 'config', None) is None:
+            raise ValueError('One-way delays need the paths of a compiled topology config (JsonTopo).')
+        self.queue_rate = queue_rate
+        self.runtime, self.time_interval = runtime, time_interval
         self.net, self.out_folder = None, None
+        self.saturated = False  # host machine passed the saturation thresholds, results are not trustworthy
+        self.phases = {}  # duration [s] per phase of the experiment
+        self.t0 = None  # start of the measured flows on the monotonic and the wall clock [s]
+        self.scope = scope or Scope('{} repetition {}'.format(self.topo.get_logs_dir(), self.rep_num))
 
         # Setup network and start experiment
         self.setup()
@@ -34,7 +78,8 @@ class MPMininetExp:
 
     def setup(self):
         # Print info and setup folders
-        self.out_folder = os.path.join(self.base_folder, self.topo.get_logs_dir())
+        self.out_folder = os.path.join(fct.log_folder(self.base_folder, self.fct_workload or {}),
+                                       self.topo.get_logs_dir())
 
         output('Setting up experiment, exp {} repetition: {}\n'.format(self.out_folder, self.rep_num))
         if not os.path.exists(self.out_folder):
@@ -47,6 +92,8 @@ class MPMininetExp:
             raise NotImplementedError('Running a non mptcp and a mptcp congestion control algorithm simultaneously is '
                                       'not supported. {}\n'.format(ccs))
         self.set_sysctl_variable('net.mptcp.mptcp_enabled', int(any(is_mptcp)))
+        if any(is_mptcp) and getattr(self.topo, 'config', None) is not None:
+            self.set_mptcp_settings(self.topo.config.mptcp)
 
     def start(self, cli, skipping=True):
         """
@@ -56,23 +103,118 @@ class MPMininetExp:
         :param skipping: skip already existing experiments, else overwrite logs
         :return:        None
         """
-        if skipping and os.path.isfile('{}/{}_{}_iperf_dump.csv'.format(self.out_folder, self.rep_num, 'h1')):
-            output('\talready done.\n')
-            return
+        first_client = self.topo.get_host_pairings()[0][0]
+        resources_file = '{}/{}_resources.json'.format(self.out_folder, self.rep_num)
+        if skipping and os.path.isfile('{}/{}_{}_iperf_dump.csv'.format(self.out_folder, self.rep_num, first_client)):
+            if self.completed(self.out_folder, self.rep_num, first_client):
+                output('\talready done.\n')
+                return
+            output('\tinvalidated by saturation, repeating.\n')
 
         # add host=CPULimitedHost if applicable
+        t = monotonic()
         self.net = MPMininetWrapper(topo=self.topo, link=TCLink)
+        self.scope.track_network(self.net)
         self.net.start()
+        if any(self.topo.nodeInfo(s).get('stp') for s in self.topo.switches()):
+            # bridges only forward traffic once the spanning tree converged
+            self.net.waitConnected()
+        self.phases['setup'] = monotonic() - t
 
         if cli:
             CLI(self.net)
         else:
             # self.run()
-            self.run_iperf()
-
+            t = monotonic()
+            monitor = ResourceMonitor()
+            monitor.start()
+            self.scope.on_cleanup(monitor.stop)
+            self.run_iperf(self.runtime, self.time_interval)
+            monitor.stop()
+            self.scope.release(monitor.stop)
+            self.phases['iperf'] = monotonic() - t
+
+            summary = monitor.write(resources_file, calibration=self.calibration_reference())
+            self.saturated = summary['saturated']
+            if self.saturated:
+                warn('Host machine saturated during experiment, results are invalid: {}\n'.format(
+                    ', '.join(summary['reasons'])))
+
+            if self.one_way:
+                # needs the client captures, before calculate_rtt removes them
+                t = monotonic()
+                self.calculate_owd(keep_pcap=self.keep_dumps)
+                self.phases['owd'] = monotonic() - t
+
+            t = monotonic()
             self.calculate_rtt(keep_pcap=self.keep_dumps)
+            self.phases['rtt'] = monotonic() - t
+
+        t = monotonic()
+        self.scope.cleanup()
+        self.phases['teardown'] = monotonic() - t
+
+    @staticmethod
+    def completed(out_folder, rep_num, first_client):
+        """ Whether a repetition already ran and was not invalidated by a saturated host. """
+        return os.path.isfile('{}/{}_{}_iperf_dump.csv'.format(out_folder, rep_num, first_client)) and \
+            not is_saturated('{}/{}_resources.json'.format(out_folder, rep_num))
+
+    def calibration_reference(self):
+        """
+        Reference to the fidelity report of the emulated links, warns if the links can not be emulated accurately.
+
+        :return:    dict with report file and whether the emulation is accurate, None if not calibrated
+        """
+        config = getattr(self.topo, 'config', None)
+        report = calibration.load_report(config, self.base_folder) if config is not None else None
+        if report is None:
+            debug('Links of {} are not calibrated, see --run calibrate\n'.format(self.topo.get_logs_dir()))
+            return None
+        if not report['accurate']:
+            warn('Calibration of {} flags inaccurate link emulation: {}\n'.format(
+                config.topology_id, calibration.report_file(config, self.base_folder)))
+        return {'file': calibration.report_file(config, self.base_folder), 'accurate': report['accurate']}
+
+    def set_mptcp_settings(self, settings):
+        """
+        Set and verify scheduler, path manager, subflows and checksum. Settings which are not given are restored to the
+        values of the system, experiments of a sweep do not inherit the settings of the previous one.
+
+        :param settings:    dict with any of topo_config.MPTCP_SETTINGS
+        :return:            None
+        """
+        system = get_system_mptcp_settings()
+        scheduler = settings.get('scheduler', system['scheduler'])
+        path_manager = settings.get('path_manager', system['path_manager'])
+        load_mptcp_module(scheduler)
+        load_mptcp_module(path_manager)
+        self.set_sysctl_variable(MPTCP_SYSCTLS['scheduler'], scheduler)
+        self.set_sysctl_variable(MPTCP_SYSCTLS['path_manager'], path_manager)
+        self.set_sysctl_variable(MPTCP_SYSCTLS['checksum'], int(settings.get('checksum', system['checksum'])))
+
+        # subflows are a parameter of the path manager module and not a sysctl
+        if path_manager in SUBFLOW_PATH_MANAGERS:
+            default = get_system_subflows(path_manager)
+            self.set_module_parameter(SUBFLOWS_PARAMETER.format(MPTCP_MODULES[path_manager]),
+                                      settings.get('subflows', default))
+
+    @staticmethod
+    def set_module_parameter(file_name, value):
+        """
+        Set and verify a writable kernel module parameter.
 
-        self.net.stop()
+        :param file_name:   parameter file, e.g. '/sys/module/mptcp_fullmesh/parameters/num_subflows'
+        :param value:       parameter value
+        :return:            None
+        """
+        with open(file_name, 'w') as f:
+            f.write(str(value))
+        with open(file_name) as f:
+            out = f.read().strip()
+        if out != str(value):
+            raise Exception("Module parameter Fail: setting {} failed, should be {} is {}".format(file_name, value,
+                                                                                                   out))
 
     @staticmethod
     def set_sysctl_variable(var, value):
@@ -122,6 +264,55 @@ class MPMininetExp:
 
         return map(str, client_cmd), map(str, server_cmd)
 
+    def get_fct_cmds(self, client, server, runtime, cc):
+        """
+        Generate the commands of the FCT workload to run on client/server pair, see fct.py.
+
+        :param runtime:     seconds during which the client starts transfers
+        :return:            tuple (cli_cmd, srv_cmd)
+        """
+        file_name = '{}/{}_'.format(self.out_folder, self.rep_num)
+        # the repetition seeds the sizes, every congestion control transfers the same sizes
+        client_cmd = fct.client_cmd(server.IP(), runtime, self.fct_workload, file_name + '{}_fct.csv'.format(client),
+                                    cc=cc, seed=self.rep_num)
+        client_cmd += ['&>', file_name + '{}_fct.log'.format(client)]
+        server_cmd = fct.server_cmd() + ['&>', file_name + '{}_fct.log'.format(server)]
+        return client_cmd, server_cmd
+
+    def get_queue_intfs(self):
+        """
+        Interfaces of the bottleneck links of all paths to monitor. Only switch interfaces are monitored as the monitor
+        runs in the root namespace, i.e. a bottleneck attached to a host is only monitored in direction of the host.
+
+        :return:    list of interface names
+        """
+        config = getattr(self.topo, 'config', None)
+        if config is None:
+            warn('Queue monitoring requires a topology compiled from JSON, skipping.\n')
+            return []
+
+        intfs = []
+        for i in sorted(set(path_bottleneck(config.links, path) for path in config.paths)):
+            link = self.net.config_link(config, i)
+            intfs += [intf.name for intf in (link.intf1, link.intf2)
+                      if not intf.node.inNamespace and intf.name not in intfs]
+        return intfs
+
+    def start_queue_monitor(self):
+        """
+        Start the queue monitor as separate process, keeping the sampling loop away from the experiment control.
+
+        :return:    monitor process or None if there is nothing to monitor
+        """
+        intfs = self.get_queue_intfs()
+        if not intfs:
+            return None
+        script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'queue_monitor.py')
+        out_file = '{}/{}_queues.npz'.format(self.out_folder, self.rep_num)
+        monitor_cmd = [sys.executable, script, '-i', ','.join(intfs), '-r', str(self.queue_rate), '-o', out_file]
+        info('Running \'{}\'\n'.format(' '.join(monitor_cmd)))
+        return subprocess.Popen(monitor_cmd)
+
     def run_iperf(self, runtime=60, time_interval=0.1):
         """
         Starting iperf3 on appropriate hosts using the cmp interface provided by minient.
@@ -139,33 +330,75 @@ class MPMininetExp:
         # Generate iperf commands for both server and client
         iperf_cmds = {}  # map host to iperf cmd
         for cli, srv, cc in iperf_pairs:
-            cli_cmd, srv_cmd = self.get_iperf3_cmds(cli, srv, runtime, time_interval, cc)
+            if self.fct_workload:
+                cli_cmd, srv_cmd = self.get_fct_cmds(cli, srv, runtime, cc)
+            else:
+                cli_cmd, srv_cmd = self.get_iperf3_cmds(cli, srv, runtime, time_interval, cc)
             iperf_cmds[cli] = cli_cmd
             iperf_cmds[srv] = srv_cmd
 
+        # Prepare link changes during the experiment, given by the topology
+        config = getattr(self.topo, 'config', None)
+        link_events = None
+        if config is not None and config.link_events:
+            link_events = LinkEventScheduler(self.net, config,
+                                             '{}/{}_link_events.csv'.format(self.out_folder, self.rep_num))
+            self.scope.on_cleanup(link_events.stop)
+
+        queue_monitor = self.scope.track_process(self.start_queue_monitor() if self.queue_rate else None)
+        counters = {host: kernel_counters.snapshot(host) for host in self.net.hosts}
+        background_flows, sink_hosts = self.background_hosts()
+        # background traffic is not part of the measured flows and its port is excluded from their captures
+        port_filter = ' and not port {}'.format(background.PORT) if sink_hosts else ''
+
+        sinks = {}
+        for host in sink_hosts:
+            sinks[host] = self.scope.track_pid(background.start(host, 'sink', '{}/{}_{}_background_sink.csv'.format(
+                self.out_folder, self.rep_num, host)))
+
         # Start processes on client and server
         for _, server, _ in iperf_pairs:
             info('Running on {}: \'{}\'\n'.format(server, ' '.join(iperf_cmds[server])))
             server.sendCmd(iperf_cmds[server])
         time.sleep(1)
 
+        t0 = monotonic()
+        # queue samples are taken on the monotonic clock, captures on the wall clock, the analysis aligns both to t0
+        self.t0 = {'monotonic': t0, 'epoch': time.time()}
+        with open('{}/{}_t0.json'.format(self.out_folder, self.rep_num), 'w') as f:
+            json.dump(self.t0, f)
+        generators = {}
+        for host, flows in background_flows.items():
+            generators[host] = self.scope.track_pid(background.start(
+                host, 'generate', '{}/{}_{}_background.csv'.format(self.out_folder, self.rep_num, host), flows,
+                seed=self.rep_num))
+
+        dumps, server_dumps = {}, {}
         for client, server, cc in iperf_pairs:
             if self.use_tcpdump:
-                pcap_filter = ' or '.join(['host {}'.format(intf.IP()) for intf in server.intfList()])
+                # Note: `and` and `or` have the same precedence in capture filters and associate left to right
+                pcap_filter = ' or '.join(['host {}'.format(intf.IP()) for intf in server.intfList()]) + port_filter
                 pcap_file = '{}/{}_{}_iperf_dump.pcap'.format(self.out_folder, self.rep_num, client)
-                dump_cmd = ['tcpdump', '-i', 'any', '-w', pcap_file]
-                dump_cmd += shlex.split(pcap_filter)
-                dump_cmd += ['&>', '/dev/null', '&']  # Note: trailing `&` lets the command run in the background
-                dump_cmd = map(str, dump_cmd)
-
-                info('Running on {}: \'{}\'\n'.format(client, ' '.join(dump_cmd)))
-                client.cmd(dump_cmd)
+                _, dump_pid, compressor_pid = captures.start_capture(client, pcap_file, pcap_filter,
+                                                                     self.compression, self.snaplen)
+                # only this capture is stopped later, other experiments on the machine keep theirs
+                dumps[client] = (pcap_file, self.scope.track_pid(dump_pid), self.scope.track_pid(compressor_pid))
+            if self.one_way:
+                pcap_filter = ' or '.join(['host {}'.format(intf.IP()) for intf in client.intfList()]) + port_filter
+                pcap_file = '{}/{}_{}_server_dump.pcap'.format(self.out_folder, self.rep_num, client)
+                _, dump_pid, compressor_pid = captures.start_capture(server, pcap_file, pcap_filter,
+                                                                     self.compression, self.snaplen)
+                server_dumps[client] = (server, pcap_file, self.scope.track_pid(dump_pid),
+                                        self.scope.track_pid(compressor_pid))
 
             # Note: check the exit code of iperf with `$?`
             cli_cmd = iperf_cmds[client] + [';', 'echo', '$?']
             info('Running on {}: \'{}\'\n'.format(client, ' '.join(cli_cmd)))
             client.sendCmd(cli_cmd)
 
+        if link_events is not None:
+            link_events.start(t0)
+
         # Wait for completion and stop all processes
         for client, _, _ in iperf_pairs:
             o = client.waitOutput()
@@ -175,8 +408,33 @@ class MPMininetExp:
                 raise RuntimeError('Client iperf did not exit correctly, error code {}\n'.format(o.strip()),
                                    self.out_folder, self.rep_num)
 
-            # interrupt tcpdump
-            client.cmd('pkill -SIGINT tcpdump')
+            # interrupt tcpdump and wait until the capture is flushed and compressed
+            if client in dumps:
+                captures.stop_capture(client, *dumps[client])
+                for pid in dumps[client][1:]:
+                    self.scope.release(pid)
+            if client in server_dumps:
+                captures.stop_capture(*server_dumps[client])
+                for pid in server_dumps[client][2:]:
+                    self.scope.release(pid)
+
+        if link_events is not None:
+            link_events.stop()
+            self.scope.release(link_events.stop)
+        # generators first, their short flows complete once the sinks closed the connections
+        for processes in (generators, sinks):
+            for host, pid in processes.items():
+                background.stop(host, pid)
+                self.scope.release(pid)
+        if generators:
+            prefix = '{}/{}_'.format(self.out_folder, self.rep_num)
+            background.write_summary(prefix + 'background.json',
+                                     ['{}{}_background.csv'.format(prefix, host) for host in generators],
+                                     ['{}{}_background_sink.csv'.format(prefix, host) for host in sinks])
+        if queue_monitor is not None:
+            queue_monitor.send_signal(signal.SIGINT)
+            queue_monitor.wait()
+            self.scope.release(queue_monitor)
 
         # Send interrupt to iperf3 servers and wait for completion, without waiting mininet will fail on assertion
         for _, server, _ in iperf_pairs:
@@ -184,9 +442,28 @@ class MPMininetExp:
             _ = server.monitor(timeoutms=100)
 
         time.sleep(1)
+        for host, before in counters.items():
+            kernel_counters.write_deltas('{}/{}_{}_nstat.json'.format(self.out_folder, self.rep_num, host), before,
+                                         kernel_counters.snapshot(host))
+
         output('\t\tDone with experiment, cleanup\n')
-        system_call('pkill iperf3', ignore_codes=[1])
-        system_call('pkill tcpdump', ignore_codes=[1])
+
+    def background_hosts(self):
+        """
+        Hosts sending and receiving the background traffic of the topology, see background.py.
+
+        :return:    tuple (dict generating host -> flow specs, list of receiving hosts)
+        """
+        config = getattr(self.topo, 'config', None)
+        if config is None or not config.background:
+            return {}, []
+
+        def address(host, interface):
+            return self.net.get(host).intf('{}-eth{}'.format(host, interface)).IP()
+        generators = {self.net.get(host): background.flow_specs(config, host, address)
+                      for host in set(flow.source for flow in config.background)}
+        sinks = [self.net.get(host) for host in sorted(set(flow.target for flow in config.background))]
+        return generators, sinks
 
     def calculate_rtt(self, keep_pcap):
         """
@@ -199,19 +476,46 @@ class MPMininetExp:
             info('No dumps to analyze continue.\n')
             return
 
+        jobs = []
         for client, _, _ in self.get_iperf_pairings():
-            pcap_file = '{}/{}_{}_iperf_dump.pcap'.format(self.out_folder, self.rep_num, client)
-            out_file = '{}/{}_{}_iperf_dump.csv'.format(self.out_folder, self.rep_num, client)
-            parse_cmd = ['tshark', '-r', pcap_file]
-            parse_cmd += ['-e', 'frame.time_relative', '-e', 'tcp.stream', '-e', 'ip.src', '-e', 'ip.dst',
-                          '-e', 'tcp.analysis.ack_rtt', '-e', 'tcp.options.mptcp.datalvllen', '-T', 'fields',
-                          '-E', 'header=y']
-            with open(out_file, 'w+') as f:
-                p = subprocess.Popen(parse_cmd, stdout=f, stderr=subprocess.PIPE)
-                _, err = p.communicate()
-
+            pcap_file = captures.capture_file('{}/{}_{}_iperf_dump.pcap'.format(self.out_folder, self.rep_num, client),
+                                              self.compression)
+            jobs.append((pcap_file, '{}/{}_{}_iperf_dump.csv'.format(self.out_folder, self.rep_num, client)))
+        # compressed captures are streamed into tshark, never decompressed to disk, the captures of all clients are
+        # analyzed at once and split by subflow if there are more cores than clients
+        captures.extract_all(jobs, processes=self.processes)
+
+        for pcap_file, _ in jobs:
             if not keep_pcap:
                 os.remove(pcap_file)
+            elif self.keep_filter:
+                captures.filter_capture(pcap_file, self.keep_filter)
+
+    def calculate_owd(self, keep_pcap):
+        """
+        Match the captures of every client and its server and write the one-way and queueing delay per data segment,
+        see owd.py. The queueing delay is relative to the path as configured, link events changing it are not
+        taken into account.
+
+        :param keep_pcap: keep the server captures after the matching
+        """
+        config = self.topo.config
+        for client, _, _ in self.get_iperf_pairings():
+            # the source address identifies the path, hosts route every address over its own interface
+            paths = {}
+            for path in config.paths:
+                if path.client == client.name:
+                    intf = client.intf('{}-eth{}'.format(client.name, path.interface))
+                    paths[intf.IP()] = (path_delay(config.links, path), path_serialization(config.links, path))
+            prefix = '{}/{}_{}'.format(self.out_folder, self.rep_num, client)
+            client_capture = captures.capture_file(prefix + '_iperf_dump.pcap', self.compression)
+            server_capture = captures.capture_file(prefix + '_server_dump.pcap', self.compression)
+            owd.write_owd(client_capture, server_capture, prefix + '_owd.csv', paths, start=self.t0['epoch'])
+
+            if not keep_pcap:
+                os.remove(server_capture)
+            elif self.keep_filter:
+                captures.filter_capture(server_capture, self.keep_filter)
 
     def run(self, runtime=30):
         """
@@ -250,8 +554,5 @@ class MPMininetExp:
         print('Done with experiment\n' + '.'*80 + '\n')
 
     def stop(self):
-        """ Stop Mininet and kill every potential remaining program """
-        self.net.stop()
-        system_call('pkill iperf3', ignore_codes=[1])
-        system_call('pkill tcpdump', ignore_codes=[1])
-        system_call('pkill ping', ignore_codes=[1])
+        """ Stop Mininet and every program this experiment started, other experiments on the machine are kept """
+        self.scope.cleanup()
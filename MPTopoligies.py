@@ -1,24 +1,46 @@
-import math
 import itertools
 import os
 
-from mininet.log import info, warn, error
+from mininet.log import info
 from mininet.net import Mininet
+from mininet.node import OVSBridge
 from mininet.topo import Topo
 
+import topo_config
 import utils
+from topo_config import AddressPlan, TopoConfig
+
+
+def config_logs_dir(config):
+    """
+    Subfolder of the log files of a compiled TopoConfig, see JsonTopo.get_logs_dir. Unlike building the topology it does
+    not check the congestion controls of the system, plans are validated on machines without them.
+
+    :return:    path <topology>/<ccs>[+<mptcp settings>]/<bandwidths>/<latencies>
+    """
+    ccs = {client: config.ccs[client] for client, _ in config.pairings}
+    cc_dir = '_'.join(ccs.values())
+    if len(cc_dir) > 100:
+        # large topologies exceed the maximal file name length, count runs of equal ccs instead, e.g. 40xlia
+        runs = itertools.groupby(ccs[client] for client, _ in config.pairings)
+        cc_dir = '_'.join('{}x{}'.format(len(list(run)), cc) for cc, run in runs)
+    if config.mptcp:
+        # experiments with the system's MPTCP settings keep their directory
+        cc_dir = '{}+{}'.format(cc_dir, topo_config.mptcp_tag(config.mptcp))
+    delay_dir = '_'.join(['{}ms'.format(float(delay)) for _, delay in config.group_values('latency')])
+    bw_dir = '_'.join(['{}Mbps'.format(int(rate)) for _, rate in config.group_values('bandwidth')])
+    return os.path.join(config.topology_id, cc_dir, bw_dir, delay_dir)
 
 
 class MPMininetWrapper(Mininet):
     """
     Wrapper around Mininet to enable make hosts MPTCP ready by setting IP addresses and setting up routing.
-    IP schema:
+    IP schema given by an AddressPlan, for up to 254 hosts:
         10.0.x.y: where y denotes the host id and x the interface id, e.g. h1-eth0 has 10.0.0.1 and h2-eth2 has 10.0.1.2
     """
-    HOST_IP = '10.0.{0}.{1}'
-    HOST_MAC = '00:00:00:00:{0:02x}:{1:02x}'
 
     def __init__(self, *args, **kwargs):
+        self.address_plan = kwargs.pop('address_plan', None)
         super(MPMininetWrapper, self).__init__(*args, **kwargs)
         self.setup_routing()
 
@@ -27,23 +49,48 @@ class MPMininetWrapper(Mininet):
         Set IP and MAC address for each interface on each host.
         :return:    None
         """
+        host_ids = self.topo.get_host_ids()
+        if self.address_plan is None:
+            self.address_plan = self.topo.get_address_plan()
+        if self.address_plan is None:
+            self.address_plan = AddressPlan.for_network(max(host_ids.values()),
+                                                        max(len(host.intfNames()) for host in self.hosts))
+        plan = self.address_plan
+
         for host in self.hosts:
             # Manually set the ip addresses of the interfaces
-            host_id = int(host.name[1:])
+            host_id = host_ids[host.name]
 
+            routing_cmds = []
             for i, intf_name in enumerate(host.intfNames()):
-                ip = self.HOST_IP.format(i, host_id)
-                gateway = self.HOST_IP.format(i, 0)
-                mac = self.HOST_MAC.format(i, host_id)
+                ip, gateway, table = plan.ip(i, host_id), plan.gateway(i), plan.table(i)
 
                 # set IP and MAC of host
-                host.intf(intf_name).config(ip='{}/24'.format(ip), mac=mac)
+                host.intf(intf_name).config(ip='{}/{}'.format(ip, plan.prefix_len), mac=plan.mac(i, host_id))
 
                 # Setup routing tables to so the kernel routes different source addresses through different interfaces.
                 # See http://multipath-tcp.org/pmwiki.php/Users/ConfigureRouting for information
-                host.cmd('ip rule add from {} table {}'.format(ip, i + 1))
-                host.cmd('ip route add {}/24 dev {} scope link table {}'.format(gateway, intf_name, i + 1))
-                host.cmd('ip route add default via {} dev {} table {}'.format(gateway, intf_name, i + 1))
+                routing_cmds.append('ip rule add from {} table {}'.format(ip, table))
+                routing_cmds.append('ip route add {}/{} dev {} scope link table {}'.format(
+                    gateway, plan.prefix_len, intf_name, table))
+                routing_cmds.append('ip route add default via {} dev {} table {}'.format(gateway, intf_name, table))
+
+            # a single round trip to the host shell, hosts with dozens of interfaces need hundreds of commands
+            host.cmd('; '.join(routing_cmds))
+
+    def config_link(self, config, i):
+        """
+        Mininet link of the i-th link of a compiled TopoConfig, parallel links between the same nodes are matched in
+        the order they are defined.
+
+        :param config:  TopoConfig the network was built from
+        :param i:       index of the link in config.links
+        :return:        mininet Link
+        """
+        link = config.links[i]
+        candidates = self.linksBetween(self.get(link.source), self.get(link.target))
+        same_pair = [l for l in config.links[:i] if set((l.source, l.target)) == set((link.source, link.target))]
+        return candidates[len(same_pair)]
 
 
 class MPTopo(Topo):
@@ -75,26 +122,15 @@ class MPTopo(Topo):
         if self.get_logs_dir.im_func == MPTopo.get_logs_dir.im_func:
             raise NotImplementedError('Topologies must implement get_logs_dir')
 
-    @staticmethod
-    def calculate_queue_size(rtt, rate, multiplier=1.5, mtu=1500, added_pkts=20):
-        """
-        Size of queue (number of packets) according to rule of thumb where the bottleneck buffer should hold at least
-        one BDP worth of packets. Multiply the BDP by a small factor to ensure even a single flow can fully utilize the
-        bottleneck. Adding a small number of packets to the result enables ultra low delay networks and links to
-        function properly.
-        => B = multiplier * (RTT * Rate) + n_pkts_added
-
-        :param rtt:         RTT time in ms
-        :param rate:        bottleneck rate in Mbps
-        :param multiplier:  factor by which bdp is multiplied (should be > 1 to account for tcp/ip header and timeouts)
-        :param mtu:         pkt size in bytes
-        :param added_pkts:  number of packets to add to buffer size
-        :return:            number of packets in bottleneck buffer
-        """
-        rate_bps = 1e6 * (rate / 8)
-        rtt_seconds = rtt / 1000.0
-        bdp_pkt = rtt_seconds * rate_bps / mtu
-        return int(math.ceil(multiplier * bdp_pkt + added_pkts))
+    def get_host_ids(self):
+        """ Numeric id per host name used for addressing, per default the number in the host name h<N> """
+        return {host: int(host[1:]) for host in self.hosts()}
+
+    def get_address_plan(self):
+        """ Override this method to fix the AddressPlan, per default the smallest plan fitting the network is used """
+        return None
+
+    calculate_queue_size = staticmethod(topo_config.calculate_queue_size)
 
 
 class JsonTopo(MPTopo):
@@ -102,64 +138,50 @@ class JsonTopo(MPTopo):
     Build Minient Topology from JSON definition.
     """
     def __init__(self, *args, **kwargs):
-        self.zero_warning_given = False
-        self.json_config = None
+        self.config = None
         super(JsonTopo, self).__init__(*args, **kwargs)
 
+    @property
+    def json_config(self):
+        return self.config.to_json()
+
     def get_topo_name(self):
-        return self.json_config['topology_id']
+        return self.config.topology_id
 
     def build(self, config):
         """
         Given JSON definition of topology, build a Mininet network.
-        :param config:  JSON config
+        :param config:  compiled TopoConfig, or JSON config which gets compiled first
         :return:        None
         """
-        self.json_config = config
+        self.config = config if isinstance(config, TopoConfig) else TopoConfig(config)
         nodes = {}
 
         # Add Hosts and Switches
-        for node in config['nodes']:
-            if node['id'].startswith('h'):
-                info('Host {} added\n'.format(node['id']))
-                nodes[node['id']] = self.addHost(str(node['id']))
-            elif node['id'].startswith('s'):
-                info('Switch {} added\n'.format(node['id']))
-                nodes[node['id']] = self.addSwitch(str(node['id']))
+        for host in self.config.hosts:
+            info('Host {} added\n'.format(host))
+            nodes[host] = self.addHost(host)
+        for switch in self.config.switches:
+            info('Switch {} added\n'.format(switch))
+            if switch in self.config.stp_switches:
+                # topologies with loops need the spanning tree protocol, i.e. a standalone bridge instead of OpenFlow
+                nodes[switch] = self.addSwitch(switch, cls=OVSBridge, stp=True)
             else:
-                error('Unknown node type encountered!\n')
-                exit(1)
+                nodes[switch] = self.addSwitch(switch)
 
-        # Add links
-        for link in config['links']:
-            src, dst = link['source'], link['target']
-            latency, bandwidth = link['properties']['latency'], link['properties']['bandwidth']
-
-            # check if link config is valid
-            if src not in nodes or dst not in nodes:
-                error('Link src or destination does not exist! \t{}<->{}\n'.format(src, dst))
-                exit(1)
-            if latency < 0:
-                error('Link has latency smaller than 0! \t{}<->{}\n'.format(src, dst))
-                exit(1)
-            elif latency == 0 and not self.zero_warning_given:
-                self.zero_warning_given = True
-                warn('Attention, working with "{}ms" delay in topologies where there are links with some delay can '
-                     'yield unexpected results! As a precaution "0ms" is changed to "0.1ms"\n'.format(latency))
-
-            hs, hd = nodes.get(src), nodes.get(dst)
-            latency = latency if latency > 1 else 0.1
-
-            # Note: Assumption here is that only the bottleneck link notably contributes to the rtt! If that's not the
-            #       case, the buffers on the bottleneck links are too small to fully utilize the path. Furthermore do
-            #       non-bottleneck links get a small fixed size buffer (~20 pkts) which should be enough to saturate the
-            #       bottlenecks as long as the links have a large enough rate compared to the bottleneck.
-            q_size = self.calculate_queue_size(rtt=2 * latency, rate=bandwidth)
-
-            linkopts = dict(bw=bandwidth, delay='{}ms'.format(latency), jitter='0ms', max_queue_size=q_size)
+        # Add links, they are validated and their queue sizes calculated when compiling the config
+        for link, q_size in zip(self.config.links, self.config.queue_sizes):
+            hs, hd = nodes[link.source], nodes[link.target]
+            latency = topo_config.emulated_latency(link.latency)
+
+            linkopts = dict(bw=link.bandwidth, delay='{}ms'.format(latency), jitter='0ms', max_queue_size=q_size)
             self.addLink(hs, hd, **linkopts)
             info('Link added {}-{}, options {}\n'.format(hs, hd, linkopts))
 
+        for path in self.config.path_summary():
+            info('Path {client}-{server} (eth{interface}): bottleneck {bottleneck} at {bandwidth}Mbps, '
+                 'base rtt {rtt}ms, queue {queue_size} pkts\n'.format(**path))
+
         self._set_host_pairings()
         # print('\n'.join(['{} <-> {}, \tlatency: {}, \tbandwidth: {}Mbps'
         #                 .format(s, d, c['delay'], c['bw']) for s, d, c in self.links(sort=True, withInfo=True)]))
@@ -170,43 +192,29 @@ class JsonTopo(MPTopo):
     def get_ccs_per_host(self):
         return self.host_cc
 
+    def get_host_ids(self):
+        return dict(self.config.host_ids)
+
+    def get_address_plan(self):
+        return self.config.address_plan
+
     def get_logs_dir(self):
-        cc_dir = '_'.join(self.get_ccs_per_host().values())
-        delay_dir = '_'.join(['{}ms'.format(float(delay)) for _, delay in utils.get_group_with_value(self.json_config, 'latency')])
-        bw_dir = '_'.join(['{}Mbps'.format(int(rate)) for _, rate in utils.get_group_with_value(self.json_config, 'bandwidth')])
-        return os.path.join(self.get_topo_name(), cc_dir, bw_dir, delay_dir)
+        return config_logs_dir(self.config)
 
     def _set_host_pairings(self):
         """
-        Read pairings from JSON config, which clients talks to which server with what congestion control algorithm.
-        Note: Assumption is that only senders set a congestion control scheme
+        Take over the pairings of the compiled config, which clients talks to which server with what congestion
+        control algorithm. Host pairings themselves are validated when compiling the config.
         """
-        pairs, ccs = [], []
-        for node in [node for node in self.json_config['nodes'] if node['id'].startswith('h')]:
-            if 'server' in node['properties']:
-                assert('cc' in node['properties'])
-                pairs.append((str(node['id']), str(node['properties']['server'])))
-                ccs.append(str(node['properties']['cc']))
-
-        # sort the lists alphabetically (sort by client/server pairs)
-        zipped_list = sorted(zip(pairs, ccs))
-        ccs = [cc for _, cc in zipped_list]
-        pairs = [pair for pair, _ in zipped_list]
-
-        # make sure every host is included in some connection and all mininet hosts are utilized
-        hosts = list(itertools.chain.from_iterable(pairs))
-        json_hosts = [n for n in self.json_config['nodes'] if n['id'].startswith('h')]
-        assert all(n['id'] in hosts for n in json_hosts), \
-            'Host {} not contained in any host pairings!\n'.format(map(lambda x: x['id'], json_hosts))
-        assert all(h in hosts for h in self.hosts()), \
-            'Host {} not contained in any host pairings!\n'.format(self.hosts())
+        ccs = [self.config.ccs[client] for client, _ in self.config.pairings]
+        background = tuple((flow.source, flow.target) for flow in self.config.background)
+        assert all(h in itertools.chain.from_iterable(self.config.pairings + background) for h in self.hosts()), \
+            'Host {} not contained in any host pairings or background flows!\n'.format(self.hosts())
         assert all(cc in utils.get_system_available_congestioncontrol_algos() for cc in ccs), \
             'Congestion Control algorithm not allowed by sysctl! Tried to use {}.\n'.format(', '.join(ccs))
-        assert(len(pairs) == len(ccs)), \
-            'JSONTopo._set_host_pairings(): Unequal number of paris and congestion control names.\n'
 
-        self.host_pairings = pairs
-        self.host_cc = {h[0]: cc for h, cc in zip(pairs, ccs)}
+        self.host_pairings = list(self.config.pairings)
+        self.host_cc = {h[0]: cc for h, cc in zip(self.host_pairings, ccs)}
 
 
 class SharedLinkTopo(MPTopo):
@@ -0,0 +1,144 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+
+def msec_index(times_s, start_s=0.0):
+    """
+    Discretize timestamps into integer millisecond slots relative to a start time. Vectorized replacement of
+    `df['sec'].apply(lambda x: np.floor(x * 1000))`.
+
+    :param times_s:     array like of timestamps in seconds
+    :param start_s:     reference time in seconds which maps to slot 0
+    :return:            int64 numpy array of millisecond slots, NaN timestamps are mapped to -1
+    """
+    times_s = np.asarray(times_s, dtype=np.float64)
+    msec = np.full(times_s.shape, -1, dtype=np.int64)
+    valid = np.isfinite(times_s)
+    msec[valid] = np.floor((times_s[valid] - start_s) * 1000).astype(np.int64)
+    return msec
+
+
+def goodput_buckets(times_s, payload_bytes, bucket_sizes_ms=(100,), start_s=0.0, end_s=None):
+    """
+    Bin a packet log into fixed width goodput buckets. Every bucket between start and end is reported, including
+    buckets without a single packet (0 Mbps) and the trailing partial bucket, whose goodput is normalized by the time
+    it actually covers. All bucket widths are computed from one pass over the packets, widths which are multiples of
+    the smallest width are aggregated from its counts without touching the packets again.
+
+    :param times_s:         array like of packet (receive) timestamps in seconds
+    :param payload_bytes:   array like of payload sizes in bytes, or a scalar if all packets have the same size
+    :param bucket_sizes_ms: bucket widths in ms, e.g. (1, 10, 100)
+    :param start_s:         start of the first bucket in seconds
+    :param end_s:           end of the last bucket in seconds, defaults to the last packet
+    :return:                dict mapping bucket width to DataFrame with columns 'msec', 'bytes' and 'tp [Mbps]'
+    """
+    bucket_sizes_ms = sorted(set(int(b) for b in bucket_sizes_ms))
+    if not bucket_sizes_ms or bucket_sizes_ms[0] <= 0:
+        raise ValueError('Bucket sizes have to be positive integers, got {}.'.format(bucket_sizes_ms))
+
+    msec = msec_index(times_s, start_s)
+    payload = np.broadcast_to(np.asarray(payload_bytes, dtype=np.float64), msec.shape)
+
+    if end_s is None:
+        duration_ms = int(msec.max()) + 1 if msec.size else 0
+    else:
+        duration_ms = int(np.ceil((end_s - start_s) * 1000))
+    keep = (msec >= 0) & (msec < duration_ms) & np.isfinite(payload)
+    msec, payload = msec[keep], payload[keep]
+
+    base = bucket_sizes_ms[0]
+    n_base = -(-duration_ms // base)  # ceil division
+    base_bytes = np.bincount(msec // base, weights=payload, minlength=n_base)
+
+    buckets = {}
+    for size in bucket_sizes_ms:
+        n = -(-duration_ms // size)
+        if size % base == 0:
+            # aggregate whole groups of base buckets, pad the tail with empty buckets
+            factor = size // base
+            padded = np.zeros(n * factor)
+            padded[:n_base] = base_bytes
+            byt = padded.reshape(n, factor).sum(axis=1)
+        else:
+            byt = np.bincount(msec // size, weights=payload, minlength=n)
+
+        starts = np.arange(n, dtype=np.int64) * size
+        widths = np.minimum(starts + size, duration_ms) - starts
+        buckets[size] = pd.DataFrame({'msec': starts, 'bytes': byt, 'tp [Mbps]': byt * 0.008 / widths})
+    return buckets
+
+
+def goodput_series(df, bucket_size_ms=100, time_column='sec', payload_column='payload [bytes]', **kwargs):
+    """
+    Convenience wrapper around `goodput_buckets` for a single bucket width on a packet DataFrame.
+
+    :param df:              DataFrame with one row per packet
+    :param bucket_size_ms:  width of a bucket in ms
+    :param time_column:     column containing the time since experiment start in seconds
+    :param payload_column:  column containing the payload per packet in bytes
+    :return:                DataFrame with columns 'msec', 'bytes' and 'tp [Mbps]'
+    """
+    return goodput_buckets(df[time_column].values, df[payload_column].values, (bucket_size_ms,),
+                           **kwargs)[bucket_size_ms]
+
+
+def payload_bytes(dump_df):
+    """
+    Payload [bytes] per packet of the csv tshark extracted from a client capture, see captures.RTT_FIELDS. TCP
+    captures carry no MPTCP options, only csvs written before tcp.len was extracted fall back to the MPTCP data level
+    length.
+
+    :param dump_df:     DataFrame of a `<rep>_<client>_iperf_dump.csv`
+    :return:            Series of payload sizes, NaN for packets without payload information
+    """
+    if 'tcp.len' in dump_df:
+        return dump_df['tcp.len']
+    return dump_df['tcp.options.mptcp.datalvllen']
+
+
+def load_t0(t0_file):
+    """
+    Start of the measured flows of a repetition, as written by MPMininetExp.run_iperf.
+
+    :param t0_file:     <rep>_t0.json (file name or file object)
+    :return:            dict with the start on the 'monotonic' clock of the queue monitor and as 'epoch' time of the
+                        captures [s]
+    """
+    if hasattr(t0_file, 'read'):
+        return json.load(t0_file)
+    with open(t0_file) as f:
+        return json.load(f)
+
+
+def load_queue_series(npz_file, t0=None):
+    """
+    Load the samples of the queue monitor, see queue_monitor.py.
+
+    :param npz_file:    file written by the queue monitor
+    :param t0:          start of the experiment, see load_t0, the sample times are relative to it; None keeps the
+                        monotonic clock of the monitor
+    :return:            dict interface name -> DataFrame with columns 'sec', 'backlog [bytes]', 'qlen [pkts]',
+                        'drops [pkts]' and 'overlimits', drops and overlimits are cumulative counters
+    """
+    data = np.load(npz_file)
+    sec = data['t'] - t0['monotonic'] if t0 is not None else data['t']
+    return {str(intf): pd.DataFrame({'sec': sec, 'backlog [bytes]': data['backlog'][:, i],
+                                     'qlen [pkts]': data['qlen'][:, i], 'drops [pkts]': data['drops'][:, i],
+                                     'overlimits': data['overlimits'][:, i]})
+            for i, intf in enumerate(data['intfs'])}
+
+
+def queueing_delay(backlog_bytes, bandwidth, latency):
+    """
+    Queueing delay of a TCLink from its backlog. Netem holds the packets for the emulated latency within the same
+    qdisc, at full utilization about bandwidth * latency bytes of the backlog are in flight and do not queue.
+
+    :param backlog_bytes:   backlog samples of the link [bytes]
+    :param bandwidth:       link bandwidth [Mbps]
+    :param latency:         emulated link latency [ms]
+    :return:                queueing delay per sample [ms]
+    """
+    in_flight = bandwidth * 1000.0 / 8 * latency
+    return np.maximum(np.asarray(backlog_bytes, dtype=np.float64) - in_flight, 0) * 8 / (bandwidth * 1000.0)
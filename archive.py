@@ -0,0 +1,324 @@
+"""
+Result archive per sweep. Instead of a deep log tree with several small files per repetition, finished experiments are
+appended to one SQLite file per sweep, <base folder>/<sweep>.sqlite, which indexes them by their parameters:
+
+    experiments     one row per repetition: logs dir, repetition, sweep, outcome and the compiled config as JSON
+    parameters      (experiment, name, value), e.g. topology, ccs, cc_h1, bandwidth_a, latency_b, scheduler
+    flows           throughput and mean RTT per client
+    files           the log files of the repetition, zlib compressed
+
+SQLite ships with python 2 and 3, so the orchestration hosts can write without further dependencies. Every experiment
+is added in a single transaction, readers never see half an experiment and an interrupted writer leaves the archive
+as it was. Readers select experiments by any parameter through the index instead of walking the tree:
+
+    archive = Archive('logs/de.sqlite')
+    for experiment in archive.find(topology='two_paths', ccs='lia', latency_a=30.0):
+        iperf_log = archive.read(experiment['id'], '{}_h1_iperf.csv'.format(experiment['repetition']))
+    flows = archive.summary(topology='two_paths')   # pandas DataFrame, one row per flow
+
+Existing log trees are converted with `python archive.py import logs --sweep de`.
+"""
+import json
+import os
+import re
+import sqlite3
+import time
+import zlib
+from argparse import ArgumentParser
+
+from topo_config import MPTCP_SETTINGS
+
+Archive_file = '{}/{}.sqlite'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS experiments (
+    id INTEGER PRIMARY KEY,
+    logs_dir TEXT NOT NULL,
+    repetition INTEGER NOT NULL,
+    sweep TEXT,
+    failed INTEGER NOT NULL DEFAULT 0,
+    saturated INTEGER NOT NULL DEFAULT 0,
+    added REAL NOT NULL,
+    outcome TEXT,
+    config TEXT,
+    UNIQUE (logs_dir, repetition)
+);
+CREATE TABLE IF NOT EXISTS parameters (
+    experiment INTEGER NOT NULL REFERENCES experiments (id),
+    name TEXT NOT NULL,
+    value,
+    PRIMARY KEY (experiment, name)
+);
+CREATE INDEX IF NOT EXISTS parameters_value ON parameters (name, value);
+CREATE TABLE IF NOT EXISTS flows (
+    experiment INTEGER NOT NULL REFERENCES experiments (id),
+    client TEXT NOT NULL,
+    throughput REAL,
+    rtt REAL,
+    PRIMARY KEY (experiment, client)
+);
+CREATE TABLE IF NOT EXISTS files (
+    experiment INTEGER NOT NULL REFERENCES experiments (id),
+    name TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    data BLOB NOT NULL,
+    PRIMARY KEY (experiment, name)
+);
+"""
+
+# short names of the MPTCP settings in the logs dir, see topo_config.mptcp_tag
+TAG_SETTINGS = {'sched': 'scheduler', 'pm': 'path_manager', 'sf': 'subflows'}
+
+
+def archive_file(base_folder, sweep_name):
+    return Archive_file.format(base_folder, sweep_name)
+
+
+def path_parameters(logs_dir):
+    """
+    Parameters encoded in a logs dir <topology>/<ccs>[+<mptcp tag>]/<bandwidths>/<latencies>, see
+    JsonTopo.get_logs_dir. Groups are named a, b, ... in the order of the directory names.
+
+    :return:    dict, e.g. {'topology': 'two_paths', 'ccs': 'lia', 'bandwidth_a': 10, 'latency_a': 10.0}
+    """
+    topology, cc_dir, bw_dir, delay_dir = logs_dir.strip('/').split('/')[-4:]
+    ccs, _, tag = cc_dir.partition('+')
+    parameters = {'topology': topology, 'ccs': ccs}
+    for part in tag.split('+') if tag else []:
+        if part in ('csum', 'nocsum'):
+            parameters['checksum'] = part == 'csum'
+        else:
+            key, _, value = part.partition('-')
+            parameters[TAG_SETTINGS[key]] = int(value) if key == 'sf' else value
+    for group, bandwidth in zip('abcd', bw_dir.split('_')):
+        parameters['bandwidth_' + group] = int(re.sub('[^0-9]', '', bandwidth))
+    for group, delay in zip('abcd', delay_dir.split('_')):
+        parameters['latency_' + group] = float(re.sub('[^0-9.]', '', delay))
+    return parameters
+
+
+def config_parameters(config, workload=None):
+    """ Parameters of a compiled TopoConfig beyond the ones of its logs dir: the cc of every client, the workload. """
+    parameters = dict(('cc_' + client, cc) for client, cc in config.ccs.items())
+    for field in ('bandwidth', 'latency'):
+        parameters.update((field + '_' + group, value) for group, value in config.group_values(field))
+    for setting in MPTCP_SETTINGS:
+        if setting in config.mptcp:
+            parameters[setting] = config.mptcp[setting]
+    for key, value in (workload or {}).items():
+        # e.g. the size distribution of the FCT workload
+        parameters[key] = json.dumps(value, sort_keys=True) if isinstance(value, (dict, list)) else value
+    return parameters
+
+
+def repetition_files(folder, repetition):
+    """ Names of the log files of a repetition, all of them start with '<repetition>_'. """
+    if not os.path.isdir(folder):
+        return []
+    prefix = '{}_'.format(repetition)
+    return sorted(name for name in os.listdir(folder)
+                  if name.startswith(prefix) and os.path.isfile(os.path.join(folder, name)))
+
+
+class Archive(object):
+    """ Append-only archive of the experiments of a sweep in a SQLite file. """
+    def __init__(self, file_name, timeout=60.0):
+        """
+        :param file_name:   SQLite file, created if missing
+        :param timeout:     seconds to wait for another writer of the same archive
+        """
+        folder = os.path.dirname(file_name)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+        self.file_name = file_name
+        self.db = sqlite3.connect(file_name, timeout=timeout)
+        self.db.row_factory = sqlite3.Row
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def add(self, logs_dir, repetition, folder, parameters=None, flows=None, outcome=None, sweep=None,
+            config=None, remove=False):
+        """
+        Append a finished repetition with its log files in one transaction, an earlier run of it is replaced.
+
+        :param logs_dir:    logs dir of the experiment relative to the log tree, its parameters are always indexed
+        :param folder:      folder with the log files of the repetition
+        :param parameters:  further parameters to index, e.g. from config_parameters
+        :param flows:       dict client -> {'throughput [Mbps]': .., 'rtt [ms]': ..} as from main.flow_summary
+        :param outcome:     dict with at least 'failed' and optionally 'saturated', stored as JSON
+        :param config:      TopoConfig of the experiment, stored as JSON
+        :param remove:      delete the log files from the folder once they are archived
+        :return:            id of the experiment
+        """
+        outcome = outcome or {}
+        names = repetition_files(folder, repetition)
+        params = path_parameters(logs_dir)
+        params.update(parameters or {})
+        params['repetition'] = repetition
+
+        # read before the transaction starts, the archive is locked for other writers only while inserting
+        blobs = []
+        for name in names:
+            with open(os.path.join(folder, name), 'rb') as f:
+                data = f.read()
+            blobs.append((name, len(data), sqlite3.Binary(zlib.compress(data, 6))))
+
+        with self.db:
+            old = self.db.execute('SELECT id FROM experiments WHERE logs_dir = ? AND repetition = ?',
+                                  (logs_dir, repetition)).fetchone()
+            if old is not None:
+                for table in ('parameters', 'flows', 'files'):
+                    self.db.execute('DELETE FROM {} WHERE experiment = ?'.format(table), (old['id'],))
+                self.db.execute('DELETE FROM experiments WHERE id = ?', (old['id'],))
+            experiment = self.db.execute(
+                'INSERT INTO experiments (logs_dir, repetition, sweep, failed, saturated, added, outcome, config) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (logs_dir, repetition, sweep, int(bool(outcome.get('failed'))), int(bool(outcome.get('saturated'))),
+                 time.time(), json.dumps(outcome, default=str),
+                 json.dumps(config.to_json()) if config is not None else None)).lastrowid
+            self.db.executemany('INSERT INTO parameters VALUES (?, ?, ?)',
+                                [(experiment, name, value) for name, value in sorted(params.items())])
+            self.db.executemany('INSERT INTO flows VALUES (?, ?, ?, ?)',
+                                [(experiment, client, flow.get('throughput [Mbps]'), flow.get('rtt [ms]'))
+                                 for client, flow in sorted((flows or {}).items())])
+            self.db.executemany('INSERT INTO files VALUES (?, ?, ?, ?)',
+                                [(experiment,) + blob for blob in blobs])
+
+        if remove:
+            for name in names:
+                os.remove(os.path.join(folder, name))
+            try:
+                os.removedirs(folder)  # the empty logs dir and its empty parents
+            except OSError:
+                pass  # other repetitions are still in the tree
+        return experiment
+
+    def lookup(self, logs_dir, repetition):
+        """ Id of an archived repetition, None if it is not archived. """
+        row = self.db.execute('SELECT id FROM experiments WHERE logs_dir = ? AND repetition = ?',
+                              (logs_dir, repetition)).fetchone()
+        return row['id'] if row is not None else None
+
+    def put(self, experiment, name, data):
+        """ Add or replace a file of an archived experiment, e.g. derived data like pyramids. """
+        with self.db:
+            self.db.execute('INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)',
+                            (experiment, name, len(data), sqlite3.Binary(zlib.compress(data, 6))))
+
+    def has(self, logs_dir, repetition):
+        """ Whether a repetition is archived and neither failed nor invalidated by a saturated host. """
+        return self.db.execute('SELECT 1 FROM experiments WHERE logs_dir = ? AND repetition = ? AND NOT failed '
+                               'AND NOT saturated', (logs_dir, repetition)).fetchone() is not None
+
+    def find(self, valid=True, **parameters):
+        """
+        Experiments matching all given parameters, e.g. find(topology='two_paths', cc_h1='lia', latency_a=30.0).
+
+        :param valid:   only experiments which neither failed nor saturated the host
+        :return:        list of dicts with the columns of the experiments table and the parameters
+        """
+        query, args = 'SELECT e.* FROM experiments e', []
+        for i, (name, value) in enumerate(sorted(parameters.items())):
+            query += ' JOIN parameters p{0} ON p{0}.experiment = e.id AND p{0}.name = ? AND p{0}.value = ?'.format(i)
+            args += [name, value]
+        if valid:
+            query += ' WHERE NOT e.failed AND NOT e.saturated'
+        experiments = [dict(row) for row in self.db.execute(query + ' ORDER BY e.id', args)]
+        for experiment in experiments:
+            experiment.update(self.parameters(experiment['id']))
+        return experiments
+
+    def parameters(self, experiment):
+        return dict((row['name'], row['value']) for row in
+                    self.db.execute('SELECT name, value FROM parameters WHERE experiment = ?', (experiment,)))
+
+    def files(self, experiment):
+        """ Names and uncompressed sizes of the log files of an experiment. """
+        return [(row['name'], row['size']) for row in
+                self.db.execute('SELECT name, size FROM files WHERE experiment = ? ORDER BY name', (experiment,))]
+
+    def read(self, experiment, name):
+        """ Content of a log file of an experiment as bytes, e.g. for pandas.read_csv(io.BytesIO(...)). """
+        row = self.db.execute('SELECT data FROM files WHERE experiment = ? AND name = ?', (experiment, name)).fetchone()
+        if row is None:
+            raise KeyError('No file {} archived for experiment {}.'.format(name, experiment))
+        return zlib.decompress(bytes(row['data']))
+
+    def extract(self, experiment, folder):
+        """ Write the log files of an experiment into a folder, e.g. for tools expecting the log tree. """
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+        for name, _ in self.files(experiment):
+            with open(os.path.join(folder, name), 'wb') as f:
+                f.write(self.read(experiment, name))
+
+    def summary(self, valid=True, **parameters):
+        """
+        Throughput and RTT of every flow of the matching experiments with their parameters as columns.
+
+        :return:    pandas DataFrame, one row per experiment and client
+        """
+        import pandas as pd
+        rows = []
+        for experiment in self.find(valid=valid, **parameters):
+            for flow in self.db.execute('SELECT client, throughput, rtt FROM flows WHERE experiment = ?',
+                                        (experiment['id'],)):
+                row = dict((k, v) for k, v in experiment.items() if k not in ('outcome', 'config'))
+                row.update(client=flow['client'], **{'throughput [Mbps]': flow['throughput'],
+                                                     'rtt [ms]': flow['rtt']})
+                rows.append(row)
+        return pd.DataFrame(rows)
+
+
+def import_tree(archive, base_folder, sweep=None, remove=False):
+    """
+    Archive an existing log tree, walking it once. Only the parameters of the logs dirs are indexed and no flows are
+    stored, the configs of old experiments are unknown.
+
+    :return:    number of archived repetitions
+    """
+    count = 0
+    for dirpath, dirnames, filenames in os.walk(base_folder):
+        logs_dir = os.path.relpath(dirpath, base_folder)
+        if dirnames or logs_dir.count(os.sep) != 3:
+            continue
+        repetitions = set(int(name.split('_')[0]) for name in filenames if name.split('_')[0].isdigit())
+        for repetition in sorted(repetitions):
+            archive.add(logs_dir.replace(os.sep, '/'), repetition, dirpath, sweep=sweep, remove=remove,
+                        outcome={'failed': False, 'imported': True})
+            count += 1
+    return count
+
+
+def main():
+    parser = ArgumentParser(description="Archive log trees and query result archives")
+    sub = parser.add_subparsers(dest='command')
+    convert = sub.add_parser('import', help="Archive an existing log tree")
+    convert.add_argument('log_tree')
+    convert.add_argument('--sweep', required=True, help="Name of the sweep, the archive is <log tree>/<sweep>.sqlite")
+    convert.add_argument('--remove', action='store_true', help="Delete the log files once archived")
+    query = sub.add_parser('find', help="List the experiments of an archive matching parameters")
+    query.add_argument('archive')
+    query.add_argument('parameters', nargs='*', metavar='NAME=VALUE', help="e.g. topology=two_paths latency_a=30")
+    args = parser.parse_args()
+
+    if args.command == 'import':
+        archive = Archive(archive_file(args.log_tree, args.sweep))
+        print('Archived {} repetitions into {}'.format(import_tree(archive, args.log_tree, args.sweep, args.remove),
+                                                       archive.file_name))
+    else:
+        parameters = {}
+        for parameter in args.parameters:
+            name, _, value = parameter.partition('=')
+            try:
+                parameters[name] = json.loads(value)
+            except ValueError:
+                parameters[name] = value
+        for experiment in Archive(args.archive).find(**parameters):
+            print('{:>6}  {}/{}'.format(experiment['id'], experiment['logs_dir'], experiment['repetition']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,419 @@
+"""
+Background cross traffic of a topology (see topo_config.compile_background), running alongside the measured flows.
+Every host sending background traffic runs one generator process for all of its flows, every host receiving it one
+sink process, both serve their sockets from a single poll loop instead of a process or thread per flow.
+
+    <rep>_<host>_background.csv         generator: one line per UDP stream, bulk connection and short flow
+    <rep>_<host>_background_sink.csv    sink: bytes and packets received per protocol and source address
+    <rep>_background.json               summary per kind of flow, see write_summary
+
+Run as script on a host:
+    python background.py sink -o 0_h4_background_sink.csv
+    python background.py generate -o 0_h3_background.csv -s 0 -f '[{"kind": "udp", "source": "10.0.0.3", ...}]'
+"""
+import csv
+import errno
+import heapq
+import json
+import os
+import random
+import select
+import signal
+import socket
+import sys
+from argparse import ArgumentParser
+
+try:
+    from shlex import quote
+except ImportError:
+    from pipes import quote
+
+from monotonic import monotonic  # Monotonic time to avoid issues from NTP adjustments
+
+PORT = 5301  # TCP and UDP port of the sinks, iperf3 uses 5201
+CHUNK = 65536  # bytes per send and receive call
+TICK = 0.001  # pacing interval of UDP streams [s]
+TCP_CONGESTION = getattr(socket, 'TCP_CONGESTION', 13)
+MPTCP_ENABLED = 42  # socket option of the MPTCP kernel, background flows are single path
+# packets are the UDP datagrams sent, TCP flows only count bytes
+FLOW_COLUMNS = ['flow', 'kind', 'target', 'start [s]', 'end [s]', 'bytes', 'packets', 'fct [s]', 'status']
+SINK_COLUMNS = ['proto', 'source', 'bytes', 'packets', 'connections']
+
+_payload = memoryview(b'\0' * CHUNK)
+
+
+def pareto(mean, shape):
+    """ Heavy-tailed flow size [bytes] with the given mean, shape > 1. """
+    scale = mean * (shape - 1.0) / shape
+    return max(1, int(scale / (1.0 - random.random()) ** (1.0 / shape)))
+
+
+class Loop(object):
+    """ Poll loop with timers, stopped by SIGINT or SIGTERM. """
+    def __init__(self):
+        self.poll = select.poll()
+        self.handlers = {}  # fd -> callable(events)
+        self.timers = []  # heap of (time, sequence, callable)
+        self.sequence = 0
+        self.stopped = False
+        self.t0 = monotonic()
+        # background commands of a non interactive shell ignore SIGINT, always install the handlers
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(sig, self.stop)
+
+    def stop(self, *_):
+        self.stopped = True
+
+    def now(self):
+        return monotonic() - self.t0
+
+    def at(self, t, callback):
+        """ Call back at t seconds after the start of the loop. """
+        self.sequence += 1
+        heapq.heappush(self.timers, (t, self.sequence, callback))
+
+    def register(self, sock, events, handler):
+        self.handlers[sock.fileno()] = handler
+        self.poll.register(sock.fileno(), events)
+
+    def modify(self, sock, events):
+        self.poll.modify(sock.fileno(), events)
+
+    def unregister(self, sock):
+        self.poll.unregister(sock.fileno())
+        del self.handlers[sock.fileno()]
+
+    def run(self):
+        while not self.stopped:
+            timeout = 1000 if not self.timers else max(0, 1000 * (self.timers[0][0] - self.now()))
+            try:
+                ready = self.poll.poll(timeout)
+            except (select.error, IOError, OSError) as e:
+                if e.args[0] == errno.EINTR:
+                    continue
+                raise
+            for fd, events in ready:
+                if fd in self.handlers:
+                    self.handlers[fd](events)
+            while self.timers and self.timers[0][0] <= self.now() and not self.stopped:
+                heapq.heappop(self.timers)[2]()
+
+
+class Flow(object):
+    """ Accounting of one stream, connection or short flow. """
+    def __init__(self, loop, index, spec, size=None):
+        self.loop, self.index, self.spec, self.size = loop, index, spec, size
+        self.start, self.end = loop.now(), None
+        self.bytes, self.packets, self.status = 0, 0, 'running'
+
+    def finish(self, status):
+        if self.end is None:
+            self.end, self.status = self.loop.now(), status
+
+    def row(self):
+        # only short flows have a completion time, streams and bulk connections end when they are stopped
+        fct = '{:.6f}'.format(self.end - self.start) if self.size is not None and self.status == 'done' else ''
+        return [self.index, self.spec['kind'], self.spec['target'], '{:.6f}'.format(self.start),
+                '{:.6f}'.format(self.end), self.bytes, self.packets, fct, self.status]
+
+
+class Generator(object):
+    """ All background flows of one host. """
+    def __init__(self, loop, flows):
+        """
+        :param flows:   list of dicts with 'kind', 'source', 'target' addresses, 'start', 'stop' [s] and 'params'
+        """
+        self.loop, self.flows, self.records = loop, flows, []
+        for index, spec in enumerate(flows):
+            self.loop.at(spec['start'], getattr(self, 'start_' + spec['kind'])(index, spec))
+
+    def stopped(self, spec):
+        return spec['stop'] is not None and self.loop.now() >= spec['stop']
+
+    def record(self, index, spec, size=None):
+        flow = Flow(self.loop, index, spec, size)
+        self.records.append(flow)
+        return flow
+
+    def socket(self, spec, kind):
+        sock = socket.socket(socket.AF_INET, kind)
+        sock.bind((spec['source'], 0))  # the source address selects the path, see MPMininetWrapper.setup_routing
+        sock.setblocking(False)
+        if kind == socket.SOCK_STREAM:
+            try:
+                sock.setsockopt(socket.IPPROTO_TCP, MPTCP_ENABLED, 0)
+            except (socket.error, OSError):
+                pass  # not an MPTCP kernel
+        return sock
+
+    def start_udp(self, index, spec):
+        def start():
+            flow = self.record(index, spec)
+            sock = self.socket(spec, socket.SOCK_DGRAM)
+            sock.connect((spec['target'], PORT))
+            size, rate = spec['params']['packet_size'], spec['params']['rate'] * 1e6 / 8
+
+            def tick():
+                if self.stopped(spec):
+                    flow.finish('done')
+                    sock.close()
+                    return
+                due = int((self.loop.now() - flow.start) * rate / size) - flow.packets
+                for _ in range(due):
+                    try:
+                        sock.send(_payload[:size])
+                    except socket.error as e:
+                        if e.args[0] not in (errno.EAGAIN, errno.ENOBUFS, errno.ECONNREFUSED):
+                            raise
+                    # packets the local queue rejected count as sent, they are lost like on a congested link
+                    flow.packets += 1
+                    flow.bytes += size
+                self.loop.at(self.loop.now() + max(TICK, size / rate), tick)
+            tick()
+        return start
+
+    def connect(self, flow, spec, on_writable, on_done):
+        """ Open a TCP connection of a flow, on_writable sends and returns True once all data is sent. """
+        sock = self.socket(spec, socket.SOCK_STREAM)
+        if sock.connect_ex((spec['target'], PORT)) not in (0, errno.EINPROGRESS):
+            flow.finish('failed')
+            sock.close()
+            return None
+
+        def handle(events):
+            if events & (select.POLLERR | select.POLLHUP) and not events & select.POLLIN:
+                flow.finish('failed')
+            elif events & select.POLLOUT:
+                try:
+                    if on_writable(sock):
+                        # sent everything, the flow completes when the sink closed the connection
+                        sock.shutdown(socket.SHUT_WR)
+                        self.loop.modify(sock, select.POLLIN)
+                    return
+                except socket.error as e:
+                    if e.args[0] == errno.EAGAIN:
+                        return
+                    flow.finish('failed')
+            elif events & select.POLLIN:
+                try:
+                    if sock.recv(CHUNK):
+                        return
+                    flow.finish('done')
+                except socket.error:
+                    flow.finish('failed')
+            self.loop.unregister(sock)
+            sock.close()
+            on_done()
+        self.loop.register(sock, select.POLLOUT, handle)
+        return sock
+
+    def start_bulk(self, index, spec):
+        def start():
+            for _ in range(spec['params']['flows']):
+                flow = self.record(index, spec)
+
+                def send(sock, flow=flow):
+                    if self.stopped(spec):
+                        flow.finish('done')
+                        return True
+                    flow.bytes += sock.send(_payload)
+                    return False
+                sock = self.connect(flow, spec, send, lambda: None)
+                if sock is not None:
+                    try:
+                        sock.setsockopt(socket.IPPROTO_TCP, TCP_CONGESTION, spec['params']['cc'].encode())
+                    except (socket.error, OSError) as e:
+                        sys.stderr.write('Congestion control {} not available: {}\n'.format(spec['params']['cc'], e))
+        return start
+
+    def start_poisson(self, index, spec):
+        params, active = spec['params'], []
+
+        def arrival():
+            if self.stopped(spec):
+                return
+            self.loop.at(self.loop.now() + random.expovariate(params['arrival_rate']), arrival)
+            flow = self.record(index, spec, pareto(params['mean_size'], params['shape']))
+            if len(active) >= params['max_concurrent']:
+                flow.finish('rejected')
+                return
+
+            def send(sock):
+                flow.bytes += sock.send(_payload[:min(CHUNK, flow.size - flow.bytes)])
+                return flow.bytes >= flow.size
+            active.append(flow)
+            if self.connect(flow, spec, send, lambda: active.remove(flow)) is None:
+                active.remove(flow)
+        return arrival
+
+    def write(self, out_file):
+        with open(out_file, 'w') as f:
+            writer = csv.writer(f, delimiter='\t', lineterminator='\n')
+            writer.writerow(FLOW_COLUMNS)
+            for flow in self.records:
+                if flow.end is None:
+                    flow.finish('incomplete' if flow.spec['kind'] == 'poisson' else 'done')
+                writer.writerow(flow.row())
+
+
+class Sink(object):
+    """ Receives and discards the background traffic of one host. """
+    def __init__(self, loop, address=''):
+        self.loop = loop
+        self.counts = {}  # (proto, source) -> [bytes, packets, connections]
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.listener.bind((address, PORT))
+        self.listener.listen(128)
+        self.listener.setblocking(False)
+        self.loop.register(self.listener, select.POLLIN, self.accept)
+        self.udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.udp.bind((address, PORT))
+        self.udp.setblocking(False)
+        self.loop.register(self.udp, select.POLLIN, self.receive_udp)
+
+    def count(self, proto, source, size, packets=0, connections=0):
+        counts = self.counts.setdefault((proto, source), [0, 0, 0])
+        counts[0] += size
+        counts[1] += packets
+        counts[2] += connections
+
+    def accept(self, _):
+        try:
+            conn, (source, _) = self.listener.accept()
+        except socket.error:
+            return
+        conn.setblocking(False)
+        self.count('tcp', source, 0, connections=1)
+
+        def receive(_):
+            try:
+                data = conn.recv(CHUNK)
+            except socket.error as e:
+                if e.args[0] == errno.EAGAIN:
+                    return
+                data = b''
+            if data:
+                self.count('tcp', source, len(data))
+                return
+            # closing tells the generator the flow completed
+            self.loop.unregister(conn)
+            conn.close()
+        self.loop.register(conn, select.POLLIN, receive)
+
+    def receive_udp(self, _):
+        for _ in range(64):
+            try:
+                data, (source, _) = self.udp.recvfrom(CHUNK)
+            except socket.error:
+                return
+            self.count('udp', source, len(data), packets=1)
+
+    def write(self, out_file):
+        with open(out_file, 'w') as f:
+            writer = csv.writer(f, delimiter='\t', lineterminator='\n')
+            writer.writerow(SINK_COLUMNS)
+            for (proto, source), counts in sorted(self.counts.items()):
+                writer.writerow([proto, source] + counts)
+
+
+def flow_specs(config, host, address):
+    """
+    Background flows a host sends as passed to its generator.
+
+    :param config:  compiled TopoConfig
+    :param address: callable(host name, interface index) returning the IP address of the interface
+    :return:        list of dicts
+    """
+    return [{'kind': flow.kind, 'source': address(flow.source, flow.interface),
+             'target': address(flow.target, flow.interface), 'start': flow.start, 'stop': flow.stop,
+             'params': flow.params} for flow in config.background if flow.source == host]
+
+
+def start(node, mode, out_file, flows=None, seed=None):
+    """
+    Start the sink or generator of a Mininet host in the background.
+
+    :param mode:    'sink' or 'generate'
+    :param flows:   flow specs of the generator, see flow_specs
+    :param seed:    seed of the generator, e.g. the repetition number for reproducible arrivals
+    :return:        pid
+    """
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'background.py')
+    cmd = [sys.executable, script, mode, '-o', out_file]
+    if flows is not None:
+        cmd += ['-f', quote(json.dumps(flows))]
+    if seed is not None:
+        cmd += ['-s', seed]
+    node.cmd([str(part) for part in cmd] + ['&>', out_file + '.log', '&'])
+    return node.lastPid
+
+
+def stop(node, pid):
+    """ Interrupt a sink or generator and wait until it wrote its accounting. """
+    node.cmd('kill -SIGINT {0}; wait {0}'.format(pid))
+
+
+def read_rows(file_name):
+    with open(file_name) as f:
+        return list(csv.DictReader(f, delimiter='\t'))
+
+
+def write_summary(out_file, generator_files, sink_files):
+    """
+    Summarize the background traffic of an experiment per kind of flow: flows, bytes sent, received, completed short
+    flows and their mean completion time, UDP loss as the share of datagrams sent but not received.
+
+    :return:    summary dict as written
+    """
+    summary = {}
+    for file_name in generator_files:
+        for row in read_rows(file_name):
+            kind = summary.setdefault(row['kind'], {'flows': 0, 'bytes': 0, 'packets': 0, 'completed': 0, 'fct': 0.0})
+            kind['flows'] += 1
+            kind['bytes'] += int(row['bytes'])
+            kind['packets'] += int(row['packets'])
+            if row['fct [s]']:
+                kind['completed'] += 1
+                kind['fct'] += float(row['fct [s]'])
+    for kind in summary.values():
+        fct = kind.pop('fct')
+        kind['mean fct [s]'] = fct / kind['completed'] if kind['completed'] else None
+
+    received = {'tcp': 0, 'udp': 0}
+    udp_packets = 0
+    for file_name in sink_files:
+        for row in read_rows(file_name):
+            received[row['proto']] += int(row['bytes'])
+            if row['proto'] == 'udp':
+                udp_packets += int(row['packets'])
+    summary['received [bytes]'] = received
+    if 'udp' in summary and summary['udp']['packets']:
+        summary['udp']['loss'] = max(0.0, 1 - float(udp_packets) / summary['udp']['packets'])
+    with open(out_file, 'w') as f:
+        json.dump(summary, f, indent=2, sort_keys=True)
+    return summary
+
+
+def main():
+    parser = ArgumentParser(description='Background traffic generator and sink, see background.py.')
+    parser.add_argument('mode', choices=['sink', 'generate'])
+    parser.add_argument('--out', '-o', required=True, help='accounting csv file')
+    parser.add_argument('--flows', '-f', default='[]', help='JSON list of the flows to generate')
+    parser.add_argument('--seed', '-s', type=int, help='seed of the flow arrivals and sizes')
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    loop = Loop()
+    if args.mode == 'sink':
+        worker = Sink(loop)
+    else:
+        worker = Generator(loop, json.loads(args.flows))
+    try:
+        loop.run()
+    finally:
+        worker.write(args.out)
+
+
+if __name__ == '__main__':
+    main()
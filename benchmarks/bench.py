@@ -0,0 +1,299 @@
+"""
+Benchmarks of the harness itself: topology compilation and network build, sweep planning, the sender/receiver loop,
+capture and iperf log parsing and result aggregation. Mininet is replaced by the recording stand-in of fake_mininet,
+so the suite runs on any Linux machine without root.
+
+    python benchmarks/bench.py                   # run and compare against benchmarks/baseline.json
+    python benchmarks/bench.py --save-baseline   # store the results as new baseline
+    python benchmarks/bench.py --check           # exit with 1 if a component got slower than the tolerance
+"""
+import collections
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from benchmarks import fake_mininet, synthetic  # noqa: E402
+fake_mininet.install()
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+# baselines are stored per interpreter, the orchestration runs on python 2 and the analysis on python 3
+PYTHON = '{}.{}'.format(*sys.version_info[:2])
+
+# name -> setup(work_dir) returning (run, ops per run, unit), registered in the order they are run
+BENCHMARKS = collections.OrderedDict()
+
+
+class Skipped(Exception):
+    pass
+
+
+def benchmark(name):
+    def register(setup):
+        BENCHMARKS[name] = setup
+        return setup
+    return register
+
+
+@benchmark('topo_compile')
+def bench_topo_compile(work_dir):
+    import topogen
+    from topo_config import TopoConfig
+    topo_dir = os.path.join(REPO_DIR, 'topologies')
+    configs = []
+    for name in sorted(os.listdir(topo_dir)):
+        if name.endswith('.json'):
+            with open(os.path.join(topo_dir, name)) as f:
+                configs.append(json.load(f))
+    configs.append(topogen.dumbbell(100, n_planes=2))
+    return lambda: [TopoConfig(c) for c in configs], len(configs), 'topologies'
+
+
+@benchmark('topo_build')
+def bench_topo_build(work_dir):
+    import topogen
+    from MPTopoligies import JsonTopo, MPMininetWrapper
+    from topo_config import TopoConfig
+    config = TopoConfig(topogen.dumbbell(50, n_planes=2))
+
+    def run():
+        for _ in range(5):
+            del fake_mininet.commands[:]
+            MPMininetWrapper(topo=JsonTopo(config))
+    return run, 5, 'networks'
+
+
+@benchmark('sweep_planning')
+def bench_sweep_planning(work_dir):
+    import sweep
+    import topo_config
+    specs = [sweep.load_spec('tp'), sweep.load_spec('de')]
+
+    def run():
+        topo_config._compiled_topologies.clear()  # plan from scratch, including the compilation of the topologies
+        return sweep.expand(specs)
+    return run, len(run()), 'experiments'
+
+
+@benchmark('sender_receiver')
+def bench_sender_receiver(work_dir, duration=2):
+    probe = socket.socket()
+    probe.bind(('127.0.0.1', 0))
+    port = probe.getsockname()[1]
+    probe.close()
+    rcv_file, snd_file = os.path.join(work_dir, 'rcv.txt'), os.path.join(work_dir, 'snd.txt')
+
+    def run():
+        with open(os.devnull, 'w') as devnull:
+            receiver = subprocess.Popen([sys.executable, os.path.join(REPO_DIR, 'receiver.py'), '-p', str(port),
+                                         '-o', rcv_file], stdout=devnull)
+            time.sleep(0.5)
+            sender = subprocess.Popen([sys.executable, os.path.join(REPO_DIR, 'sender.py'), '-s', '127.0.0.1',
+                                       '-p', str(port), '-t', str(duration), '-o', snd_file], stdout=devnull)
+            sender.wait()
+            receiver.wait()
+        if sender.returncode or receiver.returncode:
+            raise Skipped('sender/receiver failed, exit codes {}/{}'.format(sender.returncode, receiver.returncode))
+        with open(rcv_file) as f:
+            packets = sum(1 for _ in f) - 1
+        # the sender and receiver loops are what is measured, not the connection setup
+        return packets / float(duration)
+    return run, None, 'packets'
+
+
+@benchmark('tshark_rtt')
+def bench_tshark_rtt(work_dir, n_packets=50000):
+    if not any(os.access(os.path.join(p, 'tshark'), os.X_OK) for p in os.environ.get('PATH', '').split(os.pathsep)):
+        raise Skipped('tshark not installed')
+    pcap_file = os.path.join(work_dir, 'dump.pcap')
+    n = synthetic.write_pcap(pcap_file, n_packets)
+    cmd = ['tshark', '-r', pcap_file, '-e', 'frame.time_relative', '-e', 'tcp.stream', '-e', 'ip.src', '-e', 'ip.dst',
+           '-e', 'tcp.analysis.ack_rtt', '-e', 'tcp.options.mptcp.datalvllen', '-T', 'fields', '-E', 'header=y']
+
+    def run():
+        with open(os.devnull, 'w') as devnull:
+            subprocess.check_call(cmd, stdout=devnull, stderr=devnull)
+    return run, n, 'packets'
+
+
+@benchmark('pcap_split')
+def bench_pcap_split(work_dir, n_packets=200000, pieces=4):
+    import captures
+    pcap_file = os.path.join(work_dir, 'dump.pcap')
+    flows = [('10.0.{}.1'.format(i), '10.0.{}.2'.format(i)) for i in range(8)]
+    n = synthetic.write_pcap(pcap_file, n_packets, flows=flows)
+
+    def run():
+        with open(os.devnull, 'wb') as devnull:
+            captures.split_capture(pcap_file, [devnull] * pieces)
+    return run, n, 'packets'
+
+
+@benchmark('rtt_csv_parsing')
+def bench_rtt_csv_parsing(work_dir, n_packets=200000):
+    import progress
+    dump_file = os.path.join(work_dir, 'dump.csv')
+    synthetic.write_dump_csv(dump_file, n_packets)
+    return lambda: progress.mean_ack_rtt(dump_file), n_packets, 'packets'
+
+
+@benchmark('rtt_csv_loading')
+def bench_rtt_csv_loading(work_dir, n_packets=200000):
+    import pandas as pd
+    dump_file = os.path.join(work_dir, 'dump.csv')
+    synthetic.write_dump_csv(dump_file, n_packets)
+    return lambda: pd.read_csv(dump_file, delimiter='\t'), n_packets, 'packets'
+
+
+@benchmark('iperf_parsing')
+def bench_iperf_parsing(work_dir, n_logs=200):
+    import progress
+    logs = []
+    for i in range(n_logs):
+        logs.append(os.path.join(work_dir, '{}_h1_iperf.csv'.format(i)))
+        synthetic.write_iperf_log(logs[-1], seed=i)
+    return lambda: [progress.iperf_sender_throughput(log) for log in logs], n_logs, 'logs'
+
+
+@benchmark('goodput_aggregation')
+def bench_goodput_aggregation(work_dir, n_packets=1000000):
+    import numpy as np
+    import analysis
+    rand = np.random.RandomState(0)
+    times = np.sort(rand.random_sample(n_packets) * 60)
+    return lambda: analysis.goodput_buckets(times, 1428, (1, 10, 100, 1000)), n_packets, 'packets'
+
+
+@benchmark('fairness_metrics')
+def bench_fairness_metrics(work_dir):
+    import numpy as np
+    import metrics
+    from topo_config import TopoConfig
+    config = TopoConfig.from_file('mp_vs_sp')
+    path_tp = np.random.RandomState(0).random_sample((200, 600, len(config.paths))) * 10
+    return lambda: metrics.experiment_metrics(config, path_tp), path_tp.size // len(config.paths), 'samples'
+
+
+@benchmark('cc_comparison')
+def bench_cc_comparison(work_dir, n_cells=500):
+    import numpy as np
+    import pandas as pd
+    import comparison
+    rand = np.random.RandomState(0)
+    index = pd.MultiIndex.from_product([range(n_cells), ['lia', 'olia', 'balia', 'wvegas', 'cubic'], range(10)],
+                                       names=['cell', 'cc', 'repetition'])
+    df = pd.DataFrame({'tp': rand.random_sample(len(index)) * 10}, index=index).reset_index()
+    return lambda: comparison.compare(df, 'tp', ['cell']), n_cells, 'cells'
+
+
+def measure(run, ops, repeat):
+    """
+    Best time of repeated runs and the peak memory of one run.
+
+    :return:    dict with ops/s, seconds per run and peak memory, None without tracemalloc (python 2)
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.time()
+        result = run()
+        best = min(best, time.time() - start)
+    if ops is None:
+        # the benchmark measures its own rate
+        ops_per_s = result
+    else:
+        ops_per_s = ops / best
+
+    peak = None
+    if tracemalloc is not None:
+        tracemalloc.start()
+        run()
+        peak = round(tracemalloc.get_traced_memory()[1] / 2.0 ** 20, 3)
+        tracemalloc.stop()
+    # python 2 has no tracemalloc, the growth of the maximal resident set size mostly stays 0 as the process already
+    # reached its maximum in earlier runs, the peak is reported as unavailable instead
+    return {'ops/s': ops_per_s, 'seconds': best, 'peak memory [MiB]': peak}
+
+
+def compare(results, baseline, tolerance):
+    """ Print results next to the baseline, return the components slower than the tolerance allows. """
+    regressions = []
+    print('{:<22}{:>16}{:>12}{:>14}{:>12}'.format('component', 'ops/s', 'unit', 'peak [MiB]', 'vs base'))
+    for name, result in results.items():
+        if 'skipped' in result:
+            print('{:<22}{:>16}  {}'.format(name, 'skipped', result['skipped']))
+            continue
+        base = baseline.get(name, {}).get('ops/s')
+        ratio = result['ops/s'] / base if base else None
+        peak = result['peak memory [MiB]']
+        print('{:<22}{:>16.1f}{:>12}{:>14}{:>12}'.format(
+            name, result['ops/s'], result['unit'], '{:.2f}'.format(peak) if peak is not None else '-',
+            '{:.2f}x'.format(ratio) if ratio else '-'))
+        if ratio is not None and ratio < 1 - tolerance:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = ArgumentParser(description="Benchmark the harness components with a stand-in Mininet")
+    parser.add_argument('components', nargs='*', help="Components to run, default all: {}".format(
+        ', '.join(BENCHMARKS)))
+    parser.add_argument('--repeat', type=int, default=5, help="Runs per component, the fastest counts")
+    parser.add_argument('--baseline', default=BASELINE_FILE, help="Baseline JSON to compare against")
+    parser.add_argument('--save-baseline', action='store_true', help="Store the results as baseline")
+    parser.add_argument('--check', action='store_true', help="Exit with 1 if a component regressed")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="Allowed slowdown against the baseline")
+    args = parser.parse_args()
+
+    unknown = set(args.components) - set(BENCHMARKS)
+    if unknown:
+        parser.error('Unknown components {}'.format(', '.join(sorted(unknown))))
+
+    os.chdir(REPO_DIR)  # topologies are loaded relative to the repository
+    work_dir = tempfile.mkdtemp(prefix='mptcp_bench_')
+    results = collections.OrderedDict()
+    try:
+        for name, setup in BENCHMARKS.items():
+            if args.components and name not in args.components:
+                continue
+            try:
+                run, ops, unit = setup(work_dir)
+                results[name] = dict(measure(run, ops, 1 if ops is None else args.repeat), unit=unit)
+            except (Skipped, ImportError, SyntaxError) as e:
+                # orchestration modules are python 2 only, the analysis modules need pandas
+                results[name] = {'skipped': str(e)}
+    finally:
+        shutil.rmtree(work_dir)
+
+    baselines = {}
+    if os.path.isfile(args.baseline):
+        with open(args.baseline) as f:
+            baselines = json.load(f)
+    baseline = baselines.setdefault(PYTHON, {})
+    regressions = compare(results, baseline, args.tolerance)
+
+    if args.save_baseline:
+        baseline.update((name, result) for name, result in results.items() if 'skipped' not in result)
+        with open(args.baseline, 'w') as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+        print('Baseline written to {}'.format(args.baseline))
+    if regressions:
+        print('Slower than the baseline: {}'.format(', '.join(regressions)))
+        if args.check:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
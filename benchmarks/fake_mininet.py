@@ -0,0 +1,211 @@
+"""
+Stand-in for the parts of Mininet the harness uses. Networks are built in memory and every command a node would run
+is recorded instead of executed, so the orchestration code runs without root, Open vSwitch or an MPTCP kernel.
+
+    from benchmarks import fake_mininet
+    fake_mininet.install()  # before the first import of a module using mininet
+"""
+import re
+import sys
+import types
+
+# canned answers of errFail, keyed by the joined command
+RESPONSES = {
+    'sysctl -n net.ipv4.tcp_available_congestion_control': 'reno cubic lia olia balia wvegas\n',
+}
+
+commands = []
+
+
+def record(node, cmd):
+    commands.append((node, cmd))
+
+
+class FakeIntf(object):
+    def __init__(self, name, node, port):
+        self.name, self.node, self.port = name, node, port
+        self.ip, self.mac, self.params = None, None, {}
+
+    def config(self, ip=None, mac=None, **params):
+        self.ip, self.mac = ip, mac
+        self.params.update(params)
+        record(self.node.name, 'config {} ip={} mac={}'.format(self.name, ip, mac))
+        return {}
+
+    def IP(self):
+        return self.ip.split('/')[0] if self.ip else None
+
+    def __str__(self):
+        return self.name
+
+
+class FakeNode(object):
+    def __init__(self, name, in_namespace=True, **params):
+        self.name, self.inNamespace, self.params = name, in_namespace, params
+        self.intfs, self.pid, self.lastPid = [], None, None
+
+    def addIntf(self, intf):
+        self.intfs.append(intf)
+
+    def intfNames(self):
+        return [intf.name for intf in self.intfs]
+
+    def intfList(self):
+        return list(self.intfs)
+
+    def intf(self, name=None):
+        return self.intfs[0] if name is None else next(i for i in self.intfs if i.name == name)
+
+    def IP(self):
+        return self.intfs[0].IP() if self.intfs else None
+
+    def cmd(self, *args, **kwargs):
+        cmd = args[0] if len(args) == 1 else args
+        record(self.name, ' '.join(cmd) if isinstance(cmd, (list, tuple)) else cmd)
+        return ''
+
+    def sendCmd(self, *args, **kwargs):
+        self.cmd(*args, **kwargs)
+
+    def waitOutput(self, *args, **kwargs):
+        return '0'
+
+    def __str__(self):
+        return self.name
+
+
+class FakeLink(object):
+    def __init__(self, node1, node2, **params):
+        self.intf1 = FakeIntf('{}-eth{}'.format(node1.name, len(node1.intfs)), node1, len(node1.intfs))
+        node1.addIntf(self.intf1)
+        self.intf2 = FakeIntf('{}-eth{}'.format(node2.name, len(node2.intfs)), node2, len(node2.intfs))
+        node2.addIntf(self.intf2)
+        self.params = params
+
+
+class Topo(object):
+    """ Graph of node and link descriptions, the subset of mininet.topo.Topo the topologies use. """
+    def __init__(self, *args, **params):
+        self.node_info, self.link_info = {}, []
+        self.build(*args, **params)
+
+    def build(self, *args, **params):
+        pass
+
+    def addNode(self, name, **opts):
+        self.node_info[name] = opts
+        return name
+
+    def addHost(self, name, **opts):
+        return self.addNode(name, **opts)
+
+    def addSwitch(self, name, **opts):
+        opts['isSwitch'] = True
+        return self.addNode(name, **opts)
+
+    def addLink(self, node1, node2, **opts):
+        self.link_info.append((node1, node2, opts))
+        return node1, node2
+
+    def isSwitch(self, name):
+        return self.node_info[name].get('isSwitch', False)
+
+    def nodes(self, sort=True):
+        return sorted(self.node_info, key=natural_key) if sort else list(self.node_info)
+
+    def hosts(self, sort=True):
+        return [n for n in self.nodes(sort) if not self.isSwitch(n)]
+
+    def switches(self, sort=True):
+        return [n for n in self.nodes(sort) if self.isSwitch(n)]
+
+    def links(self, sort=False, withKeys=False, withInfo=False):
+        if withInfo:
+            return [(s, d, opts) for s, d, opts in self.link_info]
+        return [(s, d) for s, d, _ in self.link_info]
+
+    def nodeInfo(self, name):
+        return self.node_info[name]
+
+
+def natural_key(name):
+    return [int(part) if part.isdigit() else part for part in re.split(r'(\d+)', name)]
+
+
+class Mininet(object):
+    """ Network built from a Topo in memory, commands of the nodes are recorded in `commands`. """
+    def __init__(self, topo=None, link=None, **params):
+        self.topo, self.params = topo, params
+        self.nameToNode, self.hosts, self.switches, self.links = {}, [], [], []
+        if topo is not None:
+            self.build()
+
+    def build(self):
+        for name in self.topo.nodes():
+            node = FakeNode(name, in_namespace=not self.topo.isSwitch(name), **self.topo.nodeInfo(name))
+            self.nameToNode[name] = node
+            (self.switches if self.topo.isSwitch(name) else self.hosts).append(node)
+        for source, target, opts in self.topo.links(withInfo=True):
+            self.links.append(FakeLink(self.nameToNode[source], self.nameToNode[target], **opts))
+
+    def get(self, *names):
+        nodes = [self.nameToNode[name] for name in names]
+        return nodes[0] if len(nodes) == 1 else nodes
+
+    def linksBetween(self, node1, node2):
+        return [link for link in self.links if set((link.intf1.node, link.intf2.node)) == set((node1, node2))]
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def waitConnected(self, *args, **kwargs):
+        return True
+
+
+def errFail(cmd, *args, **kwargs):
+    key = ' '.join(cmd) if isinstance(cmd, (list, tuple)) else cmd
+    record('root', key)
+    return RESPONSES.get(key, ''), '', 0
+
+
+LOG_LEVELS = ['debug', 'info', 'output', 'warning', 'error', 'critical']
+_log_level = [None]  # silent until setLogLevel is called
+
+
+def setLogLevel(level):
+    _log_level[0] = level
+
+
+def _logger(level):
+    def log(msg, *args):
+        if _log_level[0] is not None and LOG_LEVELS.index(level) >= LOG_LEVELS.index(_log_level[0]):
+            sys.stderr.write(msg % args if args else msg)
+    return log
+
+
+def install():
+    """ Register the stand-in modules as `mininet`, unless they already are. """
+    if isinstance(sys.modules.get('mininet'), types.ModuleType) and getattr(sys.modules['mininet'], 'FAKE', False):
+        return
+    modules = {
+        'mininet': dict(FAKE=True),
+        'mininet.log': dict(info=_logger('info'), warn=_logger('warning'), error=_logger('error'),
+                            output=_logger('output'), debug=_logger('debug'), setLogLevel=setLogLevel),
+        'mininet.net': dict(Mininet=Mininet),
+        'mininet.topo': dict(Topo=Topo),
+        'mininet.node': dict(OVSBridge=object, CPULimitedHost=object),
+        'mininet.link': dict(TCLink=object),
+        'mininet.cli': dict(CLI=lambda net: None),
+        'mininet.util': dict(errFail=errFail),
+    }
+    for name, attributes in modules.items():
+        module = types.ModuleType(name)
+        module.__dict__.update(attributes)
+        sys.modules[name] = module
+    for name in modules:
+        if '.' in name:
+            parent, _, child = name.rpartition('.')
+            setattr(sys.modules[parent], child, sys.modules[name])
@@ -0,0 +1,89 @@
+"""
+Synthetic experiment outputs in the formats the harness produces: tcpdump captures, the tshark csv extracted from them
+and iperf3 client logs.
+"""
+import socket
+import struct
+
+import numpy as np
+
+PCAP_HEADER = struct.Struct('=IHHiIII')
+PCAP_RECORD = struct.Struct('=IIII')
+ETH_HEADER = struct.pack('!6s6sH', b'\x00\x00\x00\x00\x00\x02', b'\x00\x00\x00\x00\x00\x01', 0x0800)
+DUMP_COLUMNS = ['frame.time_relative', 'tcp.stream', 'ip.src', 'ip.dst', 'tcp.analysis.ack_rtt',
+                'tcp.options.mptcp.datalvllen']
+
+
+def tcp_packet(src, dst, sport, dport, seq, ack, flags, payload_len):
+    """ Ethernet frame of an IPv4/TCP segment, the payload is zeros. """
+    tcp = struct.pack('!HHIIBBHHH', sport, dport, seq, ack, 5 << 4, flags, 65535, 0, 0)
+    ip = struct.pack('!BBHHHBBH4s4s', 0x45, 0, 20 + len(tcp) + payload_len, 0, 0x4000, 64, 6, 0,
+                     socket.inet_aton(src), socket.inet_aton(dst))
+    return ETH_HEADER + ip + tcp + b'\x00' * payload_len
+
+
+def write_pcap(path, n_packets, flows=(('10.0.0.1', '10.0.0.2'), ('10.0.1.1', '10.0.1.2')), rtt=0.02, rate=1e4,
+               payload=1448, snaplen=96, seed=0):
+    """
+    Capture of bulk transfers over the given flows, every data segment is acknowledged one RTT later.
+
+    :param n_packets:   number of data segments over all flows
+    :param rtt:         mean round trip time [s]
+    :param rate:        data segments per second
+    :param snaplen:     bytes captured per packet, as with `tcpdump -s`
+    :return:            number of captured packets
+    """
+    rand = np.random.RandomState(seed)
+    sent = np.arange(n_packets) / float(rate)
+    acked = sent + rtt * (1 + 0.2 * rand.random_sample(n_packets))
+    events = sorted([(t, i, True) for i, t in enumerate(sent)] + [(t, i, False) for i, t in enumerate(acked)])
+
+    with open(path, 'wb') as f:
+        f.write(PCAP_HEADER.pack(0xa1b2c3d4, 2, 4, 0, 0, snaplen, 1))
+        for t, i, is_data in events:
+            flow = i % len(flows)
+            src, dst = flows[flow]
+            seq = 1 + (i // len(flows)) * payload
+            if is_data:
+                frame = tcp_packet(src, dst, 40000 + flow, 5201, seq, 1, 0x18, payload)
+            else:
+                frame = tcp_packet(dst, src, 5201, 40000 + flow, 1, seq + payload, 0x10, 0)
+            captured = frame[:snaplen]
+            f.write(PCAP_RECORD.pack(int(t), int(round((t % 1) * 1e6)), len(captured), len(frame)) + captured)
+    return len(events)
+
+
+def write_dump_csv(path, n_packets, n_streams=2, rtt=0.02, rate=1e4, payload=1428, seed=0):
+    """ tshark fields csv as written by MPMininetExp.calculate_rtt, every second row is an ack with an RTT sample. """
+    rand = np.random.RandomState(seed)
+    with open(path, 'w') as f:
+        f.write('\t'.join(DUMP_COLUMNS) + '\n')
+        for i in range(n_packets):
+            stream = i % n_streams
+            t = i / float(rate)
+            if i % 2:
+                f.write('{:.6f}\t{}\t10.0.{}.2\t10.0.{}.1\t{:.6f}\t\n'.format(
+                    t, stream, stream, stream, rtt * (1 + 0.2 * rand.random_sample())))
+            else:
+                f.write('{:.6f}\t{}\t10.0.{}.1\t10.0.{}.2\t\t{}\n'.format(t, stream, stream, stream, payload))
+
+
+def write_iperf_log(path, duration=60, interval=0.1, rate=9.6, seed=0):
+    """ iperf3 client log with the interval reports and the summary lines. """
+    rand = np.random.RandomState(seed)
+    lines = ['Connecting to host 10.0.0.2, port 5201',
+             '[  5] local 10.0.0.1 port 41234 connected to 10.0.0.2 port 5201',
+             '[ ID] Interval           Transfer     Bitrate         Retr  Cwnd']
+    for i in range(int(round(duration / interval))):
+        mbps = rate * (1 + 0.1 * rand.randn())
+        lines.append('[  5] {:6.2f}-{:<6.2f} sec  {:.2f} MBytes  {:.2f} Mbits/sec    0   43.8 KBytes'.format(
+            i * interval, (i + 1) * interval, mbps * interval / 8, mbps))
+    lines += ['- - - - - - - - - - - - - - - - - - - - - - - - -',
+              '[ ID] Interval           Transfer     Bitrate         Retr',
+              '[  5]   0.00-{:.2f}  sec  {:.1f} MBytes  {:.2f} Mbits/sec   12             sender'.format(
+                  duration, rate * duration / 8, rate),
+              '[  5]   0.00-{:.2f}  sec  {:.1f} MBytes  {:.2f} Mbits/sec                  receiver'.format(
+                  duration + 0.04, rate * duration / 8, rate),
+              '', 'iperf Done.']
+    with open(path, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
@@ -0,0 +1,309 @@
+"""
+Calibration of the link emulation: measure what the emulated paths of a topology actually deliver on this machine and
+compare it with the configured values. For every path, one after the other and with MPTCP disabled:
+    - base RTT with ping on the idle path
+    - single path TCP throughput with iperf3 bound to the interface of the path
+    - queueing delay under that load, compared with the queue size the bottleneck was configured with
+Finally all paths are loaded at once, which shows whether the machine keeps up with all links forwarding together.
+
+The fidelity report is stored per topology and link configuration in logs/calibration/, experiments with the same
+links reference it in their resource summary.
+"""
+import hashlib
+import json
+import os
+import platform
+import re
+import time
+
+from mininet.link import TCLink
+from mininet.log import info, output, warn
+from mininet.util import errFail
+
+from MPTopoligies import JsonTopo, MPMininetWrapper
+from resource_monitor import ResourceMonitor
+from topo_config import calculate_queue_size, emulated_latency, path_bottleneck, path_rtt
+
+# relative deviations from the configured values tolerated before a path is flagged
+TOLERANCES = {
+    'throughput': 0.1,
+    'rtt': 0.1,
+    'rtt_abs_ms': 0.5,  # small RTTs are dominated by the processing time of the host
+    'queue_delay': 0.3,
+}
+
+CALIBRATION_CC = 'cubic'  # loss based, fills the bottleneck buffer
+MTU = 1500
+MIN_DURATION = 3  # seconds of the load without loaded pings, slow start before and a margin to its end
+
+
+def fingerprint(config):
+    """ Identifier of the emulated network, i.e. the links with their bandwidth, latency and queue size. """
+    links = [(link.source, link.target, link.bandwidth, link.latency, q)
+             for link, q in zip(config.links, config.queue_sizes)]
+    return hashlib.sha1(json.dumps([config.topology_id, links]).encode()).hexdigest()[:12]
+
+
+def report_file(config, base_folder='./logs'):
+    return os.path.join(base_folder, 'calibration', config.topology_id, '{}.json'.format(fingerprint(config)))
+
+
+def load_report(config, base_folder='./logs'):
+    """ Fidelity report of the config, None if it was not calibrated on this machine yet. """
+    file_name = report_file(config, base_folder)
+    if not os.path.isfile(file_name):
+        return None
+    with open(file_name) as f:
+        return json.load(f)
+
+
+def parse_ping(out):
+    """ RTT samples [ms] of the replies in the output of ping. """
+    return [float(rtt) for rtt in re.findall(r'time=([\d.]+) ms', out)]
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q / 100.0 * (len(values) - 1))))] if values else None
+
+
+def expected_queue_delay(config, link_index):
+    """
+    Queueing delay [ms] of a full bottleneck buffer. Netem holds the packets in flight for the link latency within the
+    same queue limit, only the remaining packets of max_queue_size queue.
+    """
+    link = config.links[link_index]
+    rate = link.bandwidth * 1e6 / 8.0
+    in_flight = rate * emulated_latency(link.latency) / 1000.0 / MTU
+    return max(config.queue_sizes[link_index] - in_flight, 0) * MTU / rate * 1000.0
+
+
+def queue_occupancy(config, link_index, queue_delay):
+    """ Packets [pkts] held by the bottleneck at the measured queueing delay, including those in flight in netem. """
+    if queue_delay is None:
+        return None
+    link = config.links[link_index]
+    rate = link.bandwidth * 1e6 / 8.0
+    return (queue_delay + emulated_latency(link.latency)) / 1000.0 * rate / MTU
+
+
+def relative_error(measured, expected):
+    if measured is None or not expected:
+        return None
+    return (measured - expected) / float(expected)
+
+
+class Calibrator(object):
+    """ Measure every path of a running network built from a compiled TopoConfig. """
+    def __init__(self, net, config, duration=10, pings=20):
+        """
+        :param net:         started MPMininetWrapper network
+        :param config:      compiled TopoConfig the network was built from
+        :param duration:    seconds of load per path, more than MIN_DURATION
+        :param pings:       number of pings measuring the base RTT
+        """
+        if duration <= MIN_DURATION:
+            raise ValueError('Calibration needs more than {} s of load per path, got {}.'.format(MIN_DURATION,
+                                                                                                 duration))
+        self.net, self.config = net, config
+        self.duration, self.pings = duration, pings
+
+    def addresses(self, path):
+        plan, ids = self.net.address_plan, self.config.host_ids
+        return plan.ip(path.interface, ids[path.client]), plan.ip(path.interface, ids[path.server])
+
+    def start_load(self, path, port=5201):
+        """ Start an iperf3 transfer bound to the path, return the (server, client) processes. """
+        src, dst = self.addresses(path)
+        server = self.net.get(path.server).popen(['iperf3', '-s', '-1', '-B', dst, '-p', str(port)])
+        time.sleep(0.5)
+        client = self.net.get(path.client).popen(['iperf3', '-c', dst, '-B', src, '-p', str(port), '-t',
+                                                  str(self.duration), '-C', CALIBRATION_CC, '-J'])
+        return server, client
+
+    @staticmethod
+    def load_throughput(path, load):
+        """ Wait for the transfer to finish, return the sending rate [Mbps] or None if it failed. """
+        server, client = load
+        out, _ = client.communicate()
+        server.wait()
+        try:
+            return json.loads(out)['end']['sum_sent']['bits_per_second'] / 1e6
+        except (ValueError, KeyError):
+            warn('Calibration iperf3 on {} failed: {}\n'.format(path.client, out[-300:]))
+            return None
+
+    def measure_path(self, path):
+        """
+        Measure a single path on its own.
+
+        :return:    tuple (throughput [Mbps], base RTT [ms], queueing delay [ms]), None where the measurement failed
+        """
+        client = self.net.get(path.client)
+        src, dst = self.addresses(path)
+
+        out = client.cmd('ping -c {} -i 0.2 -I {} {}'.format(self.pings, src, dst))
+        base = parse_ping(out)[1:]  # the first ping includes the ARP resolution
+
+        load = self.start_load(path)
+        # ping after slow start, when the buffer is filled
+        time.sleep(min(2, self.duration / 4.0))
+        loaded_ping = client.popen(['ping', '-c', str(int((self.duration - MIN_DURATION) / 0.1)), '-i', '0.1', '-I',
+                                    src, dst])
+        throughput = self.load_throughput(path, load)
+        ping_out, _ = loaded_ping.communicate()
+
+        loaded = parse_ping(ping_out.decode() if isinstance(ping_out, bytes) else ping_out)
+        base_rtt = min(base) if base else None
+        queue_delay = percentile(loaded, 95) - base_rtt if loaded and base_rtt is not None else None
+        return throughput, base_rtt, queue_delay
+
+    def measure_concurrent(self):
+        """
+        Load all paths at once, as an experiment does. Hosts which emulate every path on its own can still fall short
+        once all links forward at their bandwidth, e.g. high bandwidths with many links.
+
+        :return:    list of throughputs [Mbps] per path
+        """
+        loads = [self.start_load(path, 5201 + i) for i, path in enumerate(self.config.paths)]
+        return [self.load_throughput(path, load) for path, load in zip(self.config.paths, loads)]
+
+    def path_report(self, path, throughput, base_rtt, queue_delay):
+        bottleneck = path_bottleneck(self.config.links, path)
+        expected = {
+            'bandwidth [Mbps]': self.config.links[bottleneck].bandwidth,
+            'rtt [ms]': path_rtt(self.config.links, path),
+            'queue delay [ms]': expected_queue_delay(self.config, bottleneck),
+        }
+        configured_rtt = 2 * sum(self.config.links[i].latency for i in path.links)
+        report = {
+            'client': path.client, 'server': path.server, 'interface': path.interface,
+            'bottleneck': [self.config.links[bottleneck].source, self.config.links[bottleneck].target],
+            'queue size [pkts]': self.config.queue_sizes[bottleneck],
+            # buffer the rule of thumb gives for this path alone, shared bottlenecks are sized for the longest path
+            'rule of thumb queue size [pkts]': calculate_queue_size(expected['rtt [ms]'], expected['bandwidth [Mbps]']),
+            'measured queue occupancy [pkts]': queue_occupancy(self.config, bottleneck, queue_delay),
+            'configured rtt [ms]': configured_rtt,
+            'expected': expected,
+            'measured': {'throughput [Mbps]': throughput, 'rtt [ms]': base_rtt, 'queue delay [ms]': queue_delay},
+            'error': {
+                'throughput': relative_error(throughput, expected['bandwidth [Mbps]']),
+                'rtt': relative_error(base_rtt, expected['rtt [ms]']),
+                'queue delay': relative_error(queue_delay, expected['queue delay [ms]']),
+            },
+        }
+
+        flags = []
+        if throughput is None or abs(report['error']['throughput']) > TOLERANCES['throughput']:
+            flags.append('throughput')
+        if base_rtt is None or (abs(report['error']['rtt']) > TOLERANCES['rtt'] and
+                                abs(base_rtt - expected['rtt [ms]']) > TOLERANCES['rtt_abs_ms']):
+            flags.append('rtt')
+        if queue_delay is None or (report['error']['queue delay'] is not None and
+                                   abs(report['error']['queue delay']) > TOLERANCES['queue_delay']):
+            flags.append('queue delay')
+        if abs(configured_rtt - expected['rtt [ms]']) > 1e-9:
+            # latencies up to 1ms are emulated as 0.1ms
+            flags.append('latency rounded')
+        report['flags'] = flags
+        return report
+
+    def run(self):
+        """
+        Calibrate all paths.
+
+        :return:    fidelity report
+        """
+        monitor = ResourceMonitor()
+        monitor.start()
+        paths = []
+        for path in self.config.paths:
+            info('Calibrating path {}-{} eth{}\n'.format(path.client, path.server, path.interface))
+            paths.append(self.path_report(path, *self.measure_path(path)))
+        info('Calibrating all paths concurrently\n')
+        concurrent = self.measure_concurrent()
+        monitor.stop()
+        resources = monitor.summary()
+
+        # the paths can share bottlenecks, all together they can at most reach the bandwidth of every bottleneck
+        bottlenecks = set(path_bottleneck(self.config.links, path) for path in self.config.paths)
+        single = [p['measured']['throughput [Mbps]'] for p in paths]
+        expected = min(sum(tp or 0 for tp in single), sum(self.config.links[i].bandwidth for i in bottlenecks))
+        aggregate = {
+            'throughput per path [Mbps]': concurrent,
+            'throughput [Mbps]': sum(tp or 0 for tp in concurrent),
+            'expected [Mbps]': expected,
+        }
+        aggregate['error'] = relative_error(aggregate['throughput [Mbps]'], expected)
+        aggregate['flags'] = [] if aggregate['error'] is not None and \
+            aggregate['error'] >= -TOLERANCES['throughput'] else ['throughput']
+
+        inaccurate = [p for p in paths if set(p['flags']) - {'latency rounded'}]
+        return {
+            'topology': self.config.topology_id,
+            'fingerprint': fingerprint(self.config),
+            'machine': platform.node(),
+            'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'tolerances': TOLERANCES,
+            'paths': paths,
+            'concurrent': aggregate,
+            'saturated': resources['saturated'],
+            'saturation reasons': resources['reasons'],
+            'accurate': not inaccurate and not aggregate['flags'] and not resources['saturated'],
+        }
+
+
+def write_report(report, config, base_folder='./logs'):
+    file_name = report_file(config, base_folder)
+    if not os.path.exists(os.path.dirname(file_name)):
+        os.makedirs(os.path.dirname(file_name))
+    with open(file_name, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    return file_name
+
+
+def print_report(report):
+    output('Calibration of {} ({}): {}\n'.format(report['topology'], report['fingerprint'],
+                                                  'accurate' if report['accurate'] else 'NOT accurate'))
+    for p in report['paths']:
+        measured, expected = p['measured'], p['expected']
+        output('  {}-{} eth{}: {} of {}Mbps, rtt {} of {:.2f}ms, queue delay {} of {:.2f}ms {}\n'.format(
+            p['client'], p['server'], p['interface'],
+            '{:.2f}'.format(measured['throughput [Mbps]']) if measured['throughput [Mbps]'] is not None else '-',
+            expected['bandwidth [Mbps]'],
+            '{:.2f}'.format(measured['rtt [ms]']) if measured['rtt [ms]'] is not None else '-', expected['rtt [ms]'],
+            '{:.2f}'.format(measured['queue delay [ms]']) if measured['queue delay [ms]'] is not None else '-',
+            expected['queue delay [ms]'], ','.join(p['flags'])))
+    concurrent = report['concurrent']
+    output('  all paths: {:.2f} of {:.2f}Mbps {}\n'.format(
+        concurrent['throughput [Mbps]'], concurrent['expected [Mbps]'], ','.join(concurrent['flags'])))
+    if report['saturated']:
+        output('  host saturated: {}\n'.format(', '.join(report['saturation reasons'])))
+
+
+def calibrate(config, duration=10, base_folder='./logs'):
+    """
+    Build the network of a compiled TopoConfig, calibrate all its paths and store the fidelity report.
+
+    :return:    tuple (report, report file)
+    """
+    # MPMininetExp references the reports, import here to avoid the circular import
+    from MPMininetExp import MPMininetExp
+
+    mptcp_enabled = int(errFail(['sysctl', '-n', 'net.mptcp.mptcp_enabled'])[0].strip() or 0)
+    # plain TCP, every path is measured on its own
+    MPMininetExp.set_sysctl_variable('net.mptcp.mptcp_enabled', 0)
+    topo = JsonTopo(config)
+    net = MPMininetWrapper(topo=topo, link=TCLink)
+    try:
+        net.start()
+        if any(topo.nodeInfo(s).get('stp') for s in topo.switches()):
+            net.waitConnected()
+        report = Calibrator(net, config, duration=duration).run()
+    finally:
+        net.stop()
+        MPMininetExp.set_sysctl_variable('net.mptcp.mptcp_enabled', mptcp_enabled)
+
+    file_name = write_report(report, config, base_folder)
+    print_report(report)
+    return report, file_name
@@ -0,0 +1,358 @@
+"""
+Compressed packet captures. tcpdump writes into a FIFO which a compressor drains, so captures are compressed while
+they are taken and never hit the disk uncompressed. Readers decompress into a pipe to tshark (`tshark -r -`), the
+decompressed capture never hits the disk either.
+
+tshark dissects on a single core. extract_fields_parallel splits a capture by TCP connection (every MPTCP subflow is
+one) into several tshark processes and merges their output into the order of the capture, extract_all processes the
+captures of several clients on a process pool.
+
+    <rep>_<client>_iperf_dump.pcap.gz     gzip, readable by tshark, wireshark and zcat
+    <rep>_<client>_iperf_dump.pcap.zst    zstd, less CPU per byte, requires zstd on the host
+    <rep>_<client>_iperf_dump.pcap        uncompressed
+"""
+import array
+import heapq
+import multiprocessing
+import os
+import shlex
+import struct
+import subprocess
+
+from mininet.log import info
+
+# name -> (compress command, decompress command, file extension)
+COMPRESSORS = {
+    'gzip': (['gzip', '-1', '-c'], ['gzip', '-d', '-c'], '.gz'),
+    'zstd': (['zstd', '-1', '-q', '-c'], ['zstd', '-d', '-q', '-c'], '.zst'),
+}
+
+RTT_FIELDS = ['frame.time_relative', 'tcp.stream', 'ip.src', 'ip.dst', 'tcp.analysis.ack_rtt',
+              'tcp.options.mptcp.datalvllen', 'tcp.len', 'frame.time_epoch']
+
+# pcap magic number -> (byte order, nanoseconds per timestamp fraction unit)
+PCAP_MAGIC = {b'\xd4\xc3\xb2\xa1': ('<', 1000), b'\xa1\xb2\xc3\xd4': ('>', 1000),
+              b'\x4d\x3c\xb2\xa1': ('<', 1), b'\xa1\xb2\x3c\x4d': ('>', 1)}
+# link type -> (offset of the ethertype, offset of the network header), tcpdump -i any writes Linux cooked captures
+LINK_TYPES = {1: (12, 14), 113: (14, 16), 276: (0, 20), 101: (None, 0), 228: (None, 0)}
+SPLIT_MIN_BYTES = 8 * 2 ** 20  # smaller captures are not worth splitting
+
+
+def check_compression(compression):
+    """ Raise ValueError for unknown compressions, None stores captures uncompressed. """
+    if compression is not None and compression not in COMPRESSORS:
+        raise ValueError('Unknown capture compression {}, available: {}.'.format(compression, sorted(COMPRESSORS)))
+    return compression
+
+
+def capture_file(pcap_file, compression):
+    """ File name of a capture stored with the given compression. """
+    return pcap_file + COMPRESSORS[compression][2] if compression else pcap_file
+
+
+def compression_of(file_name):
+    for compression, (_, _, extension) in COMPRESSORS.items():
+        if file_name.endswith(extension):
+            return compression
+    return None
+
+
+def start_capture(node, pcap_file, bpf_filter, compression=None, snaplen=None):
+    """
+    Capture in the background on a Mininet node, compressed on the fly.
+
+    :param pcap_file:   capture file without compression extension
+    :param bpf_filter:  tcpdump filter expression
+    :param snaplen:     bytes captured per packet, None captures whole packets; 128 keeps the headers with all TCP and
+                        MPTCP options, which is all the RTT analysis needs
+    :return:            tuple (stored file, tcpdump pid, compressor pid or None)
+    """
+    stored = capture_file(pcap_file, compression)
+    target, compressor_pid = pcap_file, None
+    if compression:
+        target = pcap_file + '.fifo'
+        node.cmd('rm -f {0}; mkfifo {0}'.format(target))
+        # started first, it opens the FIFO for reading and exits once tcpdump closed it
+        node.cmd(COMPRESSORS[compression][0] + ['<', target, '>', stored, '&'])
+        compressor_pid = node.lastPid
+
+    dump_cmd = ['tcpdump', '-i', 'any', '-w', target]
+    if snaplen:
+        dump_cmd += ['-s', snaplen]
+    dump_cmd += shlex.split(bpf_filter)
+    dump_cmd += ['&>', '/dev/null', '&']  # Note: trailing `&` lets the command run in the background
+    dump_cmd = [str(part) for part in dump_cmd]
+    info('Running on {}: \'{}\'\n'.format(node, ' '.join(dump_cmd)))
+    node.cmd(dump_cmd)
+    return stored, node.lastPid, compressor_pid
+
+
+def stop_capture(node, pcap_file, dump_pid, compressor_pid=None):
+    """ Interrupt tcpdump and wait until the capture is flushed and compressed. """
+    node.cmd('kill -SIGINT {0}; wait {0}'.format(dump_pid))
+    if compressor_pid:
+        node.cmd('wait {}; rm -f {}.fifo'.format(compressor_pid, pcap_file))
+
+
+def read_capture(capture, args, stdout=subprocess.PIPE):
+    """
+    Run tshark on a capture, compressed ones are decompressed into its stdin.
+
+    :param args:    further tshark arguments
+    :param stdout:  where tshark writes to, per default a pipe
+    :return:        subprocess.Popen of tshark
+    """
+    compression = compression_of(capture)
+    if compression is None:
+        return subprocess.Popen(['tshark', '-r', capture] + list(args), stdout=stdout, stderr=subprocess.PIPE)
+    decompress = subprocess.Popen(COMPRESSORS[compression][1] + [capture], stdout=subprocess.PIPE)
+    tshark = subprocess.Popen(['tshark', '-r', '-'] + list(args), stdin=decompress.stdout, stdout=stdout,
+                              stderr=subprocess.PIPE)
+    decompress.stdout.close()  # tshark holds the only read end, the decompressor stops if tshark exits early
+    return tshark
+
+
+def extract_fields(capture, out_file, fields=None):
+    """
+    Write packet fields of a capture as tab separated values with header, per default the RTT fields.
+
+    :return:    tshark's stderr
+    """
+    args = []
+    for field in fields or RTT_FIELDS:
+        args += ['-e', field]
+    args += ['-T', 'fields', '-E', 'header=y']
+    with open(out_file, 'w+') as f:
+        _, err = read_capture(capture, args, stdout=f).communicate()
+    return err
+
+
+def filter_capture(capture, display_filter):
+    """
+    Keep only the packets of a capture matching a tshark display filter, e.g. 'tcp.stream == 0' or
+    'frame.time_relative <= 10'. The capture is rewritten with its compression.
+    """
+    compression = compression_of(capture)
+    tmp_file = capture + '.tmp'
+    args = ['-Y', display_filter, '-F', 'pcap', '-w', '-']
+    with open(tmp_file, 'wb') as f:
+        if compression:
+            tshark = read_capture(capture, args)
+            compress = subprocess.Popen(COMPRESSORS[compression][0], stdin=tshark.stdout, stdout=f)
+            tshark.stdout.close()
+            err = tshark.stderr.read()
+            tshark.wait()
+            compress.wait()
+        else:
+            tshark = read_capture(capture, args, stdout=f)
+            _, err = tshark.communicate()
+    if tshark.returncode:
+        os.remove(tmp_file)
+        raise RuntimeError('Filtering {} with \'{}\' failed: {}'.format(capture, display_filter, err))
+    os.rename(tmp_file, capture)
+
+
+def open_capture(capture):
+    """ Binary file object of the uncompressed capture and the decompressor process, None if not compressed. """
+    compression = compression_of(capture)
+    if compression is None:
+        return open(capture, 'rb'), None
+    decompress = subprocess.Popen(COMPRESSORS[compression][1] + [capture], stdout=subprocess.PIPE)
+    return decompress.stdout, decompress
+
+
+def connection_of(link_type, frame):
+    """
+    Connection of a captured frame, the same for both directions.
+
+    :return:    tuple of the sorted (address, port) ends of an IPv4/IPv6 TCP segment, None for other packets
+    """
+    ethertype_offset, offset = LINK_TYPES[link_type]
+    if ethertype_offset is not None and frame[ethertype_offset:ethertype_offset + 2] not in (b'\x08\x00', b'\x86\xdd'):
+        return None
+    version = ord(frame[offset:offset + 1] or b'\x00') >> 4
+    if version == 4 and frame[offset + 9:offset + 10] == b'\x06':
+        header = (ord(frame[offset:offset + 1]) & 0x0f) * 4
+        src, dst = frame[offset + 12:offset + 16], frame[offset + 16:offset + 20]
+    elif version == 6 and frame[offset + 6:offset + 7] == b'\x06':
+        header = 40
+        src, dst = frame[offset + 8:offset + 24], frame[offset + 24:offset + 40]
+    else:
+        return None
+    ports = frame[offset + header:offset + header + 4]
+    if len(ports) < 4:
+        return None
+    return tuple(sorted(((src, ports[:2]), (dst, ports[2:]))))
+
+
+def split_capture(capture, pieces):
+    """
+    Distribute the packets of a pcap capture over several binary streams, every TCP connection goes to one stream,
+    new connections to the stream with the fewest bytes so far. Other packets, e.g. ARP, go to the first stream.
+
+    :param pieces:  writable binary file objects, each receives a complete pcap capture
+    :return:        tuple (list with an array of the frame numbers per piece, list with the timestamp [ns] of the
+                    first packet per piece or None, timestamp [ns] of the first packet of the capture)
+    :raises ValueError: if the capture is no pcap capture (e.g. pcapng) or of an unsupported link type
+    """
+    f, decompress = open_capture(capture)
+    try:
+        header = f.read(24)
+        if header[:4] not in PCAP_MAGIC:
+            raise ValueError('{} is no pcap capture.'.format(capture))
+        order, ns_per_unit = PCAP_MAGIC[header[:4]]
+        link_type = struct.unpack(order + 'I', header[20:24])[0] & 0x0fffffff
+        if link_type not in LINK_TYPES:
+            raise ValueError('{} has the unsupported link type {}.'.format(capture, link_type))
+        record = struct.Struct(order + 'IIII')
+
+        for piece in pieces:
+            piece.write(header)
+        frames = [array.array('l') for _ in pieces]
+        firsts, sizes, assigned = [None] * len(pieces), [0] * len(pieces), {}
+        first, number = None, 0
+        while True:
+            record_header = f.read(16)
+            if len(record_header) < 16:
+                break
+            seconds, fraction, captured, _ = record.unpack(record_header)
+            frame = f.read(captured)
+            number += 1
+            connection = connection_of(link_type, frame)
+            if connection is None:
+                i = 0
+            elif connection in assigned:
+                i = assigned[connection]
+            else:
+                i = assigned[connection] = sizes.index(min(sizes))
+            pieces[i].write(record_header + frame)
+            frames[i].append(number)
+            sizes[i] += 16 + captured
+            timestamp = seconds * 10 ** 9 + fraction * ns_per_unit
+            first = timestamp if first is None else first
+            firsts[i] = timestamp if firsts[i] is None else firsts[i]
+        return frames, firsts, first
+    finally:
+        f.close()
+        if decompress is not None:
+            decompress.wait()
+
+
+def parse_ns(seconds):
+    whole, _, fraction = seconds.partition('.')
+    return int(whole) * 10 ** 9 + int((fraction + '000000000')[:9])
+
+
+def format_ns(ns):
+    return '{}.{:09d}'.format(ns // 10 ** 9, ns % 10 ** 9)
+
+
+def merge_pieces(piece_files, frames, firsts, first, out_file, fields):
+    """
+    Merge the tshark output of the pieces of a capture into the order of the capture. Relative times are rebased to
+    the first packet of the capture and TCP streams renumbered by their first packet, like tshark does on the whole
+    capture.
+    """
+    time_column = fields.index('frame.time_relative') if 'frame.time_relative' in fields else None
+    stream_column = fields.index('tcp.stream') if 'tcp.stream' in fields else None
+    number_column = fields.index('frame.number') if 'frame.number' in fields else None
+
+    def rows(i):
+        with open(piece_files[i]) as f:
+            f.readline()  # header
+            for j, line in enumerate(f):
+                if j < len(frames[i]):
+                    yield frames[i][j], i, line
+
+    streams = {}  # (piece, stream in the piece) -> stream in the capture
+    with open(out_file, 'w') as out:
+        out.write('\t'.join(fields) + '\n')
+        for number, i, line in heapq.merge(*[rows(i) for i in range(len(piece_files))]):
+            values = line.rstrip('\n').split('\t')
+            if time_column is not None and values[time_column]:
+                values[time_column] = format_ns(parse_ns(values[time_column]) + firsts[i] - first)
+            if stream_column is not None and values[stream_column]:
+                values[stream_column] = str(streams.setdefault((i, values[stream_column]), len(streams)))
+            if number_column is not None:
+                values[number_column] = str(number)
+            out.write('\t'.join(values) + '\n')
+
+
+def extract_fields_parallel(capture, out_file, fields=None, workers=None):
+    """
+    Like extract_fields, with the capture split by TCP connection over several tshark processes. Only valid for fields
+    which depend on the packet or its TCP connection, e.g. the RTT fields, MPTCP analysis across subflows
+    (tshark's mptcp.analyze_mptcp) would need the whole capture.
+
+    :param workers: tshark processes, default the number of cores; small or unsupported captures use one
+    :return:        tshark's stderr
+    """
+    fields = list(fields or RTT_FIELDS)
+    workers = workers or multiprocessing.cpu_count()
+    if workers <= 1 or os.path.getsize(capture) < SPLIT_MIN_BYTES:
+        return extract_fields(capture, out_file, fields)
+
+    args = ['-r', '-', '-T', 'fields', '-E', 'header=y']
+    for field in fields:
+        args += ['-e', field]
+    piece_files = ['{}.{}'.format(out_file, i) for i in range(workers)]
+    outputs = [open(piece_file, 'w') for piece_file in piece_files]
+    errors = [open(piece_file + '.err', 'w+') for piece_file in piece_files]
+    tsharks = [subprocess.Popen(['tshark'] + args, stdin=subprocess.PIPE, stdout=out, stderr=err)
+               for out, err in zip(outputs, errors)]
+    try:
+        try:
+            frames, firsts, first = split_capture(capture, [tshark.stdin for tshark in tsharks])
+        finally:
+            for tshark in tsharks:
+                tshark.stdin.close()
+                tshark.wait()
+            for out in outputs:
+                out.close()
+        err = ''
+        for error in errors:
+            error.seek(0)
+            err += error.read()
+        if any(tshark.returncode for tshark in tsharks):
+            raise RuntimeError('tshark failed on a piece of {}: {}'.format(capture, err))
+        if first is not None:
+            merge_pieces(piece_files, frames, firsts, first, out_file, fields)
+        else:
+            with open(out_file, 'w') as out:
+                out.write('\t'.join(fields) + '\n')
+    except ValueError:
+        return extract_fields(capture, out_file, fields)
+    finally:
+        for error in errors:
+            error.close()
+        for piece_file in piece_files:
+            for name in (piece_file, piece_file + '.err'):
+                if os.path.exists(name):
+                    os.remove(name)
+    return err
+
+
+def _extract_job(job):
+    return extract_fields_parallel(*job)
+
+
+def extract_all(jobs, fields=None, processes=None):
+    """
+    Extract the fields of several captures at once, e.g. of all clients of an experiment. The captures are processed
+    on a pool of processes, which split them further if there are more cores than captures.
+
+    :param jobs:        list of tuples (capture, out file)
+    :param processes:   cores to use, default all
+    :return:            list of tshark's stderr per job
+    """
+    processes = processes or multiprocessing.cpu_count()
+    per_capture = max(1, processes // max(1, len(jobs)))
+    jobs = [(capture, out_file, fields, per_capture) for capture, out_file in jobs]
+    if len(jobs) <= 1 or processes <= 1:
+        return [_extract_job(job) for job in jobs]
+    pool = multiprocessing.Pool(min(len(jobs), processes))
+    try:
+        return pool.map(_extract_job, jobs)
+    finally:
+        pool.terminate()
+        pool.join()
@@ -0,0 +1,205 @@
+"""
+Statistical comparison of congestion controls over all cells (e.g. topology, bandwidth, delay) of a sweep. Every
+statistic is computed for all cells at once on an array (cells, ccs, repetitions), cells with fewer repetitions are
+padded with NaN.
+
+    ranking, pairs = comparison.compare(df, 'h2_tp', cell_columns=['topology', 'bw', 'delay'])
+    comparison.significance_matrix(pairs, ('two_paths', 10, 10.0))
+"""
+import collections
+import itertools
+
+import numpy as np
+import pandas as pd
+
+Comparison = collections.namedtuple('Comparison', ['ranking', 'pairs'])
+
+# upper bound of array elements materialized at once when resampling
+CHUNK_ELEMENTS = 2 ** 24
+
+
+def to_array(df, value, cell_columns, cc_column='cc', rep_column='repetition'):
+    """
+    Reshape a long DataFrame, one row per experiment, into an array.
+
+    :return:    tuple (array cells x ccs x repetitions, cell index, cc names)
+    """
+    cell_columns = list(cell_columns)
+    table = df.set_index(cell_columns + [cc_column, rep_column])[value].unstack(rep_column).unstack(cc_column)
+    ccs = list(table.columns.get_level_values(cc_column).unique())
+    reps = table.columns.get_level_values(rep_column).unique()
+    table = table.reindex(columns=pd.MultiIndex.from_product([reps, ccs], names=[rep_column, cc_column]))
+    values = table.values.astype(np.float64).reshape(len(table), len(reps), len(ccs)).transpose(0, 2, 1)
+    return values, table.index, ccs
+
+
+def _compact(values):
+    """ Move the NaN padding of the last axis to the end, return the compacted values and the valid counts. """
+    return np.sort(values, axis=-1), np.sum(np.isfinite(values), axis=-1)
+
+
+def bootstrap_ci(values, n_boot=2000, alpha=0.05, seed=0):
+    """
+    Percentile bootstrap confidence interval of the mean over the last axis. Rows with the same number of repetitions
+    share the resampling weights, which turns the resampling of all rows into a single matrix product.
+
+    :param values:  array (..., repetitions), NaN marks missing repetitions
+    :param n_boot:  number of bootstrap resamples
+    :param alpha:   1 - confidence level
+    :return:        tuple of arrays (low, high) with the shape of the leading axes
+    """
+    rand = np.random.RandomState(seed)
+    values, counts = _compact(np.asarray(values, dtype=np.float64))
+    shape, reps = values.shape[:-1], values.shape[-1]
+    values, counts = values.reshape(-1, reps), counts.reshape(-1)
+
+    low, high = np.full(len(values), np.nan), np.full(len(values), np.nan)
+    for n in np.unique(counts[counts > 0]):
+        rows = np.flatnonzero(counts == n)
+        # how often every repetition is drawn per resample
+        weights = rand.multinomial(n, [1.0 / n] * n, size=n_boot).T / float(n)
+        chunk = max(1, CHUNK_ELEMENTS // n_boot)
+        for start in range(0, len(rows), chunk):
+            selected = rows[start:start + chunk]
+            means = values[selected, :n].dot(weights)
+            low[selected], high[selected] = np.percentile(means, [100 * alpha / 2, 100 * (1 - alpha / 2)], axis=-1)
+    return low.reshape(shape), high.reshape(shape)
+
+
+def sign_flips(reps, n_perm, rand):
+    """ Sign vectors (n, reps) of a paired permutation test, all 2^reps of them if that is not more than n_perm. """
+    if 2 ** reps <= n_perm:
+        return 1 - 2 * ((np.arange(2 ** reps)[:, None] >> np.arange(reps)) & 1).astype(np.float64)
+    return rand.choice([-1.0, 1.0], size=(n_perm, reps))
+
+
+def paired_permutation_test(a, b, n_perm=5000, seed=0):
+    """
+    Two sided paired permutation (sign flip) test of the mean difference, repetitions are paired by their index and
+    only repetitions present in both a and b are used. Small repetition counts are tested exactly.
+
+    :param a:       array (..., repetitions)
+    :param b:       array (..., repetitions)
+    :param n_perm:  number of random sign flips
+    :return:        array of p-values with the shape of the leading axes
+    """
+    rand = np.random.RandomState(seed)
+    diff = np.asarray(a, dtype=np.float64) - np.asarray(b, dtype=np.float64)
+    shape, reps = diff.shape[:-1], diff.shape[-1]
+    diff = diff.reshape(-1, reps)
+    n = np.sum(np.isfinite(diff), axis=-1)
+    diff = np.where(np.isfinite(diff), diff, 0)
+
+    signs = sign_flips(reps, n_perm, rand)
+    observed = np.abs(diff.sum(axis=-1))
+    p = np.empty(len(diff))
+    chunk = max(1, CHUNK_ELEMENTS // (len(signs) * max(reps, 1)))
+    for start in range(0, len(diff), chunk):
+        permuted = np.abs(diff[start:start + chunk].dot(signs.T))  # rows x permutations
+        extreme = np.sum(permuted >= observed[start:start + chunk, None] * (1 - 1e-12), axis=-1)
+        if 2 ** reps <= n_perm:
+            p[start:start + chunk] = extreme / float(len(signs))
+        else:
+            p[start:start + chunk] = (extreme + 1) / float(len(signs) + 1)
+    p[n < 2] = np.nan
+    return p.reshape(shape)
+
+
+def cohens_d(a, b):
+    """ Paired effect size, mean over standard deviation of the differences. """
+    diff = np.asarray(a, dtype=np.float64) - np.asarray(b, dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.nanmean(diff, axis=-1) / np.nanstd(diff, axis=-1, ddof=1)
+
+
+def cliffs_delta(a, b):
+    """ Unpaired effect size, P(a > b) - P(a < b) over all pairs of repetitions. """
+    a, b = np.asarray(a, dtype=np.float64)[..., :, None], np.asarray(b, dtype=np.float64)[..., None, :]
+    valid = np.isfinite(a) & np.isfinite(b)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return (np.sum((a > b) & valid, axis=(-2, -1)) - np.sum((a < b) & valid, axis=(-2, -1))) / \
+            np.sum(valid, axis=(-2, -1)).astype(np.float64)
+
+
+def holm(p_values):
+    """ Holm-Bonferroni adjusted p-values along the last axis, NaN p-values are not counted as tests. """
+    p = np.asarray(p_values, dtype=np.float64)
+    order = np.argsort(np.where(np.isnan(p), np.inf, p), axis=-1)
+    sorted_p = np.take_along_axis(p, order, axis=-1)
+    m = np.sum(np.isfinite(p), axis=-1)[..., None]
+    adjusted = np.minimum(np.maximum.accumulate(np.where(np.isnan(sorted_p), 0, sorted_p) *
+                                                (m - np.arange(p.shape[-1])), axis=-1), 1)
+    adjusted = np.where(np.isnan(sorted_p), np.nan, adjusted)
+    result = np.empty_like(adjusted)
+    np.put_along_axis(result, order, adjusted, axis=-1)
+    return result
+
+
+def compare(df, value, cell_columns, cc_column='cc', rep_column='repetition', higher_is_better=True, n_boot=2000,
+            n_perm=5000, alpha=0.05, seed=0):
+    """
+    Compare all congestion controls within every cell of a sweep.
+
+    :param df:              long DataFrame, one row per experiment repetition
+    :param value:           column to compare, e.g. 'h2_tp'
+    :param cell_columns:    columns identifying a cell, e.g. ['topology', 'bw', 'delay']
+    :param higher_is_better: rank by descending mean, e.g. throughput, else ascending, e.g. RTT
+    :param alpha:           significance level, also sets the confidence level of the intervals
+    :return:                Comparison(ranking, pairs), ranking has one row per cell and cc with mean, bootstrap CI
+                            and rank, pairs one row per cell and cc pair with mean difference, p-values (raw and
+                            Holm adjusted within the cell), effect sizes and whether the difference is significant
+    """
+    values, cells, ccs = to_array(df, value, cell_columns, cc_column, rep_column)
+    cell_frame = cells.to_frame(index=False)
+
+    # ranking
+    with np.errstate(invalid='ignore'):
+        means = np.nanmean(values, axis=-1)
+    low, high = bootstrap_ci(values, n_boot=n_boot, alpha=alpha, seed=seed)
+    order_values = -means if higher_is_better else means
+    ranks = pd.DataFrame(order_values).rank(axis=1, method='min').values
+    ranking = pd.DataFrame({
+        cc_column: np.tile(ccs, len(cells)),
+        'n': np.sum(np.isfinite(values), axis=-1).ravel(),
+        'mean': means.ravel(), 'ci low': low.ravel(), 'ci high': high.ravel(), 'rank': ranks.ravel(),
+    })
+    ranking = pd.concat([cell_frame.loc[cell_frame.index.repeat(len(ccs))].reset_index(drop=True), ranking], axis=1)
+
+    # pairwise tests, all pairs of all cells at once
+    pairs = list(itertools.combinations(range(len(ccs)), 2))
+    a, b = values[:, [i for i, _ in pairs]], values[:, [j for _, j in pairs]]
+    p = paired_permutation_test(a, b, n_perm=n_perm, seed=seed) if pairs else np.empty((len(cells), 0))
+    p_holm = holm(p) if pairs else p
+    pair_frame = pd.DataFrame({
+        'cc a': np.tile([ccs[i] for i, _ in pairs], len(cells)),
+        'cc b': np.tile([ccs[j] for _, j in pairs], len(cells)),
+        'mean diff': np.nanmean(a - b, axis=-1).ravel() if pairs else [],
+        'p': p.ravel(), 'p holm': p_holm.ravel(),
+        'cohens d': cohens_d(a, b).ravel(), 'cliffs delta': cliffs_delta(a, b).ravel(),
+    })
+    pair_frame['significant'] = pair_frame['p holm'] < alpha
+    pair_frame = pd.concat([cell_frame.loc[cell_frame.index.repeat(len(pairs))].reset_index(drop=True), pair_frame],
+                           axis=1)
+    return Comparison(ranking, pair_frame)
+
+
+def significance_matrix(pairs, cell, column='p holm'):
+    """
+    Symmetric cc x cc matrix of a pair statistic for one cell.
+
+    :param pairs:   pairs table of `compare`
+    :param cell:    tuple of the cell column values, in the order of the cell columns
+    :param column:  statistic to show, e.g. 'p holm', 'significant' or 'cliffs delta' (sign flipped below diagonal)
+    :return:        DataFrame indexed by cc
+    """
+    cell_columns = list(pairs.columns[:list(pairs.columns).index('cc a')])
+    selected = pairs
+    for name, value in zip(cell_columns, cell):
+        selected = selected[selected[name] == value]
+    ccs = sorted(set(selected['cc a']) | set(selected['cc b']))
+    matrix = pd.DataFrame(np.nan, index=ccs, columns=ccs, dtype=object if column == 'significant' else np.float64)
+    antisymmetric = column in ('mean diff', 'cohens d', 'cliffs delta')
+    for _, row in selected.iterrows():
+        matrix.loc[row['cc a'], row['cc b']] = row[column]
+        matrix.loc[row['cc b'], row['cc a']] = -row[column] if antisymmetric else row[column]
+    return matrix
@@ -0,0 +1,396 @@
+"""
+Flow completion time (FCT) workload: instead of one iperf bulk transfer, every client runs many fixed-size transfers
+to its server, `concurrency` of them at once, each slot starting its next transfer `gap` seconds after the previous one
+completed, with sizes drawn from a distribution. A sweep selects it with its workload:
+
+    "workload": {"mode": "fct", "runtime": 30, "interval": 0.1, "concurrency": 2,
+                 "sizes": {"distribution": "cdf", "points": [[10000, 0.5], [100000, 0.8], [10000000, 1.0]]}}
+
+Transfers are issued during `runtime` seconds and may complete `timeout` seconds later. Every transfer opens its own
+connection, the FCT includes the (MPTCP) handshake and slow start. It lasts from the connect of the client until the
+server read the last byte; Mininet hosts share the monotonic clock, the server returns the time it read the last byte
+and the client subtracts its start, without the half RTT the client would wait for the reply.
+
+    <logs>/fct/<logs dir>/<rep>_<client>_fct.csv    one line per transfer, see COLUMNS
+    <logs>/fct_summary.csv                          FCT distributions per topology, cc and size bucket, see summarize
+
+Run as script on a host:
+    python fct.py server
+    python fct.py client -s 10.0.0.2 -t 30 -c lia -S 0 -o 0_h1_fct.csv -w '{"sizes": {"distribution": "fixed", ...}}'
+    python fct.py summary logs
+"""
+import bisect
+import csv
+import errno
+import json
+import os
+import random
+import select
+import socket
+import struct
+import sys
+from argparse import ArgumentParser
+
+try:
+    from shlex import quote
+except ImportError:
+    from pipes import quote
+
+from monotonic import monotonic  # Monotonic time to avoid issues from NTP adjustments
+
+from background import CHUNK, TCP_CONGESTION, Loop
+
+PORT = 5401  # iperf3 uses 5201, the background sinks 5301
+FOLDER = 'fct'  # experiments of the FCT workload are logged below <logs>/fct, next to the bulk ones
+Summary_file = '{}/fct_summary.csv'
+
+# distribution -> parameters with their defaults, None is required
+SIZE_DISTRIBUTIONS = {
+    'fixed': {'size': None},  # every transfer [bytes]
+    'choice': {'sizes': None},  # uniformly one of the listed sizes [bytes]
+    'pareto': {'mean': None, 'shape': 1.2},  # heavy-tailed with the given mean [bytes]
+    'cdf': {'points': None},  # empirical, [[size, cumulative probability], ...] interpolated linearly
+}
+OPTIONS = {'concurrency': 1, 'gap': 0.0, 'timeout': 10.0}
+COLUMNS = ['transfer', 'slot', 'size [bytes]', 'start [s]', 'connect [s]', 'fct [s]', 'response [s]', 'status']
+# upper bounds [bytes] of the size buckets of the summary, the last bucket is open
+SIZE_BUCKETS = (10e3, 100e3, 1e6, 10e6)
+QUANTILES = (0.5, 0.95, 0.99)
+RETRY = 0.1  # least gap [s] after a failed transfer
+
+_payload = memoryview(b'\0' * CHUNK)
+_timestamp = struct.Struct('!d')
+
+
+def is_fct(workload):
+    return workload.get('mode', 'bulk') == 'fct'
+
+
+def check_workload(workload):
+    """ Check the workload of a sweep spec, raises ValueError describing the first problem found. """
+    mode = workload.get('mode', 'bulk')
+    if mode not in ('bulk', 'fct'):
+        raise ValueError('Unknown workload mode {}, use bulk or fct.'.format(mode))
+    if mode == 'bulk':
+        return
+    sizes = workload.get('sizes')
+    if not isinstance(sizes, dict) or sizes.get('distribution') not in SIZE_DISTRIBUTIONS:
+        raise ValueError('FCT workload requires "sizes" with a "distribution" of {}. {}'.format(
+            sorted(SIZE_DISTRIBUTIONS), sizes))
+    defaults = SIZE_DISTRIBUTIONS[sizes['distribution']]
+    unknown = set(sizes) - set(defaults) - {'distribution'}
+    missing = [key for key, value in defaults.items() if sizes.get(key, value) is None]
+    if unknown or missing:
+        raise ValueError('FCT size distribution {} takes the parameters {}. {}'.format(
+            sizes['distribution'], sorted(defaults), sizes))
+    params = dict(defaults, **sizes)
+    if sizes['distribution'] == 'fixed':
+        valid = params['size'] >= 1
+    elif sizes['distribution'] == 'choice':
+        valid = len(params['sizes']) > 0 and min(params['sizes']) >= 1
+    elif sizes['distribution'] == 'pareto':
+        valid = params['mean'] >= 1 and params['shape'] > 1
+    else:
+        points = params['points']
+        valid = len(points) > 0 and points[0][0] >= 1 and points[-1][1] == 1 and \
+            all(a[0] < b[0] and a[1] <= b[1] for a, b in zip(points, points[1:]))
+    if not valid:
+        raise ValueError('Invalid FCT size distribution, sizes are at least 1 byte, the Pareto shape exceeds 1 and '
+                         'CDF points increase up to probability 1. {}'.format(sizes))
+
+    options = dict(OPTIONS, **dict((key, workload[key]) for key in OPTIONS if key in workload))
+    if int(options['concurrency']) != options['concurrency'] or options['concurrency'] < 1 or options['gap'] < 0 or \
+            options['timeout'] <= 0:
+        raise ValueError('FCT workload requires an integer concurrency >= 1, gap >= 0 and timeout > 0 [s]. {}'.format(
+            workload))
+
+
+def sample_size(sizes, rand):
+    """
+    Size [bytes] of the next transfer.
+
+    :param sizes:   size distribution of the workload, see SIZE_DISTRIBUTIONS
+    :param rand:    random.Random of the slot
+    """
+    params = dict(SIZE_DISTRIBUTIONS[sizes['distribution']], **sizes)
+    if sizes['distribution'] == 'fixed':
+        return int(params['size'])
+    if sizes['distribution'] == 'choice':
+        return int(rand.choice(params['sizes']))
+    if sizes['distribution'] == 'pareto':
+        scale = params['mean'] * (params['shape'] - 1.0) / params['shape']
+        return max(1, int(scale / (1.0 - rand.random()) ** (1.0 / params['shape'])))
+    points = params['points']
+    p = rand.random()
+    i = bisect.bisect_left([point[1] for point in points], p)
+    if i == 0:
+        return int(points[0][0])
+    (low, p_low), (high, p_high) = points[i - 1], points[i]
+    return max(1, int(round(low + (high - low) * (p - p_low) / (p_high - p_low))))
+
+
+class Transfer(object):
+    def __init__(self, index, slot, size, start):
+        self.index, self.slot, self.size, self.start = index, slot, size, start
+        self.connect = self.fct = self.response = None
+        self.sent, self.reply, self.status = 0, b'', 'running'
+
+    def row(self, t0):
+        times = ['' if t is None else '{:.6f}'.format(t) for t in (self.connect, self.fct, self.response)]
+        return [self.index, self.slot, self.size, '{:.6f}'.format(self.start - t0)] + times + [self.status]
+
+
+class Client(object):
+    """ Transfers of one client, `concurrency` slots each running one transfer after the other. """
+    def __init__(self, loop, server, workload, runtime, cc=None, seed=None):
+        """
+        :param server:      address of the server
+        :param workload:    workload of the sweep, see check_workload
+        :param runtime:     seconds during which transfers are started
+        :param cc:          congestion control of the connections, None keeps the system default
+        :param seed:        seed of the sizes, every slot draws the same sizes for every congestion control
+        """
+        self.loop, self.server, self.runtime, self.cc = loop, server, runtime, cc
+        self.sizes = workload['sizes']
+        options = dict(OPTIONS, **dict((key, workload[key]) for key in OPTIONS if key in workload))
+        self.gap = options['gap']
+        self.records = []
+        self.slots = int(options['concurrency'])
+        for slot in range(self.slots):
+            rand = random.Random('{}-{}'.format(seed, slot))
+            self.loop.at(0, lambda slot=slot, rand=rand: self.transfer(slot, rand))
+        self.loop.at(runtime + options['timeout'], self.loop.stop)
+
+    def transfer(self, slot, rand):
+        if self.loop.now() >= self.runtime:
+            # the slot is done, the client once the last slot is
+            self.slots -= 1
+            if not self.slots:
+                self.loop.stop()
+            return
+        record = Transfer(len(self.records), slot, sample_size(self.sizes, rand), monotonic())
+        self.records.append(record)
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setblocking(False)
+        if self.cc is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, TCP_CONGESTION, self.cc.encode())
+        if sock.connect_ex((self.server, PORT)) not in (0, errno.EINPROGRESS):
+            self.finish(sock, record, 'failed', slot, rand, registered=False)
+            return
+
+        def handle(events):
+            try:
+                if record.connect is None:
+                    if sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR):
+                        self.finish(sock, record, 'failed', slot, rand)
+                        return
+                    record.connect = monotonic() - record.start
+                if record.sent < record.size and events & select.POLLOUT:
+                    record.sent += sock.send(_payload[:min(CHUNK, record.size - record.sent)])
+                    if record.sent >= record.size:
+                        sock.shutdown(socket.SHUT_WR)
+                        self.loop.modify(sock, select.POLLIN)
+                elif events & (select.POLLIN | select.POLLHUP | select.POLLERR):
+                    data = sock.recv(_timestamp.size)
+                    record.reply += data
+                    if data:
+                        return
+                    if len(record.reply) != _timestamp.size:
+                        self.finish(sock, record, 'failed', slot, rand)
+                        return
+                    # the server read the last byte at this time of the shared monotonic clock
+                    record.fct = _timestamp.unpack(record.reply)[0] - record.start
+                    record.response = monotonic() - record.start
+                    self.finish(sock, record, 'done', slot, rand)
+            except socket.error as e:
+                if e.args[0] != errno.EAGAIN:
+                    self.finish(sock, record, 'failed', slot, rand)
+        self.loop.register(sock, select.POLLOUT, handle)
+
+    def finish(self, sock, record, status, slot, rand, registered=True):
+        record.status = status
+        if registered:
+            self.loop.unregister(sock)
+        sock.close()
+        # a failing server is not hammered with connections until the runtime is over
+        gap = self.gap if status == 'done' else max(self.gap, RETRY)
+        self.loop.at(self.loop.now() + gap, lambda: self.transfer(slot, rand))
+
+    def write(self, out_file):
+        with open(out_file, 'w') as f:
+            writer = csv.writer(f, delimiter='\t', lineterminator='\n')
+            writer.writerow(COLUMNS)
+            for record in self.records:
+                if record.status == 'running':
+                    record.status = 'incomplete'
+                writer.writerow(record.row(self.loop.t0))
+        return sum(1 for record in self.records if record.status == 'done')
+
+
+class Server(object):
+    """ Reads the transfers of the clients and returns the time it read their last byte. """
+    def __init__(self, loop, address=''):
+        self.loop, self.transfers, self.bytes = loop, 0, 0
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.listener.bind((address, PORT))
+        self.listener.listen(128)
+        self.listener.setblocking(False)
+        self.loop.register(self.listener, select.POLLIN, self.accept)
+
+    def accept(self, _):
+        try:
+            conn, _ = self.listener.accept()
+        except socket.error:
+            return
+        conn.setblocking(False)
+        last = [None]
+
+        def receive(_):
+            try:
+                data = conn.recv(CHUNK)
+            except socket.error as e:
+                if e.args[0] == errno.EAGAIN:
+                    return
+                data = None
+            if data:
+                last[0] = monotonic()
+                self.bytes += len(data)
+                return
+            if data is not None and last[0] is not None:
+                self.transfers += 1
+                try:
+                    conn.send(_timestamp.pack(last[0]))
+                except socket.error:
+                    pass  # the client counts the transfer as failed
+            self.loop.unregister(conn)
+            conn.close()
+        self.loop.register(conn, select.POLLIN, receive)
+
+
+def client_cmd(server, runtime, workload, out_file, cc=None, seed=None):
+    """ Command running the transfers of a client, see Client, exits with 1 if no transfer completed. """
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fct.py')
+    cmd = [sys.executable, script, 'client', '-s', server, '-t', runtime, '-o', out_file,
+           '-w', quote(json.dumps(workload))]
+    if cc is not None:
+        cmd += ['-c', cc]
+    if seed is not None:
+        cmd += ['-S', seed]
+    return [str(part) for part in cmd]
+
+
+def server_cmd():
+    """ Command running the server, stopped by an interrupt. """
+    return [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fct.py'), 'server']
+
+
+def log_folder(base_folder, workload):
+    """ Root of the log tree of the experiments of a workload. """
+    return os.path.join(base_folder, FOLDER) if is_fct(workload) else base_folder
+
+
+def size_bucket(size, buckets=SIZE_BUCKETS):
+    """ Label of the size bucket of a transfer, e.g. '10KB-100KB'. """
+    def label(size):
+        for factor, unit in ((1e6, 'MB'), (1e3, 'KB')):
+            if size >= factor:
+                return '{:g}{}'.format(size / factor, unit)
+        return '{:g}B'.format(size)
+    i = bisect.bisect_right(buckets, size - 1)
+    if i == len(buckets):
+        return '>{}'.format(label(buckets[-1]))
+    return '{}-{}'.format(label(buckets[i - 1]) if i else '0', label(buckets[i]))
+
+
+def read_tree(base_folder):
+    """
+    Transfers of all FCT experiments of a log tree, walking it once.
+
+    :param base_folder: root of the log tree, the experiments are below <base folder>/fct
+    :return:            pandas DataFrame, one row per transfer with topology, cc, links (bandwidths and delays of the
+                        logs dir), logs dir, repetition and client
+    """
+    import pandas as pd
+    root, frames = os.path.join(base_folder, FOLDER), []
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            if not name.endswith('_fct.csv'):
+                continue
+            rep, client = name.split('_')[:2]
+            logs_dir = os.path.relpath(dirpath, root)
+            df = pd.read_csv(os.path.join(dirpath, name), delimiter='\t')
+            parts = logs_dir.split(os.sep)
+            df['topology'], df['cc'], df['links'] = parts[0], parts[1], '/'.join(parts[2:])
+            df['logs_dir'], df['repetition'], df['client'] = logs_dir.replace(os.sep, '/'), int(rep), client
+            frames.append(df)
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=COLUMNS)
+
+
+def summarize(transfers, by=('topology', 'cc'), buckets=SIZE_BUCKETS, quantiles=QUANTILES):
+    """
+    FCT distribution per group and size bucket: transfers, share completed, mean and quantiles of the FCT of the
+    completed ones. Transfers which did not complete are left out of the FCT statistics, not counted with the timeout.
+
+    :param transfers:   DataFrame as from read_tree
+    :param by:          columns grouping the transfers, e.g. ('topology', 'cc', 'links')
+    :return:            DataFrame indexed by the groups and the size bucket, FCT in [ms]
+    """
+    import pandas as pd
+    # buckets in the order of their sizes
+    order = [size_bucket(0, buckets)] + [size_bucket(b + 1, buckets) for b in buckets]
+    buckets = pd.Categorical([size_bucket(size, buckets) for size in transfers['size [bytes]']], order, ordered=True)
+    transfers = transfers.assign(bucket=buckets, done=transfers['status'] == 'done', fct=transfers['fct [s]'] * 1000)
+    keys = list(by) + ['bucket']
+    groups = transfers.groupby(keys, observed=True)
+    fct = transfers[transfers['done']].groupby(keys, observed=True)['fct']
+    summary = pd.DataFrame({'transfers': groups.size(), 'completed': groups['done'].mean(), 'mean [ms]': fct.mean()})
+    for q in quantiles:
+        summary['p{:g} [ms]'.format(100 * q)] = fct.quantile(q)
+    return summary
+
+
+def main():
+    parser = ArgumentParser(description='Flow completion time workload and its summary, see fct.py.')
+    sub = parser.add_subparsers(dest='command')
+    sub.add_parser('server', help='Serve the transfers until interrupted')
+    client = sub.add_parser('client', help='Run the transfers of a client')
+    client.add_argument('--server', '-s', required=True, help='address of the server')
+    client.add_argument('--time', '-t', type=float, required=True, help='seconds during which transfers are started')
+    client.add_argument('--workload', '-w', required=True, help='JSON workload, see check_workload')
+    client.add_argument('--cc', '-c', help='congestion control')
+    client.add_argument('--seed', '-S', type=int, help='seed of the transfer sizes')
+    client.add_argument('--out', '-o', required=True, help='csv file, one line per transfer')
+    summary = sub.add_parser('summary', help='FCT distributions per topology, cc and size bucket of a log tree')
+    summary.add_argument('log_tree')
+    summary.add_argument('--by', nargs='+', default=['topology', 'cc'], help='columns grouping the transfers besides '
+                                                                             'the size bucket, e.g. topology cc links')
+    args = parser.parse_args()
+
+    if args.command == 'summary':
+        out_file = Summary_file.format(args.log_tree)
+        summarize(read_tree(args.log_tree), args.by).to_csv(out_file, sep='\t')
+        print('FCT summary written to {}'.format(out_file))
+        return
+
+    loop = Loop()
+    if args.command == 'server':
+        worker = Server(loop)
+        loop.run()
+        print('Received {} transfers, {} bytes'.format(worker.transfers, worker.bytes))
+        return
+
+    workload = json.loads(args.workload)
+    check_workload(dict(workload, mode='fct'))
+    worker = Client(loop, args.server, workload, args.time, args.cc, args.seed)
+    try:
+        loop.run()
+    finally:
+        completed = worker.write(args.out)
+    print('Completed {}/{} transfers'.format(completed, len(worker.records)))
+    if worker.records and not completed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""
+Snapshots of the kernel network statistics of a network namespace, i.e. what `nstat` shows: the TcpExt/IpExt and
+MPTcpExt counters of /proc/net/netstat, the Ip/Tcp/Udp counters of /proc/net/snmp and the MPTCP MIB of the
+multipath-tcp.org kernel in /proc/net/mptcp_net/snmp.
+"""
+import json
+import subprocess
+
+COUNTER_FILES = ['/proc/net/netstat', '/proc/net/snmp', '/proc/net/mptcp_net/snmp']
+
+
+def parse_counters(text):
+    """
+    Parse the counter files, the header/value line pairs of netstat/snmp as well as the `Name value` lines of the
+    MPTCP MIB.
+
+    :param text:    concatenated content of the counter files
+    :return:        dict counter name -> value, e.g. 'TcpExt.TCPLostRetransmit' or 'MPTCP.MPJoinSynRx'
+    """
+    counters, header = {}, None
+    for line in text.splitlines():
+        prefix, colon, rest = line.partition(':')
+        if colon:
+            names_or_values = rest.split()
+            if header is not None and header[0] == prefix:
+                counters.update(('{}.{}'.format(prefix, name), int(value))
+                                for name, value in zip(header[1], names_or_values))
+                header = None
+            else:
+                header = (prefix, names_or_values)
+        elif len(line.split()) == 2:
+            name, value = line.split()
+            counters['MPTCP.{}'.format(name)] = int(value)
+    return counters
+
+
+def snapshot(node):
+    """
+    Read the counters in the namespace of a Mininet node. The files are read by a separate process, so this also works
+    while the shell of the node is busy running a command.
+
+    :param node:    mininet node
+    :return:        dict counter name -> value
+    """
+    # missing files, e.g. without MPTCP kernel, are skipped by cat
+    p = node.popen(['cat'] + COUNTER_FILES, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    out, _ = p.communicate()
+    return parse_counters(out.decode())
+
+
+def delta(before, after):
+    """ Counters changed between two snapshots, unchanged counters are left out to keep the files small. """
+    changed = {}
+    for name, value in after.items():
+        diff = value - before.get(name, 0)
+        if diff:
+            changed[name] = diff
+    return changed
+
+
+def write_deltas(out_file, before, after):
+    with open(out_file, 'w') as f:
+        json.dump(delta(before, after), f, indent=2, sort_keys=True)
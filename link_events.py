@@ -0,0 +1,118 @@
+import os
+import subprocess
+import threading
+import time
+
+from monotonic import monotonic  # Monotonic time to avoid issues from NTP adjustments
+from mininet.log import info, warn
+
+from topo_config import emulated_latency
+
+
+class LinkEventScheduler(object):
+    """
+    Apply the link events of a topology (bandwidth steps, delay changes, loss and link up/down) at their offsets while
+    an experiment is running and log when they were actually applied.
+
+    The TCLink qdiscs are changed in place instead of being rebuilt (which is what TCIntf.config does). The commands
+    are written to long running `tc -batch` / `ip -batch` processes, one per network namespace, which are started
+    before the experiment, so applying an event does not fork any process.
+    Note: changes assume the qdisc layout Mininet sets up for a TCLink with bandwidth and delay, i.e. a htb class 5:1
+          with a netem qdisc 10: below.
+    """
+    def __init__(self, net, config, log_file):
+        """
+        :param net:         running MPMininetWrapper network built from the config
+        :param config:      compiled TopoConfig containing the link events
+        :param log_file:    csv file to write the applied events to
+        """
+        self.events, self.log_file = config.link_events, log_file
+        self.intfs, self.state = {}, {}
+        for i in set(i for event in self.events for i in event.links):
+            link, mn_link = config.links[i], net.config_link(config, i)
+            self.intfs[i] = [mn_link.intf1, mn_link.intf2]
+            self.state[i] = dict(bandwidth=link.bandwidth, latency=emulated_latency(link.latency), loss=0,
+                                 queue=config.queue_sizes[i])
+
+        self.batches, self.t0 = {}, None
+        self._stop, self._thread = False, None
+        for intfs in self.intfs.values():
+            for intf in intfs:
+                self._batch(intf.node, 'tc')
+                self._batch(intf.node, 'ip')
+
+    def _batch(self, node, tool):
+        """ Batch process of `tc` or `ip` in the namespace of the node, nodes outside a namespace share one. """
+        key = (node.pid if node.inNamespace else None, tool)
+        if key not in self.batches:
+            with open(os.devnull, 'w') as devnull:
+                self.batches[key] = node.popen([tool, '-force', '-batch', '-'], stdin=subprocess.PIPE,
+                                               stdout=devnull, stderr=None)
+        return self.batches[key]
+
+    def _commands(self, i, changes):
+        """ Update state of link i and generate the batch lines per interface as (intf, tool, line) tuples. """
+        state = self.state[i]
+        state.update((k, v) for k, v in changes.items() if k != 'status')
+        if 'latency' in changes:
+            state['latency'] = emulated_latency(changes['latency'])
+
+        cmds = []
+        for intf in self.intfs[i]:
+            if 'bandwidth' in changes:
+                cmds.append((intf, 'tc', 'class change dev {} parent 5:0 classid 5:1 htb rate {}Mbit burst 15k'.format(
+                    intf.name, float(state['bandwidth']))))
+            if 'latency' in changes or 'loss' in changes:
+                # netem resets every option not given, always pass the complete state
+                cmds.append((intf, 'tc', 'qdisc change dev {} parent 5:1 handle 10: netem delay {}ms 0ms loss {}% '
+                                         'limit {}'.format(intf.name, state['latency'], state['loss'], state['queue'])))
+            if 'status' in changes:
+                cmds.append((intf, 'ip', 'link set dev {} {}'.format(intf.name, changes['status'])))
+        return cmds
+
+    def start(self, t0=None):
+        """
+        Start applying the events in the background.
+
+        :param t0:  monotonic reference time the event times are relative to, defaults to now
+        """
+        self.t0 = monotonic() if t0 is None else t0
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self):
+        with open(self.log_file, 'w') as log:
+            log.write('scheduled [s]\tapplied [s]\tlag [ms]\tlinks\tchanges\n')
+            for event in self.events:
+                # sleep in short steps, waiting on a threading.Event in python 2 is only precise to ~50ms
+                while not self._stop and monotonic() < self.t0 + event.time:
+                    time.sleep(min(0.01, max(0.0, self.t0 + event.time - monotonic())))
+                if self._stop:
+                    break
+
+                for i in event.links:
+                    for intf, tool, line in self._commands(i, event.changes):
+                        batch = self._batch(intf.node, tool)
+                        batch.stdin.write((line + '\n').encode())
+                for batch in self.batches.values():
+                    batch.stdin.flush()
+                applied = monotonic() - self.t0
+
+                links = ','.join('-'.join(str(intf) for intf in self.intfs[i]) for i in event.links)
+                changes = ','.join('{}={}'.format(k, v) for k, v in sorted(event.changes.items()))
+                log.write('{}\t{:.6f}\t{:.3f}\t{}\t{}\n'.format(event.time, applied, 1000 * (applied - event.time),
+                                                               links, changes))
+                info('Link event at {:.3f}s: {} {}\n'.format(applied, links, changes))
+
+    def stop(self):
+        """ Stop applying events, wait for the batch processes to finish and warn about skipped events. """
+        self._stop = True
+        if self._thread is not None:
+            self._thread.join()
+        for batch in self.batches.values():
+            batch.stdin.close()
+            batch.wait()
+        skipped = [e for e in self.events if self.t0 is None or monotonic() - self.t0 < e.time]
+        if skipped:
+            warn('{} link events were scheduled after the end of the experiment.\n'.format(len(skipped)))
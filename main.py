@@ -1,122 +1,177 @@
-import copy
-import os
-import pprint
-import itertools
 from argparse import ArgumentParser
 
-import numpy as np
-
 from mininet.cli import CLI
-from mininet.net import Mininet
 from mininet.link import TCLink
-from mininet.log import setLogLevel, info, error, debug
+from mininet.log import setLogLevel, error, warn
 
 from MPMininetExp import MPMininetExp
 from MPTopoligies import JsonTopo, MPMininetWrapper
+from topo_config import TopoConfig, topology_names
+import archive
+import calibration
+import fct
+import preflight
+import progress
+import supervisor
+import sweep
 import utils
 
-Topologies_file = 'topologies/{}.json'
-Congestion_control_algorithms = ['lia', 'olia', 'balia', 'wvegas', 'cubic']
-
-
-def run_cc_configs(topo_name, ccs):
-    # Read in config file containing the topology
-    config = utils.read_json(Topologies_file.format(topo_name))
-
-    utils.adjust_ccs_config(config, ccs)
-    # pprint.pprint(config)
-    run_single_config(config, repetitions=20)
-
-
-def run_single_config(config, repetitions):
-    for rep in range(repetitions):
-        topo = JsonTopo(config)
-        MPMininetExp(topology=topo, repetition_number=rep, start_cli=args.cli,
-                     use_tcpdump=not args.no_dtcp, keep_tcpdumps=args.dtcp)
-
-
-def run_sym_configs(topo_name, group_name, group_values):
+# sweep specs run by --run, see sweeps/
+RUN_SWEEPS = {'tp': ['tp'], 'de': ['de'], 'all': ['tp', 'de'], 'cdf': ['cdf']}
+
+status = progress.Progress()
+
+
+def apply_capture_args(plan):
+    """ Capture options given on the command line win over the ones of the sweep specs. """
+    points = []
+    for point in plan:
+        capture = dict(point.capture)
+        if args.dtcp:
+            capture['keep_pcaps'] = True
+        if args.no_dtcp:
+            capture['tcpdump'] = False
+        if args.queues:
+            capture['queue_rate'] = args.queues
+        if args.pcap_compression:
+            capture['compression'] = None if args.pcap_compression == 'none' else args.pcap_compression
+        if args.snaplen:
+            capture['snaplen'] = args.snaplen
+        if args.keep_filter:
+            capture['keep_filter'] = args.keep_filter
+        if args.one_way:
+            capture['one_way'] = True
+        metrics = [m for m in point.metrics if not sweep.METRICS[m] or capture.get(sweep.METRICS[m])]
+        if capture.get('one_way') and 'owd' not in metrics:
+            metrics.append('owd')
+        points.append(point._replace(capture=capture, metrics=metrics,
+                                     cost=sweep.estimate_cost(point.config, point.workload, capture)))
+    return points
+
+
+def run_experiment(topo, point, retries=2, cli=False, base_folder='./logs', supervise=None):
     """
-    Exhaustively explores the configuration space for a group with the given values.
-    :param topo_name:   topology name (topo file in ./topologies/_name_.json)
-    :param group_name:  name of link group to change ('latency_group' / 'bandwidth_group')
-    :param group_values: configuration values to explore
-    :return:
+    Run a single point of a plan, repeating it while the host machine is saturated. After the last retry the run is
+    kept, its resource summary marks it as invalid. Failing runs are cleaned up and retried by the supervisor, their
+    errors are recorded in <logs dir>/<repetition>_failures.json.
+    :param retries:     repetitions of a run which saturated the host
+    :param cli:         open the Mininet CLI instead of running the experiment
+    :param base_folder: root of the log tree
+    :param supervise:   supervisor.Supervisor retrying failed runs, None uses one with the default backoff
+    :return:            the last MPMininetExp, None if every attempt failed
     """
-    # Read in config file containing the topology
-    orig_config = utils.read_json(Topologies_file.format(topo_name))
-    groups, n_changeable_links = utils.extract_groups(orig_config, group_field=group_name)
-    bw_groups, _ = utils.extract_groups(orig_config, group_field='bandwidth_group')
-    de_groups, _ = utils.extract_groups(orig_config, group_field='latency_group')
-
-    # generate all configurations to run for the current group, i.e. for 2 groups a list with tuples [(v_a, v_b)]
-    mgroups = tuple([group_values] * len(groups))
-    values_product = list(itertools.product(*mgroups))
-
-    for rep in range(3):
-        for cc_name in Congestion_control_algorithms:
-            for cur_values in values_product:
-                # generate changed config
-                config = copy.deepcopy(orig_config)
-                utils.adjust_cc_config(config, cc_name)
-
-                changed = 0
-                for group, val in zip(groups, cur_values):
-                    info('Changing group {} to value {}\n'.format(group, val))
-                    changed += utils.adjust_group_config(config, group_name, group, val)
-
-                if changed != n_changeable_links:  # TODO move this check out of the experiment loop, should be enought to run once!
-                    raise RuntimeError('There are more links with the "{}" property than just changed in the config!'.format(group_name))
-
-                # pprint.pprint(config)
-
-                # Run experiment and shut it down immediately afterwards
-                topo = JsonTopo(config)
-                MPMininetExp(repetition_number=rep, topology=topo, start_cli=args.cli,
-                             use_tcpdump=(not args.no_dtcp), keep_tcpdumps=args.dtcp)
-                # return
+    supervise = supervise or supervisor.Supervisor()
+    rep, capture, workload = point.repetition, point.capture, point.workload
+    name = '{}/{}'.format(topo.get_logs_dir(), rep)
+    failure_file = '{}/{}/{}_failures.json'.format(fct.log_folder(base_folder, workload), topo.get_logs_dir(), rep)
+    for attempt in range(retries + 1):
+        exp = supervise.run(name, lambda scope: MPMininetExp(
+            topology=topo, repetition_number=rep, start_cli=cli, use_tcpdump=capture['tcpdump'],
+            keep_tcpdumps=capture['keep_pcaps'], queue_rate=capture['queue_rate'], runtime=workload['runtime'],
+            time_interval=workload['interval'], base_folder=base_folder, scope=scope,
+            compression=capture['compression'], snaplen=capture['snaplen'], keep_filter=capture['keep_filter'],
+            one_way=capture['one_way'], fct_workload=workload if fct.is_fct(workload) else None),
+            failure_file)
+        if exp is None or not exp.saturated:
+            return exp
+        warn('Repetition {} saturated the host, attempt {}/{}.\n'.format(rep, attempt + 1, retries + 1))
+    error('Repetition {} of {} stays invalid, the host is saturated.\n'.format(rep, topo.get_logs_dir()))
+    return exp
+
+
+def flow_summary(exp, metrics):
+    """ Throughput and mean RTT per client of a finished experiment, read from its logs, as far as the metrics ask. """
+    flows = {}
+    for client, _ in exp.topo.get_host_pairings():
+        prefix = '{}/{}_{}'.format(exp.out_folder, exp.rep_num, client)
+        flows[client] = {}
+        if 'throughput' in metrics:
+            flows[client]['throughput [Mbps]'] = progress.iperf_sender_throughput(prefix + '_iperf.csv')
+        if 'rtt' in metrics:
+            flows[client]['rtt [ms]'] = progress.mean_ack_rtt(prefix + '_iperf_dump.csv')
+        if 'fct' in metrics:
+            mean = progress.mean_column(prefix + '_fct.csv', 'fct [s]')
+            flows[client]['fct [ms]'] = 1000 * mean if mean is not None else None
+        if 'owd' in metrics:
+            flows[client]['owd [ms]'] = progress.mean_column(prefix + '_owd.csv', 'owd [ms]')
+            flows[client]['queueing [ms]'] = progress.mean_column(prefix + '_owd.csv', 'queueing [ms]')
+    return flows
+
+
+def sweep_archive(archives, name, base_folder='./logs'):
+    """ Archive of a sweep, opened once per run. """
+    if name not in archives:
+        archives[name] = archive.Archive(archive.archive_file(base_folder, name))
+    return archives[name]
+
+
+def archive_experiment(archives, point, logs_dir, flows, outcome, base_folder='./logs'):
+    """ Move the log files of a finished repetition into the archive of its sweep, see archive.Archive. """
+    sweep_archive(archives, point.spec, base_folder).add(
+        logs_dir, point.repetition, '{}/{}'.format(fct.log_folder(base_folder, point.workload), logs_dir),
+        flows=flows, outcome=outcome, parameters=archive.config_parameters(point.config, point.workload),
+        sweep=point.spec, config=point.config, remove=True)
+
+
+def run_plan(plan, archives=None):
+    """
+    Run the points of a plan one after the other, reporting the progress.
+    :param plan:        list of sweep.Point, consecutive points of the same config share the topology
+    :param archives:    dict sweep name -> archive.Archive, None keeps the log files in the log tree
+    """
+    topo = None
+    supervise = supervisor.Supervisor(retries=args.fault_retries, backoff=args.backoff)
+    for point in plan:
+        config, rep = point.config, point.repetition
+        # The topology only describes the network, it can be reused for all repetitions of the same config
+        if topo is None or topo.config is not config:
+            topo = JsonTopo(config)
+        logs_dir = topo.get_logs_dir()
+
+        status.start('{}/{}'.format(logs_dir, rep))
+        if archives is not None and sweep_archive(archives, point.spec).has(logs_dir, rep):
+            status.finish()
+            continue
+        exp = run_experiment(topo, point, retries=args.retries, cli=args.cli, supervise=supervise)
+        if exp is None:
+            # recorded in the failures file, the sweep goes on with the next point
+            status.finish(failed=True)
+            flows, outcome = None, {'failed': True}
+        else:
+            flows = flow_summary(exp, point.metrics) if exp.phases else None
+            status.finish(exp.phases, flows, failed=exp.saturated)
+            outcome = {'failed': False, 'saturated': exp.saturated, 'phases': exp.phases}
+        if archives is not None and (exp is None or exp.phases):
+            archive_experiment(archives, point, logs_dir, flows, outcome)
 
 
 def main():
     """Create and run multiple link network"""
-    utils.check_system()
+    if args.sweep or args.run in RUN_SWEEPS:
+        specs = [sweep.load_spec(name) for name in (args.sweep or RUN_SWEEPS[args.run])]
+        plan = apply_capture_args(sweep.expand(specs, topologies=[args.topo] if args.topo else None))
+        if args.dry_run:
+            # planning neither needs root nor an MPTCP kernel
+            sweep.print_plan(plan)
+            if args.preflight:
+                preflight.print_problems(preflight.check_plan(plan))
+            return
 
-    if args.run in ['de', 'tp', 'all']:
-        if args.topo == 'mp_vs_sp':
-            # Only test change in bw
-            bandwidths = [5, 10, 15, 20, 25]
-            latencies = []
-        elif args.topo == 'single_bottleneck' or args.topo == 'asym_mp':
-            bandwidths = []
-            latencies = [10]
-        else:
-            latencies = np.arange(0, 102, 30)
-            bandwidths = [5, 10, 15, 20, 25]
-
-        if args.run == 'de':
-            # run_latency(args.topo)
-            run_sym_configs(args.topo, group_name='latency_group', group_values=latencies)
-        elif args.run == 'tp':
-            # run_tp_fairness(args.topo)
-            run_sym_configs(args.topo, group_name='bandwidth_group', group_values=bandwidths)
-        elif args.run == 'all':
-            run_sym_configs(args.topo, group_name='bandwidth_group', group_values=bandwidths)
-            run_sym_configs(args.topo, group_name='latency_group', group_values=latencies)
-    elif args.run in ['cdf']:
-        if args.topo in ['single_path', 'two_paths']:
-            for cc in Congestion_control_algorithms:
-                run_cc_configs(args.topo, [cc])
-
-        elif args.topo in ['shared_link', 'mp_vs_sp', 'single_bottleneck']:
-            for cc in Congestion_control_algorithms:
-                run_cc_configs(args.topo, [cc] * 2)
-
-        elif args.topo in ['asym_mp']:
-            for cc in Congestion_control_algorithms:
-                run_cc_configs(args.topo, [cc] * 3)
+    utils.check_system()
+    if args.sweep or args.run in RUN_SWEEPS:
+        if args.preflight and not preflight.run(plan, duration=args.smoke_time,
+                                                available_ccs=utils.get_system_available_congestioncontrol_algos()):
+            error('Pre-flight failed, the campaign is not started.\n')
+            return
+        # all experiments are known upfront, which gives the progress report a total
+        status.planned = len(plan)
+        if args.status_port:
+            status.serve(args.status_port, args.status_host)
+        run_plan(plan, archives={} if args.archive else None)
+    elif args.run == 'calibrate':
+        calibration.calibrate(TopoConfig.from_file(args.topo), duration=args.calibration_time)
     else:
-        config = utils.read_json('topologies/' + args.topo + '.json')
-        topo = JsonTopo(config)
+        topo = JsonTopo(TopoConfig.from_file(args.topo))
         # topo = SingleMPFlowTopo()
 
         # add host=CPULimitedHost if applicable
@@ -139,25 +194,102 @@ if __name__ == '__main__':
                         action='store_true',
                         help="Do NOT use tcpdump (no RTT analysis possible)")
 
+    parser.add_argument('--pcap_compression',
+                        choices=['gzip', 'zstd', 'none'],
+                        help="Compress captures while they are taken, default gzip")
+
+    parser.add_argument('--snaplen',
+                        type=int,
+                        help="Bytes captured per packet, 128 keeps all TCP and MPTCP headers")
+
+    parser.add_argument('--keep_filter',
+                        metavar='DISPLAY_FILTER',
+                        help="Reduce kept captures (--dtcp) to the packets matching a tshark display filter, "
+                             "e.g. 'tcp.stream == 0' or 'frame.time_relative <= 10'")
+
+    parser.add_argument('--one_way',
+                        action='store_true',
+                        help="Capture at the servers as well and derive one-way and queueing delays per packet")
+
+    parser.add_argument('--queues',
+                        type=float,
+                        metavar='RATE',
+                        help="Sample the bottleneck queues with RATE samples per second (up to 1000)")
+
+    parser.add_argument('--retries',
+                        type=int,
+                        default=2,
+                        help="Repeat experiments invalidated by a saturated host up to this many times")
+
+    parser.add_argument('--fault_retries',
+                        type=int,
+                        default=2,
+                        help="Retry experiments which failed with an error up to this many times")
+
+    parser.add_argument('--backoff',
+                        type=float,
+                        default=10,
+                        metavar='SECONDS',
+                        help="Wait before retrying a failed experiment, tripled for every further retry")
+
+    parser.add_argument('--status_port',
+                        type=int,
+                        help="Serve the sweep progress on this port, /status as JSON and /metrics for Prometheus")
+
+    parser.add_argument('--status_host',
+                        default='127.0.0.1',
+                        help="Address to serve the sweep progress on")
+
+    parser.add_argument('--calibration_time',
+                        type=int,
+                        default=10,
+                        help="Seconds of load per path when calibrating the link emulation")
+
     parser.add_argument('--cli',
                         action='store_true',
                         help="Instead of running experiments, open CLI")
 
     parser.add_argument('--run',
-                        choices=['de', 'tp', 'all', 'cdf'],
-                        help="Which tasks to run")
+                        choices=['de', 'tp', 'all', 'cdf', 'calibrate'],
+                        help="Which tasks to run, the sweeps de/tp/all/cdf are defined in ./sweeps/")
+
+    parser.add_argument('--sweep',
+                        action='append',
+                        help="Sweep spec to run, a name in ./sweeps/ or a JSON file, can be given multiple times")
+
+    parser.add_argument('--archive',
+                        action='store_true',
+                        help="Move the logs of finished experiments into ./logs/<sweep>.sqlite instead of the log tree")
+
+    parser.add_argument('--preflight',
+                        action='store_true',
+                        help="Validate every point and run each topology/congestion control combination briefly before "
+                             "the campaign, which only starts if all passed; with --dry_run only the static checks")
+
+    parser.add_argument('--smoke_time',
+                        type=int,
+                        default=5,
+                        metavar='SECONDS',
+                        help="Runtime of the pre-flight smoke runs")
+
+    parser.add_argument('--dry_run',
+                        action='store_true',
+                        help="Print the plan of the sweep with its size and estimated wall time instead of running it")
 
     parser.add_argument('--log',
                         choices=['info', 'debug', 'output', 'warning', 'error', 'critical'],
                         help="Mininet logging level")
 
     parser.add_argument('--topo',
-                        help="Topology to use",
-                        choices=['asym_mp', 'mp_vs_sp', 'shared_link', 'single_bottleneck', 'single_path', 'two_paths'],
-                        required=True,
-                        default='two_paths')
+                        help="Topology to use, sweeps are restricted to it",
+                        choices=topology_names())
 
     args = parser.parse_args()
+    if not args.topo and not (args.sweep or args.run in RUN_SWEEPS):
+        parser.error('--topo is required unless a sweep is run')
+    if args.calibration_time <= calibration.MIN_DURATION:
+        parser.error('--calibration_time has to exceed {} s, the load outside the loaded pings'.format(
+            calibration.MIN_DURATION))
 
     try:
         if args.log:
@@ -169,4 +301,5 @@ if __name__ == '__main__':
         print("-"*80)
         import traceback
         traceback.print_exc()
-        os.system("killall -9 top bwm-ng tcpdump cat mnexec iperf iperf3; mn -c")
+        # only what the running experiments created, other experiments on the machine are kept
+        supervisor.cleanup_active()
@@ -0,0 +1,223 @@
+"""
+Fairness and efficiency metrics of multi-flow experiments. All metrics operate on throughput arrays whose last axis
+are the paths (or connections) of a topology, leading axes can be anything, e.g. (repetitions, time buckets), so a
+whole sweep point is evaluated at once. Time series become aggregated metrics by averaging over the time axis.
+
+Paths are the client to server paths of a compiled TopoConfig (`config.paths`), i.e. the subflows of the connections.
+A connection with plain TCP only uses one of its paths, path_throughput_series marks paths without a single packet
+with NaN, they are left out of the fairness metrics and count as carrying no traffic on their links.
+"""
+import warnings
+
+import numpy as np
+import pandas as pd
+
+import analysis
+
+
+def jain_index(throughputs, axis=-1):
+    """
+    Jain's fairness index (sum x)^2 / (n * sum x^2), 1 if all flows get the same throughput, 1/n if a single flow
+    gets everything. Missing flows (NaN) are left out.
+
+    :param throughputs: array like of throughputs
+    :param axis:        axis of the flows
+    :return:            array of fairness indices, NaN where no flow transferred any data
+    """
+    x = np.asarray(throughputs, dtype=np.float64)
+    n = np.sum(np.isfinite(x), axis=axis)
+    total, squares = np.nansum(x, axis=axis), np.nansum(x * x, axis=axis)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(squares > 0, total * total / (n * squares), np.nan)
+
+
+def routing_matrix(config):
+    """
+    Which path crosses which link.
+
+    :param config:  compiled TopoConfig
+    :return:        array (links x paths), 1 if the path crosses the link
+    """
+    matrix = np.zeros((len(config.links), len(config.paths)))
+    for p, path in enumerate(config.paths):
+        matrix[list(path.links), p] = 1
+    return matrix
+
+
+def connection_matrix(config):
+    """
+    Which path belongs to which connection, i.e. client server pairing.
+
+    :param config:  compiled TopoConfig
+    :return:        array (paths x connections), connections in the order of config.pairings
+    """
+    pairings = list(config.pairings)
+    matrix = np.zeros((len(config.paths), len(pairings)))
+    for p, path in enumerate(config.paths):
+        matrix[p, pairings.index((path.client, path.server))] = 1
+    return matrix
+
+
+def connection_throughput(config, path_tp):
+    """ Throughput per connection as the sum over its used paths, (..., paths) -> (..., connections). """
+    return np.nan_to_num(np.asarray(path_tp, dtype=np.float64)).dot(connection_matrix(config))
+
+
+def link_utilization(config, path_tp):
+    """
+    Utilization of every link from the throughput of the paths crossing it and the configured link capacity.
+
+    :param config:  compiled TopoConfig
+    :param path_tp: array (..., paths) of throughputs [Mbps]
+    :return:        array (..., links) with the share of the link capacity used
+    """
+    capacities = np.array([link.bandwidth for link in config.links], dtype=np.float64)
+    return np.nan_to_num(np.asarray(path_tp, dtype=np.float64)).dot(routing_matrix(config).T) / capacities
+
+
+def path_efficiency(config, path_tp):
+    """
+    Throughput of every path normalized by the capacity of its bottleneck.
+
+    :param config:  compiled TopoConfig
+    :param path_tp: array (..., paths) of throughputs [Mbps]
+    :return:        array (..., paths), NaN for unused paths
+    """
+    capacities = np.array([min(config.links[i].bandwidth for i in path.links) for path in config.paths],
+                          dtype=np.float64)
+    return np.asarray(path_tp, dtype=np.float64) / capacities
+
+
+def active_paths(config, path_tp=None):
+    """
+    Paths that carried traffic in an experiment, in any repetition or time bucket.
+
+    :param config:  compiled TopoConfig
+    :param path_tp: array (..., paths) of throughputs [Mbps], NaN for unused paths; None takes all paths of the topology
+    :return:        boolean array per path
+    """
+    if path_tp is None:
+        return np.ones(len(config.paths), dtype=bool)
+    path_tp = np.asarray(path_tp, dtype=np.float64)
+    return np.isfinite(path_tp).reshape(-1, path_tp.shape[-1]).any(axis=0)
+
+
+def is_multipath(config, path_tp=None):
+    """
+    Boolean array per connection, whether it used more than one path. Single path connections behave as TCP, so do
+    connections of a plain TCP run on a multipath topology.
+
+    :param path_tp: throughputs deciding the used paths, see active_paths, None takes all paths of the topology
+    """
+    return active_paths(config, path_tp).dot(connection_matrix(config)) > 1
+
+
+def shared_bottlenecks(config, path_tp=None):
+    """ Links crossed by multipath and single path connections at the same time, see is_multipath. """
+    active = active_paths(config, path_tp)
+    crossing = routing_matrix(config)[:, active].dot(connection_matrix(config)[active]) > 0  # links x connections
+    multipath = is_multipath(config, path_tp)
+    return np.flatnonzero(crossing[:, multipath].any(axis=1) & crossing[:, ~multipath].any(axis=1))
+
+
+def mptcp_tcp_ratio(config, path_tp):
+    """
+    Mean throughput of the multipath connections over the mean throughput of the single path connections, the
+    fairness of MPTCP towards TCP on shared bottlenecks. Only connections crossing a shared bottleneck are compared.
+
+    :param config:  compiled TopoConfig
+    :param path_tp: array (..., paths) of throughputs [Mbps]
+    :return:        array (...), NaN if the topology has no shared bottleneck
+    """
+    shared = shared_bottlenecks(config, path_tp)
+    if not len(shared):
+        return np.full(np.shape(path_tp)[:-1], np.nan)
+    active = active_paths(config, path_tp)
+    crossing = (routing_matrix(config)[shared][:, active].dot(connection_matrix(config)[active]) > 0).any(axis=0)
+    multipath = is_multipath(config, path_tp)
+    tp = connection_throughput(config, path_tp)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return tp[..., crossing & multipath].mean(axis=-1) / tp[..., crossing & ~multipath].mean(axis=-1)
+
+
+def experiment_metrics(config, path_tp):
+    """
+    All metrics of an experiment.
+
+    :param config:  compiled TopoConfig
+    :param path_tp: array (..., paths) of throughputs [Mbps], e.g. (repetitions, time buckets, paths), NaN for unused
+                    paths
+    :return:        dict name -> array, per link and per path metrics keep their last axis
+    """
+    conn_tp = connection_throughput(config, path_tp)
+    return {
+        'jain connections': jain_index(conn_tp),
+        'jain paths': jain_index(path_tp),
+        'mptcp/tcp ratio': mptcp_tcp_ratio(config, path_tp),
+        'link utilization': link_utilization(config, path_tp),
+        'path efficiency': path_efficiency(config, path_tp),
+    }
+
+
+def path_throughput_series(config, dump_df, bucket_size_ms=100, start_s=0.0, end_s=None,
+                           time_column='frame.time_relative', payload_column=None):
+    """
+    Throughput per path over time from the packets tshark extracted from the client captures. Packets are assigned to
+    paths by their source address, i.e. the client interface the subflow uses. Paths without a single packet were not
+    used by the connection, e.g. with plain TCP, their throughput is NaN instead of 0.
+
+    :param config:          compiled TopoConfig the experiment ran with
+    :param dump_df:         DataFrame of the `<rep>_<client>_iperf_dump.csv` files of all clients of the experiment
+    :param bucket_size_ms:  width of the time buckets in ms
+    :param payload_column:  column with the payload per packet in bytes, None uses tcp.len, see analysis.payload_bytes
+    :return:                array (time buckets, paths) of throughputs [Mbps], NaN for unused paths
+    """
+    if end_s is None:
+        end_s = dump_df[time_column].max()
+    plan = config.address_plan
+    src = dump_df['ip.src'].values
+    series = []
+    for path in config.paths:
+        packets = dump_df[src == plan.ip(path.interface, config.host_ids[path.client])]
+        payload = analysis.payload_bytes(packets) if payload_column is None else packets[payload_column]
+        buckets = analysis.goodput_buckets(packets[time_column].values, payload.fillna(0).values,
+                                           (bucket_size_ms,), start_s=start_s, end_s=end_s)[bucket_size_ms]
+        tp = buckets['tp [Mbps]'].values.astype(np.float64)
+        series.append(np.full(len(tp), np.nan) if packets.empty else tp)
+    return np.stack(series, axis=-1)
+
+
+def sweep_table(experiments):
+    """
+    Aggregated metrics of a sweep, one row per experiment and repetition.
+
+    :param experiments: iterable of (labels, config, path_tp) where labels is a dict describing the sweep point, e.g.
+                        {'cc': 'lia', 'bw_a': 10}, and path_tp an array (repetitions, [time buckets,] paths)
+    :return:            DataFrame with the labels, 'repetition' and a column per metric, per link and per path
+                        metrics are split into columns like 'link utilization s1-s2'
+    """
+    rows = []
+    for labels, config, path_tp in experiments:
+        path_tp = np.asarray(path_tp, dtype=np.float64)
+        values = experiment_metrics(config, path_tp)
+        columns = {}
+        for name, value in values.items():
+            if path_tp.ndim == 3:
+                # time series, aggregate over the time buckets, unused paths stay NaN
+                with warnings.catch_warnings():
+                    warnings.simplefilter('ignore', RuntimeWarning)
+                    value = np.nanmean(value, axis=1)
+            if name == 'link utilization':
+                for i, link in enumerate(config.links):
+                    columns['{} {}-{}'.format(name, link.source, link.target)] = value[:, i]
+            elif name == 'path efficiency':
+                for p, path in enumerate(config.paths):
+                    columns['{} {}-{} eth{}'.format(name, path.client, path.server, path.interface)] = value[:, p]
+            else:
+                columns[name] = value
+        df = pd.DataFrame(columns)
+        df.index.name = 'repetition'
+        for key, value in labels.items():
+            df[key] = value
+        rows.append(df.reset_index())
+    return pd.concat(rows, ignore_index=True, sort=False)
@@ -0,0 +1,160 @@
+"""
+One-way and queueing delay per packet from captures at both ends of a connection. All Mininet hosts share the kernel
+clock, so the send time in the client capture and the receive time in the server capture of the same data segment
+give its exact one-way delay. Subtracting the propagation and serialization delay of its path leaves the time it spent
+in queues, separate from endpoint effects like delayed acks that the ack RTT contains.
+
+Segments are paired by subflow 4-tuple and sequence number. With segmentation offloads the client capture holds the
+segments as the stack handed them down, the server capture those the network delivered, a received segment is matched
+to the sent segment containing its first byte. Sequence ranges sent more than once (retransmissions) are ambiguous and
+skipped. Both captures are streamed through tshark and merged by time, only segments sent within the join window before
+the segment being matched are held in memory.
+"""
+import bisect
+import collections
+import csv
+
+from mininet.log import info
+
+import captures
+
+OWD_FIELDS = ['frame.time_epoch', 'ip.src', 'tcp.srcport', 'ip.dst', 'tcp.dstport', 'tcp.seq_raw', 'tcp.len', 'ip.len']
+OWD_COLUMNS = ['sec', 'src', 'sport', 'dst', 'dport', 'seq', 'len', 'owd [ms]', 'queueing [ms]']
+
+ETHERNET_HEADER = 14  # bytes on the wire in front of the IP packet
+MAX_SEGMENT = 65536  # largest segment a stack hands down with segmentation offloads
+SEQ_MOD = 2 ** 32
+
+
+def read_segments(capture):
+    """
+    Data segments of a capture in capture order.
+
+    :return:    generator of tuples (time [s], (src, sport, dst, dport), raw sequence number, payload, IP length)
+    """
+    args = ['-Y', 'tcp.len > 0', '-T', 'fields']
+    for field in OWD_FIELDS:
+        args += ['-e', field]
+    tshark = captures.read_capture(capture, args)
+    try:
+        for line in tshark.stdout:
+            if not isinstance(line, str):
+                line = line.decode()
+            fields = line.rstrip('\n').split('\t')
+            if len(fields) != len(OWD_FIELDS) or not fields[5]:
+                continue  # not IPv4/TCP, e.g. tunnelled
+            t, src, sport, dst, dport, seq, length, ip_len = fields
+            yield float(t), (src, int(sport), dst, int(dport)), int(seq), int(length), int(ip_len)
+    finally:
+        tshark.stdout.close()
+        tshark.wait()
+
+
+class Matcher(object):
+    """ Pairs sent and received segments, see module docstring. """
+    def __init__(self, window=2.0):
+        """
+        :param window:  seconds a sent segment waits for its reception, older ones count as lost
+        """
+        self.window = window
+        self.flows = {}  # 4-tuple -> sorted list of (start, end, send time), sequence numbers relative to the first
+        self.bases = {}  # 4-tuple -> first raw sequence number sent
+        self.pending = collections.deque()  # (send time, 4-tuple, entry) in send order, for the eviction
+        self.delivered = set()  # (4-tuple, entry) of pending segments received at least partly
+        self.matched, self.lost, self.unmatched, self.ambiguous, self.max_pending = 0, 0, 0, 0, 0
+
+    def send(self, t, flow, seq, length):
+        base = self.bases.setdefault(flow, seq)
+        start = (seq - base) % SEQ_MOD
+        entry = (start, start + length, t)
+        bisect.insort(self.flows.setdefault(flow, []), entry)
+        self.pending.append((t, flow, entry))
+        self.max_pending = max(self.max_pending, len(self.pending))
+
+    def expire(self, now):
+        """ Forget segments sent before the join window. """
+        while self.pending and self.pending[0][0] < now - self.window:
+            _, flow, entry = self.pending.popleft()
+            entries = self.flows[flow]
+            i = bisect.bisect_left(entries, entry)
+            if i < len(entries) and entries[i] == entry:
+                del entries[i]
+            if (flow, entry) in self.delivered:
+                self.delivered.remove((flow, entry))
+            else:
+                self.lost += 1
+
+    def receive(self, flow, seq):
+        """ Send time of the segment containing a received sequence number, None if unknown or ambiguous. """
+        if flow not in self.bases:
+            self.unmatched += 1
+            return None
+        start = (seq - self.bases[flow]) % SEQ_MOD
+        entries = self.flows[flow]
+        covering = []
+        j = bisect.bisect_right(entries, (start, float('inf'), float('inf'))) - 1
+        while j >= 0 and entries[j][0] > start - MAX_SEGMENT:
+            if entries[j][1] > start:
+                covering.append(j)
+            j -= 1
+        for j in covering:
+            self.delivered.add((flow, entries[j]))
+        if len(covering) != 1:
+            if covering:
+                self.ambiguous += 1
+            else:
+                self.unmatched += 1
+            return None
+        self.matched += 1
+        return entries[covering[0]][2]
+
+    def match(self, sent, received, flows=None):
+        """
+        Merge two segment streams as from read_segments by time.
+
+        :param flows:   only match segments with these source addresses, None all
+        :return:        generator of tuples (send time, receive time, 4-tuple, relative sequence number, payload,
+                        IP length) per matched received segment
+        """
+        sent = iter(sent)
+        next_sent = next(sent, None)
+        for t, flow, seq, length, ip_len in received:
+            if flows is not None and flow[0] not in flows:
+                continue
+            while next_sent is not None and next_sent[0] <= t:
+                if flows is None or next_sent[1][0] in flows:
+                    self.send(*next_sent[:4])
+                next_sent = next(sent, None)
+            self.expire(t)
+            t_send = self.receive(flow, seq)
+            if t_send is not None:
+                yield t_send, t, flow, (seq - self.bases[flow]) % SEQ_MOD, length, ip_len
+
+
+def write_owd(client_capture, server_capture, out_file, paths, window=2.0, start=None):
+    """
+    Match the captures of a client and its server and write the delays per received data segment as tab separated
+    values with the columns OWD_COLUMNS.
+
+    :param paths:   dict client source address -> (propagation delay [ms], serialization delay [ms per byte]) of the
+                    path the address is routed over, see topo_config.path_delay
+    :param window:  join window [s], has to exceed the largest one-way delay
+    :param start:   epoch time [s] the send times in 'sec' are relative to, e.g. the experiment start, default the
+                    first matched segment
+    :return:        Matcher with the counts of matched, lost, unmatched and ambiguous segments
+    """
+    matcher = Matcher(window)
+    with open(out_file, 'w') as f:
+        writer = csv.writer(f, delimiter='\t', lineterminator='\n')
+        writer.writerow(OWD_COLUMNS)
+        for t_send, t_recv, flow, seq, length, ip_len in matcher.match(
+                read_segments(client_capture), read_segments(server_capture), flows=paths):
+            start = t_send if start is None else start
+            owd = (t_recv - t_send) * 1000
+            propagation, per_byte = paths[flow[0]]
+            queueing = owd - propagation - per_byte * (ip_len + ETHERNET_HEADER)
+            writer.writerow(['{:.6f}'.format(t_send - start), flow[0], flow[1], flow[2], flow[3], seq, length,
+                             '{:.4f}'.format(owd), '{:.4f}'.format(queueing)])
+    info('One-way delays of {}: {} segments matched, {} lost, {} unmatched, {} ambiguous, at most {} pending\n'.format(
+        out_file, matcher.matched, matcher.lost, matcher.unmatched, matcher.ambiguous, matcher.max_pending))
+    return matcher
@@ -0,0 +1,195 @@
+"""
+Pre-flight of a sweep plan, so broken points fail within minutes instead of hours into a campaign.
+
+The static check validates every point without running it: available congestion controls, no mix of MPTCP and TCP
+congestion controls, a path for every client, one value per link group, bottleneck queues against the BDP of their
+paths, the workload and the log directories. The smoke run then runs every distinct combination of topology,
+congestion controls and MPTCP settings once for a few seconds without captures, to catch failures at runtime, and
+records the throughput (mean FCT for the FCT workload) per client as baseline.
+
+    <logs>/preflight/report.json    problems, smoke runs with their throughput and errors
+"""
+import collections
+import json
+import os
+
+from mininet.log import error, output, warn
+
+import fct
+import progress
+import supervisor
+from MPMininetExp import MPMininetExp
+from MPTopoligies import JsonTopo, config_logs_dir
+from topo_config import path_bottleneck, path_rtt
+from utils import MPTCP_CCS
+
+Report_file = '{}/preflight/report.json'
+
+MAX_NAME = 255  # longest file name of common file systems
+STARVING_QUEUE = 0.25  # bottleneck queues below this share of the BDP of a path keep it from filling the link
+
+# level is 'error' for points which cannot run, 'warning' for points which run with questionable results
+Problem = collections.namedtuple('Problem', ['level', 'message'])
+
+
+def check_point(point, logs_dir, available_ccs=None):
+    """
+    Problems of a single point of a plan.
+
+    :param logs_dir:        log directory of the point, see config_logs_dir, None if it cannot be built
+    :param available_ccs:   congestion controls of the system, None skips the check (e.g. on a planning machine)
+    :return:                list of Problem
+    """
+    config, workload = point.config, point.workload
+    problems = []
+    ccs = set(config.ccs.values())
+    if available_ccs is not None and ccs - set(available_ccs):
+        problems.append(Problem('error', 'congestion controls {} not available, allowed are {}'.format(
+            sorted(ccs - set(available_ccs)), sorted(available_ccs))))
+    if len(set(cc in MPTCP_CCS for cc in ccs)) > 1:
+        problems.append(Problem('error', 'MPTCP and TCP congestion controls {} cannot run at once'.format(sorted(ccs))))
+
+    for field in ('latency', 'bandwidth'):
+        try:
+            config.group_values(field)
+        except (RuntimeError, NotImplementedError) as e:
+            problems.append(Problem('error', str(e)))
+
+    for client in config.clients:
+        paths = [path for path in config.paths if path.client == client]
+        if not paths:
+            problems.append(Problem('error', 'client {} has no path to its server'.format(client)))
+        for path in paths:
+            bottleneck = path_bottleneck(config.links, path)
+            link, queue = config.links[bottleneck], config.queue_sizes[bottleneck]
+            bdp = path_rtt(config.links, path) * link.bandwidth * 1e3 / 8 / 1500
+            if queue < STARVING_QUEUE * bdp:
+                problems.append(Problem('warning', 'queue of {} packets at bottleneck {}-{} is below {:.0%} of the '
+                                                   'BDP ({:.0f} packets) of path {}-{} eth{}'.format(
+                                                       queue, link.source, link.target, STARVING_QUEUE, bdp,
+                                                       path.client, path.server, path.interface)))
+
+    if workload['runtime'] <= 0 or not 0 < workload['interval'] <= workload['runtime']:
+        problems.append(Problem('error', 'workload requires runtime > 0 and 0 < interval <= runtime, got {}'.format(
+            workload)))
+    late = [event.time for event in config.link_events if event.time >= workload['runtime']]
+    late += [flow.start for flow in config.background if flow.start >= workload['runtime']]
+    if late:
+        problems.append(Problem('warning', 'link events or background flows at {}s start after the runtime of '
+                                           '{}s'.format(sorted(set(late)), workload['runtime'])))
+    if logs_dir is not None and any(len(name) > MAX_NAME for name in logs_dir.split(os.sep)):
+        problems.append(Problem('error', 'log directory {} exceeds the maximal file name length'.format(logs_dir)))
+    return problems
+
+
+def check_plan(plan, available_ccs=None):
+    """
+    Statically validate all points of a plan, see check_point. Different points writing the same log files are
+    reported as well, they would overwrite each other.
+
+    :return:    OrderedDict Problem -> list of the log directories of the affected points
+    """
+    problems = collections.OrderedDict()
+    logs_dirs, writers = {}, {}
+    for point in plan:
+        config = point.config
+        if config not in logs_dirs:
+            label = '{} with {}'.format(config.topology_id, ','.join(sorted(set(config.ccs.values()))))
+            try:
+                # without building the topology, which asserts the congestion controls of the system
+                logs_dirs[config] = config_logs_dir(config)
+            except (RuntimeError, NotImplementedError):
+                logs_dirs[config] = None  # reported by check_point
+            for problem in check_point(point, logs_dirs[config], available_ccs):
+                problems.setdefault(problem, []).append(logs_dirs[config] or label)
+        if logs_dirs[config] is None:
+            continue
+        other = writers.setdefault((logs_dirs[config], point.repetition), point)
+        if other.config is not config:
+            problem = Problem('error', 'different configs, e.g. in their buffer sizing, write the same log directory')
+            problems.setdefault(problem, []).append('{} repetition {}'.format(logs_dirs[config], point.repetition))
+    return problems
+
+
+def print_problems(problems, show=3):
+    """ Print the problems with the first affected points, return the number of errors. """
+    for problem, where in problems.items():
+        log = error if problem.level == 'error' else warn
+        log('{}: {} ({} affected, e.g. {})\n'.format(problem.level.capitalize(), problem.message, len(where),
+                                                   ', '.join(where[:show])))
+    return sum(1 for problem in problems if problem.level == 'error')
+
+
+def smoke_points(plan):
+    """ First point of every combination of topology, congestion controls, MPTCP settings and workload mode. """
+    combinations = collections.OrderedDict()
+    for point in plan:
+        key = (point.config.topology_id, tuple(sorted(point.config.ccs.items())),
+               tuple(sorted(point.config.mptcp.items())), fct.is_fct(point.workload))
+        combinations.setdefault(key, point)
+    return list(combinations.values())
+
+
+def smoke(plan, duration=5, base_folder='./logs'):
+    """
+    Run every distinct combination of the plan for a few seconds without captures.
+
+    :param duration:    seconds per run
+    :return:            list of dicts, one per combination with its status, error and throughput per client
+    """
+    folder = os.path.join(base_folder, 'preflight')
+    # no retries, a point failing here fails in the campaign as well
+    supervise = supervisor.Supervisor(retries=0)
+    results, points = [], smoke_points(plan)
+    for i, point in enumerate(points):
+        topo = JsonTopo(point.config)
+        output('Smoke run {}/{}: {}\n'.format(i + 1, len(points), topo.get_logs_dir()))
+        exp = supervise.run('smoke {}'.format(topo.get_logs_dir()), lambda scope: MPMininetExp(
+            topology=topo, repetition_number=0, use_tcpdump=False, keep_tcpdumps=False, runtime=duration,
+            time_interval=point.workload['interval'], base_folder=folder, scope=scope,
+            fct_workload=point.workload if fct.is_fct(point.workload) else None))
+
+        result = {'logs_dir': topo.get_logs_dir(), 'topology': point.config.topology_id, 'ccs': point.config.ccs,
+                  'mptcp': point.config.mptcp, 'throughput [Mbps]': {}, 'error': None}
+        if exp is None:
+            result['error'] = supervise.failures[-1]['error']
+        elif fct.is_fct(point.workload):
+            result['fct [ms]'] = {}
+            for client, _ in topo.get_host_pairings():
+                mean = progress.mean_column('{}/{}_{}_fct.csv'.format(exp.out_folder, 0, client), 'fct [s]')
+                result['fct [ms]'][client] = 1000 * mean if mean is not None else None
+                if mean is None:
+                    result['error'] = 'client {} did not complete any transfer'.format(client)
+        else:
+            for client, _ in topo.get_host_pairings():
+                throughput = progress.iperf_sender_throughput('{}/{}_{}_iperf.csv'.format(exp.out_folder, 0, client))
+                result['throughput [Mbps]'][client] = throughput
+                if not throughput:
+                    result['error'] = 'client {} did not transfer any data'.format(client)
+        result['status'] = 'failed' if result['error'] else 'ok'
+        if result['error']:
+            error('Smoke run of {} failed: {}\n'.format(result['logs_dir'], result['error']))
+        results.append(result)
+    return results
+
+
+def run(plan, duration=5, base_folder='./logs', available_ccs=None):
+    """
+    Pre-flight of a plan: static check of all points, smoke runs if it passed, and the report.
+
+    :return:    True if the campaign can run, i.e. there were no errors
+    """
+    problems = check_plan(plan, available_ccs)
+    errors = print_problems(problems)
+    results = smoke(plan, duration, base_folder) if not errors else []
+    failed = [result for result in results if result['status'] == 'failed']
+
+    report_file = Report_file.format(base_folder)
+    if not os.path.isdir(os.path.dirname(report_file)):
+        os.makedirs(os.path.dirname(report_file))
+    with open(report_file, 'w') as f:
+        json.dump({'problems': [dict(problem._asdict(), points=where) for problem, where in problems.items()],
+                   'smoke': results}, f, indent=2)
+    output('Pre-flight of {} points: {} errors, {} warnings, {}/{} smoke runs passed, see {}\n'.format(
+        len(plan), errors, len(problems) - errors, len(results) - len(failed), len(results), report_file))
+    return not errors and not failed
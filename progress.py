@@ -0,0 +1,176 @@
+"""
+Live progress of a sweep, served over HTTP while the experiments run:
+    /metrics    Prometheus text format
+    /status     JSON
+"""
+import collections
+import csv
+import json
+import threading
+import time
+
+try:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+except ImportError:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from mininet.log import info
+
+METRIC_PREFIX = 'mptcp_bench'
+
+
+def iperf_sender_throughput(iperf_file):
+    """ Throughput [Mbps] of the sender summary line of an iperf3 client log, None if the run did not finish. """
+    try:
+        with open(iperf_file) as f:
+            for line in f:
+                if line.rstrip().endswith('sender') and 'Mbits/sec' in line:
+                    return float(line.split('Mbits/sec')[0].split()[-1])
+    except IOError:
+        pass
+    return None
+
+
+def mean_ack_rtt(dump_file):
+    """ Mean ack RTT [ms] of the csv tshark extracted from the capture of a client, None without RTT samples. """
+    mean = mean_column(dump_file, 'tcp.analysis.ack_rtt')
+    return 1000 * mean if mean is not None else None
+
+
+def mean_column(csv_file, column):
+    """ Mean of the non empty values of a column of a tab separated file, None without values. """
+    total, n = 0.0, 0
+    try:
+        with open(csv_file) as f:
+            for row in csv.DictReader(f, delimiter='\t'):
+                if row.get(column):
+                    total += float(row[column])
+                    n += 1
+    except IOError:
+        pass
+    return total / n if n else None
+
+
+class Progress(object):
+    """
+    Thread safe state of a sweep: planned, completed and failed experiments, rolling durations of the experiment
+    phases, the ETA derived from them and the throughput and RTT of the flows of the latest experiment.
+    """
+    def __init__(self, planned=0, window=20):
+        """
+        :param planned: number of experiments the sweep consists of
+        :param window:  number of experiments the rolling durations are averaged over
+        """
+        self.lock = threading.Lock()
+        self.planned, self.completed, self.failed = planned, 0, 0
+        self.started = time.time()
+        self.durations = collections.defaultdict(lambda: collections.deque(maxlen=window))
+        self.current, self.current_start = None, None
+        self.latest, self.flows = None, {}
+        self.workers = 1  # experiments running in parallel, see workqueue
+
+    def start(self, name):
+        with self.lock:
+            self.current, self.current_start = name, time.time()
+
+    def finish(self, phases=None, flows=None, failed=False, name=None, duration=None):
+        """
+        Record the end of the current experiment, or of an experiment another process ran if name is given.
+
+        :param phases:  dict phase -> duration [s] of the experiment, skipped experiments have none and do not count
+                        towards the durations
+        :param flows:   dict client -> {'throughput [Mbps]': .., 'rtt [ms]': ..}
+        :param failed:  whether the experiment failed or was invalidated
+        :param name:    name of an experiment run by a worker
+        :param duration: wall time [s] of an experiment run by a worker
+        """
+        with self.lock:
+            if phases:
+                self.durations['experiment'].append(time.time() - self.current_start if duration is None else duration)
+            for phase, duration in (phases or {}).items():
+                self.durations[phase].append(duration)
+            if failed:
+                self.failed += 1
+            else:
+                self.completed += 1
+            if flows:
+                self.latest, self.flows = name or self.current, flows
+            if name is None:
+                self.current = None
+
+    def status(self):
+        with self.lock:
+            remaining = max(self.planned - self.completed - self.failed, 0)
+            durations = {phase: sum(d) / len(d) for phase, d in self.durations.items() if d}
+            eta = remaining * durations['experiment'] / self.workers if 'experiment' in durations else None
+            if eta is not None and self.current is not None:
+                eta = max(eta - (time.time() - self.current_start), 0)
+            return {
+                'planned': self.planned,
+                'completed': self.completed,
+                'failed': self.failed,
+                'remaining': remaining,
+                'elapsed [s]': time.time() - self.started,
+                'eta [s]': eta,
+                'phase durations [s]': durations,
+                'current': self.current,
+                'workers': self.workers,
+                'latest': self.latest,
+                'flows': dict(self.flows),
+            }
+
+    def metrics(self):
+        """ Status in the Prometheus text exposition format. """
+        status = self.status()
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append('# HELP {}_{} {}'.format(METRIC_PREFIX, name, help_text))
+            lines.append('# TYPE {}_{} {}'.format(METRIC_PREFIX, name, kind))
+            for labels, value in samples:
+                label_text = ','.join('{}="{}"'.format(k, v) for k, v in sorted(labels.items()))
+                lines.append('{}_{}{} {}'.format(METRIC_PREFIX, name, '{' + label_text + '}' if labels else '', value))
+
+        metric('experiments_total', 'counter', 'Finished experiments by state.',
+               [({'state': 'completed'}, status['completed']), ({'state': 'failed'}, status['failed'])])
+        metric('experiments_remaining', 'gauge', 'Planned experiments not yet finished.', [({}, status['remaining'])])
+        metric('phase_duration_seconds', 'gauge', 'Rolling mean duration of the experiment phases.',
+               [({'phase': p}, d) for p, d in sorted(status['phase durations [s]'].items())])
+        if status['eta [s]'] is not None:
+            metric('eta_seconds', 'gauge', 'Estimated time until the sweep is done.', [({}, status['eta [s]'])])
+        for key, name in (('throughput [Mbps]', 'flow_throughput_mbps'), ('rtt [ms]', 'flow_rtt_ms'),
+                          ('fct [ms]', 'flow_fct_ms')):
+            samples = [({'host': host, 'experiment': status['latest']}, flow[key])
+                       for host, flow in sorted(status['flows'].items()) if flow.get(key) is not None]
+            metric(name, 'gauge', 'Per flow {} of the latest experiment.'.format(key), samples)
+        return '\n'.join(lines) + '\n'
+
+    def serve(self, port, host='127.0.0.1'):
+        """ Serve /metrics and /status in a background thread. """
+        progress = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == '/metrics':
+                    body, content_type = progress.metrics(), 'text/plain; version=0.0.4'
+                elif self.path == '/status':
+                    body, content_type = json.dumps(progress.status(), indent=2), 'application/json'
+                else:
+                    self.send_error(404)
+                    return
+                body = body.encode()
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = HTTPServer((host, port), Handler)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        info('Serving sweep status on http://{}:{}/status and /metrics\n'.format(host, port))
+        return server
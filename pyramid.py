@@ -0,0 +1,326 @@
+"""
+Multi-resolution time series for interactive plotting. Per repetition the throughput and RTT of every client and the
+backlog of every monitored queue are aggregated into a pyramid of levels: the base level holds min/max/mean per bucket
+of `base_ms`, every further level merges `factor` buckets of the level below, until a level has at most `min_buckets`.
+The pyramids are stored with the results, next to the logs as <rep>_pyramid.npz or as file of an archived experiment.
+
+    pyramid = Pyramid.load('logs/two_paths/lia/10Mbps_10Mbps/10.0ms_10.0ms/0_pyramid.npz')
+    df = pyramid.window('rtt_h1', start_s=10, end_s=20, width=800)      # min/max envelope, at most 800 buckets
+    df = pyramid.window('throughput_h1', width=800, method='lttb')       # mean downsampled by LTTB
+
+A window only touches the level whose bucket count fits the requested width, whole traces are never loaded for a
+plot. `python pyramid.py logs` builds the missing pyramids of a log tree, `python pyramid.py logs/de.sqlite` the ones
+of an archive.
+"""
+import io
+import os
+from argparse import ArgumentParser
+
+import numpy as np
+import pandas as pd
+
+import analysis
+
+Pyramid_name = '{}_pyramid.npz'
+STATS = ('count', 'mean', 'min', 'max')
+
+
+def aggregate(times_s, values, base_ms):
+    """
+    Base level of a pyramid from samples.
+
+    :param times_s:     array like of sample times [s] since the experiment start
+    :param values:      array like of sample values, NaN samples are left out
+    :param base_ms:     bucket width [ms]
+    :return:            dict with arrays 'count', 'sum', 'min' and 'max' per bucket, empty buckets have count 0
+    """
+    times_s, values = np.asarray(times_s, dtype=np.float64), np.asarray(values, dtype=np.float64)
+    keep = np.isfinite(times_s) & np.isfinite(values) & (times_s >= 0)
+    index = np.floor(times_s[keep] * 1000.0 / base_ms).astype(np.int64)
+    values = values[keep]
+    n = int(index.max()) + 1 if index.size else 0
+
+    order = np.argsort(index, kind='mergesort')  # captures are almost sorted already
+    index, values = index[order], values[order]
+    level = {'count': np.bincount(index, minlength=n).astype(np.float64),
+             'sum': np.bincount(index, weights=values, minlength=n),
+             'min': np.full(n, np.nan), 'max': np.full(n, np.nan)}
+    if index.size:
+        starts = np.flatnonzero(np.r_[True, index[1:] != index[:-1]])
+        level['min'][index[starts]] = np.minimum.reduceat(values, starts)
+        level['max'][index[starts]] = np.maximum.reduceat(values, starts)
+    return level
+
+
+def coarsen(level, factor):
+    """ Next level of a pyramid, merging `factor` buckets, the last bucket may cover fewer. """
+    n = -(-len(level['count']) // factor)
+    merged = {}
+    for stat, fill in (('count', 0.0), ('sum', 0.0), ('min', np.nan), ('max', np.nan)):
+        padded = np.full(n * factor, fill)
+        padded[:len(level[stat])] = level[stat]
+        padded = padded.reshape(n, factor)
+        if stat in ('count', 'sum'):
+            merged[stat] = padded.sum(axis=1)
+        else:
+            # fmin/fmax skip empty buckets (NaN), groups of only empty buckets stay NaN
+            merged[stat] = (np.fmin if stat == 'min' else np.fmax).reduce(padded, axis=1)
+    return merged
+
+
+def build_levels(times_s, values, base_ms=10, factor=4, min_buckets=256):
+    """
+    All levels of a pyramid, see module docstring.
+
+    :return:    list of dicts with arrays 'count', 'mean', 'min' and 'max', finest level first
+    """
+    levels, level = [], aggregate(times_s, values, base_ms)
+    while True:
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.where(level['count'] > 0, level['sum'] / level['count'], np.nan)
+        levels.append({'count': level['count'], 'mean': mean, 'min': level['min'], 'max': level['max']})
+        if len(level['count']) <= min_buckets:
+            return levels
+        level = coarsen(level, factor)
+
+
+def lttb(x, y, threshold):
+    """
+    Largest-Triangle-Three-Buckets downsampling, keeps the points that shape a line plot.
+
+    :param x:           sorted array of x values
+    :param y:           array of y values, without NaN
+    :param threshold:   number of points to keep, at least 3
+    :return:            tuple of arrays (x, y) with `threshold` points, the input if it is not longer
+    """
+    x, y = np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64)
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return x, y
+    # bucket boundaries of the points between the fixed first and last one
+    edges = (np.arange(threshold - 1) * (n - 2) / float(threshold - 2)).astype(np.int64) + 1
+    edges[-1] = n - 1
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        # the next bucket is represented by its average point, the last bucket by the last point
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x, avg_y = x[end:next_end].mean(), y[end:next_end].mean()
+        areas = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(np.argmax(areas))
+        selected[i + 1] = a
+    return x[selected], y[selected]
+
+
+class Pyramid(object):
+    """ Pyramids of the series of one repetition. """
+    def __init__(self, series=None, base_ms=10, factor=4):
+        """
+        :param series:  dict name -> list of levels as from build_levels
+        """
+        self.series = series or {}
+        self.base_ms, self.factor = base_ms, factor
+
+    def add(self, name, times_s, values, min_buckets=256):
+        self.series[name] = build_levels(times_s, values, self.base_ms, self.factor, min_buckets)
+
+    def bucket_ms(self, level):
+        return self.base_ms * self.factor ** level
+
+    def save(self, f):
+        """ Write as compressed numpy archive, `f` is a file name or a file object. """
+        arrays = {'base_ms': self.base_ms, 'factor': self.factor}
+        for name, levels in self.series.items():
+            for i, level in enumerate(levels):
+                for stat in STATS:
+                    arrays['{}.{}.{}'.format(name, i, stat)] = level[stat]
+        np.savez_compressed(f, **arrays)
+
+    @classmethod
+    def load(cls, f):
+        """ Read a pyramid file, the levels are loaded lazily when a window needs them. """
+        data = np.load(f)
+        series = {}
+        for key in data.files:
+            if key.count('.') >= 2:
+                name, level, _ = key.rsplit('.', 2)
+                series.setdefault(name, set()).add(int(level))
+        pyramid = cls(base_ms=int(data['base_ms']), factor=int(data['factor']))
+        pyramid.series = dict((name, [_LazyLevel(data, name, i) for i in range(len(levels))])
+                              for name, levels in series.items())
+        return pyramid
+
+    def level_for(self, name, start_s, end_s, width):
+        """ Finest level with at most `width` buckets within the window. """
+        levels = self.series[name]
+        for i in range(len(levels)):
+            if (end_s - start_s) * 1000.0 / self.bucket_ms(i) <= width:
+                return i
+        return len(levels) - 1
+
+    def window(self, name, start_s=None, end_s=None, width=1000, method='envelope'):
+        """
+        Series within a time window at the resolution fitting a plot of `width` pixels.
+
+        :param name:    series, e.g. 'throughput_h1', 'rtt_h1' or 'backlog_s1-eth2'
+        :param start_s: start of the window [s], None from the start
+        :param end_s:   end of the window [s], None up to the end
+        :param width:   horizontal resolution [pixels]
+        :param method:  'envelope' returns min/max/mean per bucket, 'lttb' the mean downsampled to `width` points from
+                        a level up to 8 times finer
+        :return:        DataFrame with columns 'sec', 'count', 'mean', 'min' and 'max', empty buckets left out;
+                        for lttb only 'sec' and 'mean'
+        """
+        if method not in ('envelope', 'lttb'):
+            raise ValueError('Unknown method {}, use envelope or lttb.'.format(method))
+        levels = self.series[name]
+        start_s = 0.0 if start_s is None else start_s
+        if end_s is None:
+            end_s = len(levels[0]['count']) * self.base_ms / 1000.0
+        i = self.level_for(name, start_s, end_s, width * 8 if method == 'lttb' else width)
+        bucket_s = self.bucket_ms(i) / 1000.0
+        first, last = int(np.floor(start_s / bucket_s + 1e-9)), int(np.ceil(end_s / bucket_s - 1e-9))
+        level = levels[i]
+        df = pd.DataFrame(dict((stat, level[stat][first:last]) for stat in STATS))
+        df.insert(0, 'sec', (np.arange(len(df)) + first) * bucket_s)
+        df = df[df['count'] > 0].reset_index(drop=True)
+        if method == 'lttb':
+            x, y = lttb(df['sec'].values, df['mean'].values, width)
+            return pd.DataFrame({'sec': x, 'mean': y})
+        return df
+
+
+class _LazyLevel(object):
+    """ Level of a loaded pyramid, its arrays are decompressed on first access. """
+    def __init__(self, data, name, level):
+        self.data, self.prefix, self.arrays = data, '{}.{}.'.format(name, level), {}
+
+    def __getitem__(self, stat):
+        if stat not in self.arrays:
+            self.arrays[stat] = self.data[self.prefix + stat]
+        return self.arrays[stat]
+
+
+def experiment_pyramid(dumps, queues=None, owds=None, t0=None, base_ms=10, factor=4):
+    """
+    Pyramid of one repetition. With the experiment start t0 all series share its time axis, without (logs of older
+    versions) every series starts at its own first packet or sample.
+
+    :param dumps:   dict client -> tshark csv as written by MPMininetExp.calculate_rtt (file name or file object)
+    :param queues:  queue monitor samples (.npz file name or file object), None without queue monitoring
+    :param owds:    dict client -> one-way delay csv as written by owd.write_owd, None without
+    :param t0:      start of the experiment, see analysis.load_t0
+    :return:        Pyramid with the series throughput_<client> [Mbps], rtt_<client> [ms], backlog_<intf> [bytes]
+                    and with one-way delays owd_<client> [ms] and queueing_<client> [ms]
+    """
+    pyramid = Pyramid(base_ms=base_ms, factor=factor)
+    for client, dump in sorted(dumps.items()):
+        df = pd.read_csv(dump, delimiter='\t')
+        if t0 is not None and 'frame.time_epoch' in df:
+            times = df['frame.time_epoch'].values - t0['epoch']
+        else:
+            times = df['frame.time_relative'].values
+        pyramid.add('rtt_' + client, times, df['tcp.analysis.ack_rtt'].values * 1000)
+        # the same payload as the fairness metrics, tcp.len also counts plain TCP runs without MPTCP options
+        payload = analysis.payload_bytes(df)
+        data = (payload > 0).values
+        if data.any():
+            goodput = analysis.goodput_buckets(times[data], payload.values[data], (base_ms,))[base_ms]
+            pyramid.add('throughput_' + client, goodput['msec'].values / 1000.0, goodput['tp [Mbps]'].values)
+    for client, owd_csv in sorted((owds or {}).items()):
+        df = pd.read_csv(owd_csv, delimiter='\t')
+        pyramid.add('owd_' + client, df['sec'].values, df['owd [ms]'].values)
+        pyramid.add('queueing_' + client, df['sec'].values, df['queueing [ms]'].values)
+    if queues is not None:
+        for intf, df in analysis.load_queue_series(queues, t0).items():
+            sec = df['sec'].values if t0 is not None else df['sec'].values - df['sec'].values[0]
+            pyramid.add('backlog_' + intf, sec, df['backlog [bytes]'].values)
+    return pyramid
+
+
+def build_tree(base_folder, force=False, **kwargs):
+    """
+    Build the pyramids of all repetitions of a log tree which have RTT csvs, walking it once.
+
+    :param force:   rebuild existing pyramids
+    :return:        number of pyramids written
+    """
+    written = 0
+    for dirpath, _, filenames in os.walk(base_folder):
+        dumps, owds = {}, {}
+        for name in filenames:
+            for suffix, found in (('_iperf_dump.csv', dumps), ('_owd.csv', owds)):
+                if name.endswith(suffix):
+                    rep, client = name.split('_')[:2]
+                    found.setdefault(rep, {})[client] = os.path.join(dirpath, name)
+        for rep, rep_dumps in sorted(dumps.items()):
+            out_file = os.path.join(dirpath, Pyramid_name.format(rep))
+            if os.path.exists(out_file) and not force:
+                continue
+            queues, t0 = ['{}/{}_{}'.format(dirpath, rep, name) for name in ('queues.npz', 't0.json')]
+            experiment_pyramid(rep_dumps, queues if os.path.exists(queues) else None, owds.get(rep),
+                               analysis.load_t0(t0) if os.path.exists(t0) else None, **kwargs).save(out_file)
+            written += 1
+    return written
+
+
+def build_archive(archive, force=False, **kwargs):
+    """ Build the pyramids of all experiments of an archive.Archive and store them as files of the experiments. """
+    written = 0
+    for experiment in archive.find(valid=False):
+        rep = experiment['repetition']
+        files = dict(archive.files(experiment['id']))
+        name = Pyramid_name.format(rep)
+        if name in files and not force:
+            continue
+        dumps, owds = [dict((f.split('_')[1], io.BytesIO(archive.read(experiment['id'], f))) for f in files
+                            if f.endswith(suffix)) for suffix in ('_iperf_dump.csv', '_owd.csv')]
+        if not dumps:
+            continue
+        queues = '{}_queues.npz'.format(rep)
+        queues = io.BytesIO(archive.read(experiment['id'], queues)) if queues in files else None
+        t0 = '{}_t0.json'.format(rep)
+        t0 = analysis.load_t0(io.BytesIO(archive.read(experiment['id'], t0))) if t0 in files else None
+        out = io.BytesIO()
+        experiment_pyramid(dumps, queues, owds, t0, **kwargs).save(out)
+        archive.put(experiment['id'], name, out.getvalue())
+        written += 1
+    return written
+
+
+def load(source, logs_dir, repetition=0):
+    """
+    Pyramid of a repetition, from a log tree or an archive.
+
+    :param source:      log tree folder or archive.Archive
+    :param logs_dir:    logs dir of the experiment relative to the log tree
+    """
+    name = Pyramid_name.format(repetition)
+    if isinstance(source, str):
+        return Pyramid.load(os.path.join(source, logs_dir, name))
+    experiment = source.lookup(logs_dir, repetition)
+    if experiment is None:
+        raise KeyError('No experiment {}/{} archived.'.format(logs_dir, repetition))
+    return Pyramid.load(io.BytesIO(source.read(experiment, name)))
+
+
+def main():
+    parser = ArgumentParser(description="Build multi-resolution pyramids of throughput, RTT and queue traces")
+    parser.add_argument('source', help="Log tree or result archive (.sqlite)")
+    parser.add_argument('--base_ms', type=int, default=10, help="Bucket width of the finest level [ms]")
+    parser.add_argument('--factor', type=int, default=4, help="Buckets merged per level")
+    parser.add_argument('--force', action='store_true', help="Rebuild existing pyramids")
+    args = parser.parse_args()
+
+    if args.source.endswith('.sqlite'):
+        import archive
+        written = build_archive(archive.Archive(args.source), args.force, base_ms=args.base_ms, factor=args.factor)
+    else:
+        written = build_tree(args.source, args.force, base_ms=args.base_ms, factor=args.factor)
+    print('Built {} pyramids'.format(written))
+
+
+if __name__ == '__main__':
+    main()
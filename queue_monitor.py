@@ -0,0 +1,178 @@
+"""
+Queue monitor sampling the qdisc statistics (backlog, queue length, drops and overlimits) of a set of interfaces at a
+fixed rate. All interfaces are sampled with a single netlink dump of the qdiscs per sample, no tc process is forked.
+Interfaces have to be in the network namespace the monitor runs in, i.e. switch interfaces for Mininet.
+
+The time series are written as compressed numpy archive on SIGINT/SIGTERM:
+    t [s], intfs, backlog [bytes], qlen [pkts], drops [pkts], overlimits: one column per interface.
+The sample times are taken from the monotonic clock, which all Mininet hosts share, the experiment records its start on
+the same clock (<rep>_t0.json), see analysis.load_queue_series.
+Note: with a TCLink netem holds the packets for the emulated delay, the backlog therefore also contains the packets in
+      flight on the link (about bandwidth * latency), only the remainder is queueing.
+"""
+import array
+import errno
+import os
+import signal
+import socket
+import struct
+import time
+from argparse import ArgumentParser
+
+import numpy as np
+from monotonic import monotonic  # Monotonic time to avoid issues from NTP adjustments
+
+NETLINK_ROUTE = 0
+RTM_NEWQDISC, RTM_GETQDISC = 36, 38
+NLM_F_REQUEST, NLM_F_DUMP = 0x1, 0x300
+NLMSG_ERROR, NLMSG_DONE = 2, 3
+TC_H_ROOT = 0xFFFFFFFF
+TCA_STATS, TCA_STATS2 = 3, 7
+TCA_STATS_QUEUE = 3
+
+NLMSG_HDR = struct.Struct('=IHHII')
+TCMSG = struct.Struct('=BxxxiIII')
+RTATTR = struct.Struct('=HH')
+GNET_STATS_QUEUE = struct.Struct('=IIIII')  # qlen, backlog, drops, requeues, overlimits
+TC_STATS = struct.Struct('=QIIIIIII')  # bytes, packets, drops, overlimits, bps, pps, qlen, backlog
+
+METRICS = ('backlog', 'qlen', 'drops', 'overlimits')
+
+
+def interface_index(name):
+    with open('/sys/class/net/{}/ifindex'.format(name)) as f:
+        return int(f.read())
+
+
+def _retry(call, *args):
+    """ Call a socket method again when a signal interrupted it, python 2 raises EINTR instead of retrying. """
+    while True:
+        try:
+            return call(*args)
+        except (socket.error, IOError, OSError) as e:
+            if e.args[0] != errno.EINTR:
+                raise
+
+
+class QueueMonitor(object):
+    """ Sample the root qdisc statistics of interfaces with netlink qdisc dumps. """
+    def __init__(self, intfs):
+        """
+        :param intfs:   interface names to monitor
+        """
+        self.intfs = list(intfs)
+        self.columns = {interface_index(name): i for i, name in enumerate(self.intfs)}
+        self.sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, NETLINK_ROUTE)
+        self.sock.bind((0, 0))
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+        self.seq = 0
+
+        self.t = array.array('d')
+        self.samples = {m: array.array('I') for m in METRICS}
+
+    def _request(self):
+        self.seq += 1
+        payload = TCMSG.pack(socket.AF_UNSPEC, 0, 0, 0, 0)
+        return NLMSG_HDR.pack(NLMSG_HDR.size + len(payload), RTM_GETQDISC, NLM_F_REQUEST | NLM_F_DUMP, self.seq,
+                              0) + payload
+
+    @staticmethod
+    def _queue_stats(data, offset, end):
+        """ Parse the attributes of a qdisc message, returns (backlog, qlen, drops, overlimits) or None. """
+        stats = None
+        while offset + RTATTR.size <= end:
+            length, kind = RTATTR.unpack_from(data, offset)
+            if length < RTATTR.size:
+                break
+            if kind == TCA_STATS2:
+                nested, nested_end = offset + RTATTR.size, offset + length
+                while nested + RTATTR.size <= nested_end:
+                    n_length, n_kind = RTATTR.unpack_from(data, nested)
+                    if n_length < RTATTR.size:
+                        break
+                    if n_kind == TCA_STATS_QUEUE:
+                        qlen, backlog, drops, _, overlimits = GNET_STATS_QUEUE.unpack_from(data, nested + RTATTR.size)
+                        return backlog, qlen, drops, overlimits
+                    nested += (n_length + 3) & ~3
+            elif kind == TCA_STATS:
+                _, _, drops, overlimits, _, _, qlen, backlog = TC_STATS.unpack_from(data, offset + RTATTR.size)
+                stats = backlog, qlen, drops, overlimits
+            offset += (length + 3) & ~3
+        return stats
+
+    def sample(self):
+        """
+        Query all qdiscs of the namespace once and return the stats of the monitored interfaces.
+
+        :return:    list with a (backlog, qlen, drops, overlimits) tuple per interface
+        """
+        values = [(0, 0, 0, 0)] * len(self.intfs)
+        _retry(self.sock.send, self._request())
+        done = False
+        while not done:
+            data = _retry(self.sock.recv, 1 << 16)
+            offset = 0
+            while offset + NLMSG_HDR.size <= len(data):
+                length, msg_type, _, _, _ = NLMSG_HDR.unpack_from(data, offset)
+                if msg_type in (NLMSG_DONE, NLMSG_ERROR) or length == 0:
+                    done = True
+                    break
+                if msg_type == RTM_NEWQDISC:
+                    _, ifindex, _, parent, _ = TCMSG.unpack_from(data, offset + NLMSG_HDR.size)
+                    if parent == TC_H_ROOT and ifindex in self.columns:
+                        stats = self._queue_stats(data, offset + NLMSG_HDR.size + TCMSG.size, offset + length)
+                        if stats is not None:
+                            values[self.columns[ifindex]] = stats
+                offset += (length + 3) & ~3
+        return values
+
+    def run(self, rate, stop):
+        """
+        Sample at a fixed rate until stop() returns True. Samples are not caught up if the monitor falls behind.
+
+        :param rate:    samples per second
+        :param stop:    callable signaling the end of the monitoring
+        """
+        interval = 1.0 / rate
+        next_sample = monotonic()
+        while not stop():
+            now = monotonic()
+            if now < next_sample:
+                time.sleep(next_sample - now)
+                continue
+            values = self.sample()
+            self.t.append(now)
+            for m, metric in enumerate(METRICS):
+                self.samples[metric].extend(v[m] for v in values)
+            next_sample = max(next_sample + interval, now)
+
+    def save(self, out_file):
+        n = len(self.t)
+        series = {m: np.frombuffer(self.samples[m], dtype=np.uint32)[:n * len(self.intfs)]
+                  .reshape(n, len(self.intfs)) for m in METRICS}
+        np.savez_compressed(out_file, t=np.frombuffer(self.t, dtype=np.float64), intfs=np.array(self.intfs), **series)
+
+
+def main():
+    parser = ArgumentParser(description="Sample qdisc backlog, drops and overlimits of interfaces")
+    parser.add_argument('--intfs', '-i', help="Comma separated interface names", required=True)
+    parser.add_argument('--rate', '-r', type=float, help="Samples per second", default=1000)
+    parser.add_argument('--outfile', '-o', help="Name of output file (.npz)", required=True)
+    args = parser.parse_args()
+
+    stopped = []
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda *_: stopped.append(True))
+
+    monitor = QueueMonitor(args.intfs.split(','))
+    try:
+        monitor.run(args.rate, stop=lambda: bool(stopped))
+    finally:
+        # the samples taken so far are kept even if the monitoring failed
+        monitor.save(args.outfile)
+    print('Queue monitor stored {} samples of {} interfaces in {}'.format(
+        len(monitor.t), len(monitor.intfs), os.path.abspath(args.outfile)))
+
+
+if __name__ == '__main__':
+    main()
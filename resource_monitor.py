@@ -0,0 +1,138 @@
+import json
+import threading
+import time
+
+import numpy as np
+from monotonic import monotonic  # Monotonic time to avoid issues from NTP adjustments
+
+# Default saturation thresholds, a run passing any of them does not reflect the emulated network
+THRESHOLDS = {
+    'core_busy': 0.9,       # 95th percentile of the busy share of the busiest core
+    'core_softirq': 0.5,    # 95th percentile of the softirq share of the busiest core, i.e. packet processing
+    'mem_available': 0.05,  # minimal share of available memory
+}
+
+
+def read_cpu_times():
+    """
+    Per core jiffies from /proc/stat.
+
+    :return:    tuple (array cores x (busy, softirq, total), context switches since boot)
+    """
+    cores, ctxt = [], 0
+    with open('/proc/stat') as f:
+        for line in f:
+            if line.startswith('cpu') and line[3].isdigit():
+                # user nice system idle iowait irq softirq steal ...
+                values = [int(v) for v in line.split()[1:]]
+                idle = values[3] + values[4]
+                cores.append((sum(values[:8]) - idle, values[6], sum(values[:8])))
+            elif line.startswith('ctxt'):
+                ctxt = int(line.split()[1])
+    return np.array(cores, dtype=np.float64), ctxt
+
+
+def read_memory():
+    """ Available share of the memory, see MemAvailable in /proc/meminfo. """
+    mem = {}
+    with open('/proc/meminfo') as f:
+        for line in f:
+            key, _, value = line.partition(':')
+            mem[key] = int(value.split()[0])
+    return float(mem['MemAvailable']) / mem['MemTotal']
+
+
+class ResourceMonitor(object):
+    """
+    Sample the CPU utilization per core, the softirq load, context switches and memory of the host machine while an
+    experiment runs. Mininet emulation is only faithful as long as the machine is not saturated, runs passing the
+    saturation thresholds are flagged.
+    """
+    def __init__(self, interval=0.1, thresholds=None):
+        """
+        :param interval:    sampling interval [s]
+        :param thresholds:  overrides of the saturation THRESHOLDS
+        """
+        self.interval = interval
+        self.thresholds = dict(THRESHOLDS, **(thresholds or {}))
+        self.busy, self.softirq, self.ctxt, self.mem, self.t = [], [], [], [], []
+        self._stop, self._thread = False, None
+
+    def start(self):
+        self._stop = False
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self):
+        last_cpu, last_ctxt = read_cpu_times()
+        last_t = start = monotonic()
+        while not self._stop:
+            time.sleep(self.interval)
+            cpu, ctxt = read_cpu_times()
+            now = monotonic()
+
+            delta = cpu - last_cpu
+            total = np.maximum(delta[:, 2], 1)
+            self.busy.append(delta[:, 0] / total)
+            self.softirq.append(delta[:, 1] / total)
+            self.ctxt.append((ctxt - last_ctxt) / (now - last_t))
+            self.mem.append(read_memory())
+            self.t.append(now - start)
+            last_cpu, last_ctxt, last_t = cpu, ctxt, now
+
+    def stop(self):
+        self._stop = True
+        if self._thread is not None:
+            self._thread.join()
+
+    def summary(self):
+        """
+        Summarize the samples and check them against the thresholds.
+
+        :return:    dict with statistics per core, context switches, memory and the saturation verdict
+        """
+        if not self.t:
+            return {'samples': 0, 'saturated': False, 'reasons': []}
+
+        busy, softirq = np.array(self.busy), np.array(self.softirq)
+        busy_p95, softirq_p95 = np.percentile(busy, 95, axis=0), np.percentile(softirq, 95, axis=0)
+        summary = {
+            'samples': len(self.t),
+            'duration [s]': self.t[-1],
+            'core busy mean': busy.mean(axis=0).round(4).tolist(),
+            'core busy p95': busy_p95.round(4).tolist(),
+            'core softirq mean': softirq.mean(axis=0).round(4).tolist(),
+            'core softirq p95': softirq_p95.round(4).tolist(),
+            'ctxt [1/s] mean': float(np.mean(self.ctxt)),
+            'ctxt [1/s] max': float(np.max(self.ctxt)),
+            'mem available min': min(self.mem),
+            'thresholds': self.thresholds,
+        }
+
+        reasons = []
+        if busy_p95.max() > self.thresholds['core_busy']:
+            reasons.append('core {} busy {:.0%} (p95)'.format(busy_p95.argmax(), busy_p95.max()))
+        if softirq_p95.max() > self.thresholds['core_softirq']:
+            reasons.append('core {} softirq {:.0%} (p95)'.format(softirq_p95.argmax(), softirq_p95.max()))
+        if summary['mem available min'] < self.thresholds['mem_available']:
+            reasons.append('memory available {:.1%}'.format(summary['mem available min']))
+        summary['saturated'], summary['reasons'] = bool(reasons), reasons
+        return summary
+
+    def write(self, out_file, **extra):
+        """ Write the summary, together with extra entries, to a JSON file and return it. """
+        summary = self.summary()
+        summary.update(extra)
+        with open(out_file, 'w') as f:
+            json.dump(summary, f, indent=2, sort_keys=True)
+        return summary
+
+
+def is_saturated(summary_file):
+    """ Whether a stored run was flagged as saturated, runs without summary are considered valid. """
+    try:
+        with open(summary_file) as f:
+            return json.load(f).get('saturated', False)
+    except (IOError, ValueError):
+        return False
@@ -34,7 +34,7 @@ def main():
 
     try:
         s = socket.socket(socket.AF_INET)
-        s.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, args.bufsize / 2 * 1000)  # The kernel doubles the value set here
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, args.bufsize // 2 * 1000)  # The kernel doubles the value set here
         s.connect((args.server, args.port))
     except socket.error:
         sys.stderr.write("Could not connect to receiver\n")
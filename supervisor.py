@@ -0,0 +1,199 @@
+"""
+Fault isolation of experiments. Every experiment runs in a Scope which records what it creates on the host: the
+Mininet network with its host shells (one network namespace each), switches and interfaces, background processes
+started in the host shells and local subprocesses. A failed experiment is cleaned up through its scope only, other
+experiments and unrelated processes on the host are not touched, and the Supervisor retries it with backoff.
+"""
+import errno
+import json
+import os
+import signal
+import socket
+import subprocess
+import time
+import traceback
+
+from mininet.log import debug, error, warn
+
+# scopes of the experiments currently running in this process, cleaned up on an unexpected exit
+active_scopes = set()
+
+
+def kill_pid(pid, sig):
+    """ Send a signal, processes which already exited are ignored. """
+    try:
+        os.kill(pid, sig)
+    except OSError as e:
+        if e.errno != errno.ESRCH:
+            raise
+
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except OSError as e:
+        return e.errno != errno.ESRCH
+    return True
+
+
+def wait_pids(pids, timeout):
+    """ Wait until the processes exited, return the ones still alive after the timeout. """
+    deadline = time.time() + timeout
+    alive = [pid for pid in pids if pid_alive(pid)]
+    while alive and time.time() < deadline:
+        time.sleep(0.05)
+        alive = [pid for pid in alive if pid_alive(pid)]
+    return alive
+
+
+def run_quiet(cmd):
+    """ Run a cleanup command, failures are only logged as the object may be gone already. """
+    with open(os.devnull, 'w') as devnull:
+        ret = subprocess.call(cmd, stdout=devnull, stderr=devnull)
+    if ret:
+        debug('Cleanup command {} returned {}\n'.format(' '.join(cmd), ret))
+
+
+class Scope(object):
+    """ Processes, namespaces and interfaces created by one experiment. """
+    def __init__(self, name):
+        self.name = name
+        self.net = None
+        self.hosts, self.switches, self.intfs = {}, [], []  # host name -> shell pid
+        self.pids, self.processes, self.callbacks = [], [], []
+
+    def __enter__(self):
+        active_scopes.add(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        self.cleanup()
+
+    def track_network(self, net):
+        """ Record the nodes of a built Mininet network, the host shells own the network namespaces. """
+        self.net = net
+        self.hosts = {host.name: host.pid for host in net.hosts}
+        self.switches = [switch.name for switch in net.switches]
+        self.intfs = [intf.name for switch in net.switches for intf in switch.intfList() if intf.name != 'lo']
+
+    def track_pid(self, pid):
+        """ Record a background process, e.g. `node.lastPid` after a command ending with `&`. """
+        if pid:
+            self.pids.append(int(pid))
+        return pid
+
+    def track_process(self, process):
+        """ Record a local subprocess.Popen. """
+        if process is not None:
+            self.processes.append(process)
+        return process
+
+    def on_cleanup(self, callback):
+        """ Call back on cleanup, before any process is stopped, e.g. to stop a thread. """
+        self.callbacks.append(callback)
+
+    def release(self, item):
+        """ Forget a pid, process or callback which was stopped the regular way. """
+        for tracked in (self.pids, self.processes, self.callbacks):
+            if item in tracked:
+                tracked.remove(item)
+
+    def cleanup(self, timeout=2.0):
+        """ Stop everything the experiment created, processes first get SIGINT to flush their output. """
+        active_scopes.discard(self)
+        for callback in reversed(self.callbacks):
+            try:
+                callback()
+            except Exception as e:
+                warn('Cleanup of {} failed to run {}: {}\n'.format(self.name, callback, e))
+        self.callbacks = []
+
+        for process in self.processes:
+            if process.poll() is None:
+                process.send_signal(signal.SIGINT)
+        for pid in self.pids:
+            kill_pid(pid, signal.SIGINT)
+        for pid in wait_pids(self.pids + [p.pid for p in self.processes if p.poll() is None], timeout):
+            kill_pid(pid, signal.SIGKILL)
+        for process in self.processes:
+            process.poll()
+        self.pids, self.processes = [], []
+
+        if self.net is not None:
+            try:
+                self.net.stop()
+            except Exception as e:
+                warn('Stopping the network of {} failed, removing its nodes one by one: {}\n'.format(self.name, e))
+                self.remove_nodes()
+            self.net = None
+
+    def remove_nodes(self):
+        """ Remove the nodes of the network without Mininet: host shells with their namespaces, links, switches. """
+        for name, pid in self.hosts.items():
+            if not pid:
+                continue
+            # host shells are session leaders, their process group contains everything started in the host
+            try:
+                os.killpg(pid, signal.SIGKILL)
+            except OSError as e:
+                if e.errno != errno.ESRCH:
+                    warn('Failed to stop host {} ({}): {}\n'.format(name, pid, e))
+        for intf in self.intfs:
+            run_quiet(['ip', 'link', 'del', intf])
+        for switch in self.switches:
+            run_quiet(['ovs-vsctl', '--if-exists', 'del-br', switch])
+
+
+def cleanup_active():
+    """ Clean up all experiments still running in this process, e.g. after an unexpected exception. """
+    for scope in list(active_scopes):
+        error('Cleaning up {}\n'.format(scope.name))
+        scope.cleanup()
+
+
+class Supervisor(object):
+    """ Run experiments in their own scope, record failures and retry them with exponential backoff. """
+    def __init__(self, retries=2, backoff=10.0, factor=3.0):
+        """
+        :param retries:     attempts after the first failed one
+        :param backoff:     seconds to wait before the first retry
+        :param factor:      growth of the wait per further retry
+        """
+        self.retries, self.backoff, self.factor = retries, backoff, factor
+        self.failures = []  # failed attempts of the latest run
+
+    def run(self, name, experiment, failure_file=None):
+        """
+        Run an experiment until it succeeds or the retries are used up.
+
+        :param name:            name of the experiment for the logs
+        :param experiment:      callable taking the Scope to register with and returning the result
+        :param failure_file:    JSON file the failed attempts are recorded in, None only logs them
+        :return:                result of the experiment, None if every attempt failed
+        """
+        self.failures = []
+        for attempt in range(self.retries + 1):
+            scope = Scope('{} attempt {}'.format(name, attempt + 1))
+            try:
+                with scope:
+                    return experiment(scope)
+            except Exception as e:
+                self.failures.append({'attempt': attempt + 1, 'time': time.time(), 'host': socket.gethostname(),
+                                      'error': '{}: {}'.format(type(e).__name__, e),
+                                      'traceback': traceback.format_exc()})
+                error('Experiment {} failed, attempt {}/{}: {}\n'.format(name, attempt + 1, self.retries + 1,
+                                                                         self.failures[-1]['error']))
+                if failure_file is not None:
+                    self.record(failure_file)
+            if attempt < self.retries:
+                wait = self.backoff * self.factor ** attempt
+                warn('Retrying {} in {:.0f}s\n'.format(name, wait))
+                time.sleep(wait)
+        return None
+
+    def record(self, failure_file):
+        folder = os.path.dirname(failure_file)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+        with open(failure_file, 'w') as f:
+            json.dump(self.failures, f, indent=2)
@@ -0,0 +1,260 @@
+"""
+Declarative sweeps. A sweep spec (sweeps/<name>.json) declares the topologies, the congestion controls, the link group
+values to explore, the repetitions, the workload, the capture options and the metrics of a campaign:
+
+    {
+      "name": "de",
+      "topologies": ["two_paths", {"name": "asym_mp", "dimensions": [{"latency_group": [10]}]}],
+      "congestion_controls": ["lia", "olia", "balia", "wvegas", "cubic"],
+      "dimensions": [{"latency_group": [0, 30, 60, 90]}, {"scheduler": ["default", "redundant"]}],
+      "repetitions": 3,
+      "workload": {"runtime": 60, "interval": 0.1},
+      "capture": {"tcpdump": true, "keep_pcaps": false, "queue_rate": null, "compression": "gzip"},
+      "metrics": ["throughput", "rtt"]
+    }
+
+Every entry of `dimensions` is explored on its own, within an entry all combinations of values over all groups of the
+listed group fields and the listed MPTCP settings (topo_config.MPTCP_SETTINGS) are run. MPTCP settings only apply to
+MPTCP congestion controls, TCP experiments run once without them. Topologies given as objects override fields of the
+spec for that topology. A congestion control is either one name for all clients or a list with one name per client.
+The workload is an iperf bulk transfer per client for `runtime` seconds, or with `"mode": "fct"` many short transfers
+whose completion times are measured, see fct.py.
+
+The spec is expanded into a plan: points (config, repetition) without duplicates, ordered such that every point runs
+once before any is repeated and cheaper points run first within a repetition.
+"""
+import collections
+import itertools
+import json
+import os
+
+from mininet.log import output, warn
+
+import fct
+from captures import check_compression
+
+from topo_config import GROUP_FIELDS, MPTCP_SETTINGS, TopoConfig, mptcp_tag, path_bottleneck
+from utils import MPTCP_CCS
+
+Sweeps_file = 'sweeps/{}.json'
+
+DEFAULTS = {
+    'congestion_controls': ['lia', 'olia', 'balia', 'wvegas', 'cubic'],
+    'dimensions': [],
+    'repetitions': 3,
+    'workload': {'runtime': 60, 'interval': 0.1},
+    'capture': {'tcpdump': True, 'keep_pcaps': False, 'queue_rate': None, 'compression': 'gzip', 'snaplen': None,
+                'keep_filter': None, 'one_way': False},
+    'metrics': ['throughput', 'rtt'],
+}
+TOPOLOGY_FIELDS = ('congestion_controls', 'dimensions', 'repetitions', 'workload', 'capture', 'metrics')
+
+# metric -> capture option it is computed from
+METRICS = {
+    'throughput': None,
+    'rtt': 'tcpdump',
+    'queue_delay': 'queue_rate',
+    'owd': 'one_way',
+    'fct': None,
+}
+# metrics of the iperf bulk transfers and of the short transfers of the FCT workload, see fct.py
+WORKLOAD_METRICS = {
+    'throughput': 'bulk',
+    'fct': 'fct',
+}
+
+# Seconds per experiment, estimated from the phases the progress report measures: Mininet setup and teardown grow
+# with the number of links, the RTT extraction with the captured packets
+COST_MODEL = {
+    'setup': 4.0,
+    'per_link': 0.15,
+    'teardown': 2.0,
+    'per_packet': 4e-6,  # tshark, data segments and their acks
+    'per_segment_owd': 1.2e-5,  # tshark on both captures and the matching of the data segments
+}
+
+Point = collections.namedtuple('Point', ['config', 'repetition', 'workload', 'capture', 'metrics', 'spec', 'cost'])
+
+
+def load_spec(name):
+    """
+    Read a sweep spec, either a path to a JSON file or the name of a spec in the sweeps folder.
+
+    :return:    dict with the defaults filled in
+    """
+    file_name = name if os.path.isfile(name) else Sweeps_file.format(name)
+    if not os.path.isfile(file_name):
+        raise IOError('Sweep spec not found! {}'.format(file_name))
+    with open(file_name) as f:
+        spec = json.load(f)
+    spec.setdefault('name', os.path.splitext(os.path.basename(file_name))[0])
+    return validate_spec(spec)
+
+
+def _merge(spec, overrides):
+    merged = dict(spec)
+    for field, value in overrides.items():
+        if field in ('workload', 'capture'):
+            merged[field] = dict(spec[field], **value)
+        else:
+            merged[field] = value
+    return merged
+
+
+def validate_spec(spec):
+    """ Check a spec and fill in the defaults, raises ValueError describing the first problem found. """
+    unknown = set(spec) - set(DEFAULTS) - {'name', 'description', 'topologies'}
+    if unknown:
+        raise ValueError('Unknown sweep fields {}.'.format(sorted(unknown)))
+    if not spec.get('topologies'):
+        raise ValueError('Sweep {} does not list any topologies.'.format(spec.get('name')))
+
+    spec = _merge(DEFAULTS, spec)
+    for topology in spec['topologies']:
+        if isinstance(topology, dict):
+            unknown = set(topology) - set(TOPOLOGY_FIELDS) - {'name'}
+            if unknown:
+                raise ValueError('Unknown fields {} for topology {}.'.format(sorted(unknown), topology.get('name')))
+            _check_fields(_merge(spec, topology))
+    _check_fields(spec)
+    return spec
+
+
+def _check_fields(spec):
+    for dimension in spec['dimensions']:
+        unknown = set(dimension) - set(GROUP_FIELDS) - set(MPTCP_SETTINGS)
+        if unknown:
+            raise ValueError('Dimensions can only change {}, got {}.'.format(GROUP_FIELDS + MPTCP_SETTINGS,
+                                                                             sorted(unknown)))
+    for metric in spec['metrics']:
+        if metric not in METRICS:
+            raise ValueError('Unknown metric {}, available: {}.'.format(metric, sorted(METRICS)))
+        if METRICS[metric] and not spec['capture'].get(METRICS[metric]):
+            raise ValueError('Metric {} requires the capture option {}.'.format(metric, METRICS[metric]))
+        if metric in WORKLOAD_METRICS and spec['workload'].get('mode', 'bulk') != WORKLOAD_METRICS[metric]:
+            raise ValueError('Metric {} requires the {} workload.'.format(metric, WORKLOAD_METRICS[metric]))
+    fct.check_workload(spec['workload'])
+    unknown = set(spec['capture']) - set(DEFAULTS['capture'])
+    if unknown:
+        raise ValueError('Unknown capture options {}, available: {}.'.format(sorted(unknown),
+                                                                              sorted(DEFAULTS['capture'])))
+    check_compression(spec['capture']['compression'])
+    if spec['repetitions'] < 1:
+        raise ValueError('At least one repetition required, got {}.'.format(spec['repetitions']))
+
+
+def topology_specs(spec):
+    """ (topology name, spec with the topology overrides applied) for all topologies of the spec. """
+    for topology in spec['topologies']:
+        if isinstance(topology, dict):
+            yield topology['name'], _merge(spec, dict((k, v) for k, v in topology.items() if k != 'name'))
+        else:
+            yield topology, spec
+
+
+def dimension_configs(config, dimension):
+    """
+    All configs of a dimension, i.e. every combination of the values over all groups of the given group fields and
+    of the given MPTCP settings.
+
+    :param dimension:   dict group field or MPTCP setting -> values, e.g. {'latency_group': [0, 30]}
+    :return:            list of TopoConfig
+    """
+    group_fields = sorted(field for field in dimension if field in GROUP_FIELDS)
+    settings = sorted(field for field in dimension if field in MPTCP_SETTINGS)
+    axes = [(field, group) for field in group_fields for group in config.groups(field)]
+    if group_fields and not axes:
+        raise ValueError('Failed to find any links of {} belonging to a group {}.'.format(
+            config.topology_id, ' or '.join(group_fields)))
+    configs = []
+    for values in itertools.product(*[dimension[field] for field, _ in axes]):
+        derived = config
+        for field in group_fields:
+            derived = derived.with_group_values(field, dict((group, value) for (f, group), value in zip(axes, values)
+                                                            if f == field))
+        for setting_values in itertools.product(*[dimension[setting] for setting in settings]):
+            configs.append(derived.with_mptcp(**dict(zip(settings, setting_values))))
+    return configs
+
+
+def estimate_cost(config, workload, capture):
+    """ Estimated wall time [s] of one experiment, see COST_MODEL. """
+    cost = COST_MODEL['setup'] + COST_MODEL['teardown'] + COST_MODEL['per_link'] * len(config.links)
+    cost += workload['runtime']
+    if capture.get('tcpdump'):
+        # the paths can share bottlenecks, all flows together forward at most the bandwidth of every bottleneck
+        bottlenecks = set(path_bottleneck(config.links, path) for path in config.paths)
+        rate = sum(config.links[i].bandwidth for i in bottlenecks) * 1e6 / 8 / 1500
+        cost += COST_MODEL['per_packet'] * 1.5 * rate * workload['runtime']
+        if capture.get('one_way'):
+            cost += COST_MODEL['per_segment_owd'] * rate * workload['runtime']
+    return cost
+
+
+def point_key(config, repetition, workload=None):
+    """ Experiments with the same key write the same logs, see JsonTopo.get_logs_dir and fct.log_folder. """
+    return (config.topology_id, tuple(sorted(config.ccs.items())), config.links, tuple(config.queue_sizes),
+            tuple(sorted(config.mptcp.items())), repetition, fct.is_fct(workload or {}))
+
+
+def expand(specs, topologies=None):
+    """
+    Expand sweep specs into an execution plan.
+
+    :param specs:       list of validated specs
+    :param topologies:  only plan these topologies, None plans all
+    :return:            list of Point in execution order
+    """
+    points, seen = [], {}
+    for spec in specs:
+        for topo_name, topo_spec in topology_specs(spec):
+            if topologies is not None and topo_name not in topologies:
+                continue
+            base = TopoConfig.from_file(topo_name)
+            link_configs = list(itertools.chain.from_iterable(
+                dimension_configs(base, dimension) for dimension in topo_spec['dimensions'])) or [base]
+            for cc in topo_spec['congestion_controls']:
+                for link_config in link_configs:
+                    config = link_config.with_ccs(cc)
+                    if config.mptcp and not any(c in MPTCP_CCS for c in config.ccs.values()):
+                        config = config.with_mptcp(**dict.fromkeys(config.mptcp))
+                    cost = estimate_cost(config, topo_spec['workload'], topo_spec['capture'])
+                    for rep in range(topo_spec['repetitions']):
+                        key = point_key(config, rep, topo_spec['workload'])
+                        if key in seen:
+                            if seen[key].workload != topo_spec['workload'] or seen[key].capture != topo_spec['capture']:
+                                warn('Sweep {} repeats an experiment of sweep {} with other options, the first one is '
+                                     'run.\n'.format(spec['name'], seen[key].spec))
+                            continue
+                        seen[key] = Point(config, rep, topo_spec['workload'], topo_spec['capture'],
+                                          topo_spec['metrics'], spec['name'], cost)
+                        points.append(seen[key])
+    # every point once before repeating any, cheap ones first; the sort is stable, equal points keep the spec order
+    return sorted(points, key=lambda p: (p.repetition, p.cost))
+
+
+def print_plan(plan, show=10):
+    """ Print the size and the estimated wall time of a plan, per spec and topology, and its first points. """
+    groups = collections.OrderedDict()
+    for point in plan:
+        groups.setdefault((point.spec, point.config.topology_id), []).append(point)
+    output('{:<16}{:<20}{:>8}{:>10}{:>12}\n'.format('sweep', 'topology', 'points', 'configs', 'est. time'))
+    for (spec, topology), points in groups.items():
+        output('{:<16}{:<20}{:>8}{:>10}{:>12}\n'.format(spec, topology, len(points),
+                                                        len(set(p.config for p in points)),
+                                                        format_duration(sum(p.cost for p in points))))
+    output('{:<36}{:>8}{:>10}{:>12}\n'.format('total', len(plan), len(set(p.config for p in plan)),
+                                              format_duration(sum(p.cost for p in plan))))
+    for i, point in enumerate(plan[:show]):
+        values = ['{} {}={}'.format(field, group, value) for field in ('latency', 'bandwidth')
+                  for group, value in point.config.group_values(field)]
+        output('  {:>4}. {} rep {} cc {} {} ({:.0f}s)\n'.format(
+            i + 1, point.config.topology_id, point.repetition, ','.join(sorted(set(point.config.ccs.values()))),
+            ', '.join(values + ([mptcp_tag(point.config.mptcp)] if point.config.mptcp else [])), point.cost))
+    if len(plan) > show:
+        output('  ... {} more\n'.format(len(plan) - show))
+
+
+def format_duration(seconds):
+    hours, rest = divmod(int(round(seconds)), 3600)
+    return '{}h{:02d}m'.format(hours, rest // 60)
@@ -0,0 +1,670 @@
+import copy
+import itertools
+import json
+import math
+import os
+from collections import namedtuple
+
+try:
+    from mininet.log import info, warn
+except ImportError:
+    # compiled topologies are also used by the analysis, which does not require a Mininet installation
+    import logging
+
+    def info(msg):
+        logging.getLogger('mininet').info(msg.rstrip('\n'))
+
+    def warn(msg):
+        logging.getLogger('mininet').warning(msg.rstrip('\n'))
+
+Topologies_file = 'topologies/{}.json'
+
+GROUP_FIELDS = ('latency_group', 'bandwidth_group')
+LINK_VALUES = ('latency', 'bandwidth', 'max_queue_size')
+BUFFER_POLICIES = ('bdp', 'bdp_sqrt_n', 'fixed', 'link')
+EVENT_CHANGES = ('bandwidth', 'latency', 'loss', 'status')
+
+# Background flow kinds with their parameters and defaults, None marks required parameters
+BACKGROUND_KINDS = {
+    'udp': {'rate': None, 'packet_size': 1200},  # constant rate [Mbps] stream of datagrams [bytes]
+    'poisson': {'arrival_rate': None, 'mean_size': 100000, 'shape': 1.2, 'max_concurrent': 200},  # short TCP flows
+    'bulk': {'flows': 1, 'cc': 'cubic'},  # greedy TCP connections
+}
+
+# MPTCP settings of an experiment, settings which are not given keep the value the system had before the sweep
+MPTCP_SETTINGS = ('scheduler', 'path_manager', 'subflows', 'checksum')
+MPTCP_SCHEDULERS = ('default', 'roundrobin', 'redundant', 'blest')
+MPTCP_PATH_MANAGERS = ('default', 'fullmesh', 'ndiffports', 'binder')
+SUBFLOW_PATH_MANAGERS = ('fullmesh', 'ndiffports')  # path managers with a num_subflows module parameter
+
+_compiled_topologies = {}
+
+# Compiled link, `max_queue_size` is None unless set in the JSON config or by an override, else it gets derived
+Link = namedtuple('Link', ['source', 'target', 'latency', 'bandwidth', 'latency_group', 'bandwidth_group',
+                           'max_queue_size'])
+
+# Change of links at `time` seconds after the start of the clients, `changes` maps EVENT_CHANGES to new values
+LinkEvent = namedtuple('LinkEvent', ['time', 'links', 'changes'])
+
+# Background traffic from source to target host over the interface with index `interface`, active from `start` to
+# `stop` seconds after the start of the clients (None until the end), `params` as in BACKGROUND_KINDS
+BackgroundFlow = namedtuple('BackgroundFlow', ['kind', 'source', 'target', 'interface', 'start', 'stop', 'params'])
+
+# Client to server path over the interface with index `interface` on both hosts, `links` are indices into the links
+Path = namedtuple('Path', ['client', 'server', 'interface', 'links'])
+
+
+def calculate_queue_size(rtt, rate, multiplier=1.5, mtu=1500, added_pkts=20):
+    """
+    Size of queue (number of packets) according to rule of thumb where the bottleneck buffer should hold at least
+    one BDP worth of packets. Multiply the BDP by a small factor to ensure even a single flow can fully utilize the
+    bottleneck. Adding a small number of packets to the result enables ultra low delay networks and links to
+    function properly.
+    => B = multiplier * (RTT * Rate) + n_pkts_added
+
+    :param rtt:         RTT time in ms
+    :param rate:        bottleneck rate in Mbps
+    :param multiplier:  factor by which bdp is multiplied (should be > 1 to account for tcp/ip header and timeouts)
+    :param mtu:         pkt size in bytes
+    :param added_pkts:  number of packets to add to buffer size
+    :return:            number of packets in bottleneck buffer
+    """
+    rate_bps = 1e6 * (rate / 8.0)
+    rtt_seconds = rtt / 1000.0
+    bdp_pkt = rtt_seconds * rate_bps / mtu
+    return int(math.ceil(multiplier * bdp_pkt + added_pkts))
+
+
+def check_mptcp_settings(settings):
+    """
+    Validate MPTCP settings, raises ValueError for unknown settings or values.
+
+    :param settings:    dict with any of MPTCP_SETTINGS, e.g. {'scheduler': 'redundant', 'checksum': True}
+    :return:            dict of the settings, without the ones set to None
+    """
+    settings = dict((key, value) for key, value in settings.items() if value is not None)
+    unknown = set(settings) - set(MPTCP_SETTINGS)
+    if unknown:
+        raise ValueError('Unknown MPTCP settings {}, available: {}.'.format(sorted(unknown), MPTCP_SETTINGS))
+    if settings.get('scheduler', 'default') not in MPTCP_SCHEDULERS:
+        raise ValueError('Unknown MPTCP scheduler {}, available: {}.'.format(settings['scheduler'], MPTCP_SCHEDULERS))
+    if settings.get('path_manager', 'default') not in MPTCP_PATH_MANAGERS:
+        raise ValueError('Unknown MPTCP path manager {}, available: {}.'.format(settings['path_manager'],
+                                                                               MPTCP_PATH_MANAGERS))
+    if 'subflows' in settings:
+        if settings.get('path_manager') not in SUBFLOW_PATH_MANAGERS:
+            raise ValueError('Subflows per path can only be set for the path managers {}.'.format(
+                SUBFLOW_PATH_MANAGERS))
+        if int(settings['subflows']) != settings['subflows'] or settings['subflows'] < 1:
+            raise ValueError('Subflows have to be a positive integer, got {}.'.format(settings['subflows']))
+    if 'checksum' in settings:
+        settings['checksum'] = bool(settings['checksum'])
+    return settings
+
+
+def mptcp_tag(settings):
+    """ Short name of MPTCP settings for directory names, e.g. 'sched-redundant+pm-ndiffports+sf-4+csum'. """
+    parts = []
+    if 'scheduler' in settings:
+        parts.append('sched-{}'.format(settings['scheduler']))
+    if 'path_manager' in settings:
+        parts.append('pm-{}'.format(settings['path_manager']))
+    if 'subflows' in settings:
+        parts.append('sf-{}'.format(settings['subflows']))
+    if 'checksum' in settings:
+        parts.append('csum' if settings['checksum'] else 'nocsum')
+    return '+'.join(parts)
+
+
+def topology_names():
+    """ Names of all topologies in the topologies folder. """
+    folder = os.path.dirname(Topologies_file)
+    return sorted(os.path.splitext(name)[0] for name in os.listdir(folder) if name.endswith('.json'))
+
+
+def emulated_latency(latency):
+    """ Latency [ms] as configured on the TCLink, Mininet does not handle small delays well so they are raised. """
+    return latency if latency > 1 else 0.1
+
+
+def find_paths(switches, links, pairings):
+    """
+    Compute all client to server paths. Hosts route every source address over its own interface (see
+    MPMininetWrapper.setup_routing), an MPTCP connection therefore uses one path per interface index both hosts have.
+    The path for interface i leads from the i-th link of the client through switches only to the i-th link of the
+    server, for non tree topologies the shortest such path is used.
+
+    :param switches:    switch names
+    :param links:       compiled links, the order determines the interface numbering of the hosts
+    :param pairings:    (client, server) tuples
+    :return:            tuple of Path
+    """
+    adjacency = {s: [] for s in switches}
+    for i, link in enumerate(links):
+        if link.source in adjacency and link.target in adjacency:
+            adjacency[link.source].append((link.target, i))
+            adjacency[link.target].append((link.source, i))
+
+    def switch_path(start, goal):
+        # breadth first search, returns link indices between the two switches or None if not connected
+        previous, frontier = {start: None}, [start]
+        while frontier and goal not in previous:
+            next_frontier = []
+            for node in frontier:
+                for neighbour, i in adjacency[node]:
+                    if neighbour not in previous:
+                        previous[neighbour] = (node, i)
+                        next_frontier.append(neighbour)
+            frontier = next_frontier
+        if goal not in previous:
+            return None
+        hops, node = [], goal
+        while previous[node] is not None:
+            node, i = previous[node]
+            hops.append(i)
+        return hops[::-1]
+
+    def intf_links(host):
+        return [(i, link.target if link.source == host else link.source)
+                for i, link in enumerate(links) if host in (link.source, link.target)]
+
+    paths = []
+    for client, server in pairings:
+        for intf, ((cli_link, cli_sw), (srv_link, srv_sw)) in enumerate(zip(intf_links(client), intf_links(server))):
+            if cli_sw not in adjacency or srv_sw not in adjacency:
+                continue
+            hops = switch_path(cli_sw, srv_sw)
+            if hops is not None:
+                paths.append(Path(client, server, intf, tuple([cli_link] + hops + [srv_link])))
+    return tuple(paths)
+
+
+def path_bottleneck(links, path):
+    """ Index of the slowest link on the path, the first one in sending direction if there are multiple. """
+    return min(path.links, key=lambda i: links[i].bandwidth)
+
+
+def path_delay(links, path):
+    """ One-way propagation delay [ms] of a path as emulated, i.e. the sum of the link latencies. """
+    return sum(emulated_latency(links[i].latency) for i in path.links)
+
+
+def path_serialization(links, path):
+    """ Serialization delay [ms per byte] of a path, a packet is transmitted once on every link. """
+    return sum(8.0 / (links[i].bandwidth * 1000) for i in path.links)
+
+
+def path_rtt(links, path):
+    """ Base RTT [ms] of a path as emulated, i.e. twice the sum of the link latencies. """
+    return 2 * path_delay(links, path)
+
+
+def size_queues(links, paths, buffer_sizing):
+    """
+    Size the queues of all links. Bottleneck links are sized from the BDP of the paths they limit, where the longest
+    base RTT of all paths crossing the bottleneck is used to allow each of them to fully utilize the link. Links which
+    are no bottleneck keep a small buffer derived from their own latency. A `max_queue_size` set on the link wins.
+
+    Buffer sizing policies:
+        bdp:        multiplier * BDP + added_pkts
+        bdp_sqrt_n: multiplier * BDP / sqrt(n) + added_pkts, with n paths sharing the bottleneck
+        fixed:      `packets` packets for every bottleneck
+        link:       legacy sizing, every link is treated like a bottleneck of a path with twice its own latency as RTT
+
+    :param links:           compiled links
+    :param paths:           paths as computed by `find_paths`
+    :param buffer_sizing:   dict with 'policy' and optional parameters 'multiplier', 'added_pkts', 'mtu', 'packets'
+    :return:                tuple with the queue size [pkts] per link
+    """
+    params = dict(buffer_sizing)
+    policy = params.pop('policy', 'bdp')
+    if policy not in BUFFER_POLICIES:
+        raise ValueError('Unknown buffer sizing policy "{}", use one of {}.'.format(policy, BUFFER_POLICIES))
+    packets = params.pop('packets', None)
+    if policy == 'fixed' and packets is None:
+        raise ValueError('Buffer sizing policy "fixed" requires the number of "packets".')
+
+    # Note: non-bottleneck links get a small fixed size buffer (~20 pkts) which is enough to saturate the bottlenecks
+    #       as long as the links have a large enough rate compared to the bottleneck.
+    queue_sizes = [calculate_queue_size(rtt=2 * emulated_latency(link.latency), rate=link.bandwidth, **params)
+                   for link in links]
+
+    if policy != 'link':
+        bottleneck_rtts, sharing = {}, {}
+        for path in paths:
+            bottleneck = path_bottleneck(links, path)
+            bottleneck_rtts[bottleneck] = max(bottleneck_rtts.get(bottleneck, 0), path_rtt(links, path))
+            for i in path.links:
+                sharing[i] = sharing.get(i, 0) + 1
+
+        for i, rtt in bottleneck_rtts.items():
+            if policy == 'fixed':
+                queue_sizes[i] = int(packets)
+                continue
+            link_params = dict(params)
+            if policy == 'bdp_sqrt_n':
+                link_params['multiplier'] = params.get('multiplier', 1.5) / math.sqrt(sharing[i])
+            queue_sizes[i] = calculate_queue_size(rtt=rtt, rate=links[i].bandwidth, **link_params)
+
+    return tuple(int(link.max_queue_size) if link.max_queue_size is not None else q
+                 for link, q in zip(links, queue_sizes))
+
+
+def compile_link_events(events, links, group_index):
+    """
+    Validate the link events of a JSON config and resolve which links they change. An event selects links either with
+    "link": [source, target] or all links of a group with "latency_group"/"bandwidth_group": name, and changes any of
+    "bandwidth" [Mbps], "latency" [ms], "loss" [%] or "status" ("up"/"down"). E.g.
+        {"time": 20.0, "link": ["s1", "s2"], "bandwidth": 5, "loss": 1.0}
+
+    :param events:      list of events as given in the JSON config
+    :param links:       compiled links
+    :param group_index: group index of the compiled links
+    :return:            tuple of LinkEvent sorted by time
+    """
+    compiled = []
+    for event in events:
+        if event.get('time', -1) < 0:
+            raise ValueError('Link event requires a "time" >= 0 [s]. {}'.format(event))
+
+        if 'link' in event:
+            ends = set(str(n) for n in event['link'])
+            ids = tuple(i for i, link in enumerate(links) if set((link.source, link.target)) == ends)
+        else:
+            field = next((f for f in GROUP_FIELDS if f in event), None)
+            ids = group_index[field].get(event[field], ()) if field else ()
+        if not ids:
+            raise ValueError('Link event does not select any link. {}'.format(event))
+
+        changes = dict((key, event[key]) for key in EVENT_CHANGES if key in event)
+        if not changes:
+            raise ValueError('Link event does not change anything, use any of {}. {}'.format(EVENT_CHANGES, event))
+        if changes.get('bandwidth', 1) <= 0 or changes.get('latency', 0) < 0 or \
+                not 0 <= changes.get('loss', 0) <= 100 or changes.get('status', 'up') not in ('up', 'down'):
+            raise ValueError('Link event with invalid values. {}'.format(event))
+        compiled.append(LinkEvent(float(event['time']), ids, changes))
+    return tuple(sorted(compiled, key=lambda e: e.time))
+
+
+def compile_background(flows, hosts, switches, links):
+    """
+    Validate the background traffic of a JSON config. Every flow names its "type" (see BACKGROUND_KINDS), "source" and
+    "target" host, optionally the "interface" index of the path (default 0), "start" and "stop" [s] and the parameters
+    of its type. E.g.
+        {"type": "udp", "source": "h3", "target": "h4", "rate": 2.5, "start": 10.0}
+        {"type": "poisson", "source": "h3", "target": "h4", "arrival_rate": 20, "mean_size": 50000, "shape": 1.5}
+        {"type": "bulk", "source": "h4", "target": "h3", "flows": 2, "cc": "reno", "stop": 30.0}
+
+    :param flows:       list of flows as given in the JSON config
+    :param hosts:       host names
+    :param switches:    switch names
+    :param links:       compiled links
+    :return:            tuple of BackgroundFlow
+    """
+    compiled = []
+    for flow in flows:
+        kind = flow.get('type')
+        if kind not in BACKGROUND_KINDS:
+            raise ValueError('Unknown background flow type, use one of {}. {}'.format(sorted(BACKGROUND_KINDS), flow))
+        source, target = str(flow.get('source')), str(flow.get('target'))
+        if source not in hosts or target not in hosts or source == target:
+            raise ValueError('Background flow requires two different existing hosts as source and target. {}'.format(
+                flow))
+
+        unknown = set(flow) - set(BACKGROUND_KINDS[kind]) - {'type', 'source', 'target', 'interface', 'start', 'stop'}
+        if unknown:
+            raise ValueError('Unknown parameters {} of {} background flow. {}'.format(sorted(unknown), kind, flow))
+        params = dict((key, flow.get(key, default)) for key, default in BACKGROUND_KINDS[kind].items())
+        missing = [key for key, value in params.items() if value is None]
+        if missing:
+            raise ValueError('Background flow misses the parameters {}. {}'.format(sorted(missing), flow))
+        if any(value <= 0 for key, value in params.items() if key != 'cc') or \
+                (kind == 'poisson' and params['shape'] <= 1):
+            raise ValueError('Background flow with invalid values, the Pareto shape has to exceed 1 for a finite mean '
+                             'size. {}'.format(flow))
+
+        start, stop = float(flow.get('start', 0.0)), flow.get('stop')
+        if start < 0 or (stop is not None and stop <= start):
+            raise ValueError('Background flow requires 0 <= "start" < "stop" [s]. {}'.format(flow))
+        interface = int(flow.get('interface', 0))
+        if not any(path.interface == interface for path in find_paths(switches, links, [(source, target)])):
+            raise ValueError('No path from {} to {} over interface {}. {}'.format(source, target, interface, flow))
+        compiled.append(BackgroundFlow(kind, source, target, interface, start,
+                                       float(stop) if stop is not None else None, params))
+    return tuple(compiled)
+
+
+def node_type_of(node):
+    """ 'host' or 'switch', given by the node property "type" or else by the first letter of the node id. """
+    node_type = node.get('properties', {}).get('type')
+    if node_type is None:
+        node_type = {'h': 'host', 's': 'switch'}.get(str(node['id'])[:1])
+    return node_type
+
+
+class AddressPlan(object):
+    """
+    IP and MAC addressing of host interfaces, every interface index forms its own subnet with its own routing table.
+        narrow: 10.0.x.y/24 where y denotes the host id and x the interface id, e.g. h1-eth0 has 10.0.0.1 and h2-eth1
+                has 10.0.1.2. Up to 254 hosts with 256 interfaces, used for all topologies fitting it.
+        wide:   10.x.y.z/16 where x denotes the interface id and y.z the host id, e.g. h300-eth2 has 10.2.1.44. Up to
+                65534 hosts with 256 interfaces.
+    """
+    MAX_HOSTS = {'narrow': 254, 'wide': 65534}
+    MAX_INTERFACES = 256
+
+    def __init__(self, kind='narrow'):
+        if kind not in self.MAX_HOSTS:
+            raise ValueError('Unknown address plan "{}", use one of {}.'.format(kind, sorted(self.MAX_HOSTS)))
+        self.kind = kind
+        self.prefix_len = 24 if kind == 'narrow' else 16
+
+    @classmethod
+    def for_network(cls, max_host_id, n_interfaces, kind=None):
+        """
+        Address plan able to address the given number of hosts and interfaces.
+
+        :param max_host_id:     largest host id to address
+        :param n_interfaces:    largest number of interfaces of any host
+        :param kind:            force 'narrow' or 'wide', default picks narrow if possible
+        :return:                AddressPlan
+        """
+        if kind is None:
+            kind = 'narrow' if max_host_id <= cls.MAX_HOSTS['narrow'] else 'wide'
+        if not 0 < max_host_id <= cls.MAX_HOSTS[kind] or n_interfaces > cls.MAX_INTERFACES:
+            raise ValueError('Address plan "{}" cannot address host id {} with {} interfaces.'.format(
+                kind, max_host_id, n_interfaces))
+        return cls(kind)
+
+    def ip(self, intf, host_id):
+        if self.kind == 'narrow':
+            return '10.0.{}.{}'.format(intf, host_id)
+        return '10.{}.{}.{}'.format(intf, host_id >> 8, host_id & 0xff)
+
+    def gateway(self, intf):
+        return self.ip(intf, 0)
+
+    def mac(self, intf, host_id):
+        return '00:00:00:{:02x}:{:02x}:{:02x}'.format(intf, host_id >> 8, host_id & 0xff) \
+            if self.kind == 'wide' else '00:00:00:00:{:02x}:{:02x}'.format(intf, host_id)
+
+    def table(self, intf):
+        """ Routing table of an interface, wide plans avoid the reserved tables 253-255. """
+        return intf + 1 if self.kind == 'narrow' else intf + 1000
+
+
+class TopoConfig(object):
+    """
+    Validated and immutable representation of a JSON topology definition.
+
+    The JSON config is checked once when compiling it, derived configs (other congestion controls, bandwidth/latency/
+    queue sizes per link group) are cheap clones sharing all unchanged data and are not validated again. Links are
+    indexed by their latency and bandwidth groups, changing a group only touches the links belonging to it.
+    """
+    __slots__ = ('topology_id', 'hosts', 'switches', 'stp_switches', 'links', 'queue_sizes', 'clients', 'pairings',
+                 'ccs', 'group_index', 'paths', 'buffer_sizing', 'host_ids', 'address_plan', 'link_events', 'mptcp',
+                 'background', '_raw')
+
+    def __init__(self, config):
+        """
+        :param config:  JSON/dict config as read from the topologies folder, it is copied and not changed
+        """
+        raw = copy.deepcopy(config)
+        hosts, switches, stp_switches = [], [], []
+        for node in raw['nodes']:
+            node_id, node_type = str(node['id']), node_type_of(node)
+            if node_type == 'host':
+                hosts.append(node_id)
+            elif node_type == 'switch':
+                switches.append(node_id)
+                if node.get('properties', {}).get('stp'):
+                    stp_switches.append(node_id)
+            else:
+                raise ValueError('Unknown node type encountered! {}'.format(node_id))
+        nodes = set(hosts + switches)
+        if len(nodes) != len(raw['nodes']):
+            raise ValueError('Node ids have to be unique.')
+
+        links, zero_warning_given = [], False
+        for link in raw['links']:
+            src, dst, props = str(link['source']), str(link['target']), link['properties']
+            if src not in nodes or dst not in nodes:
+                raise ValueError('Link src or destination does not exist! \t{}<->{}'.format(src, dst))
+            if props['latency'] < 0:
+                raise ValueError('Link has latency smaller than 0! \t{}<->{}'.format(src, dst))
+            elif props['latency'] == 0 and not zero_warning_given:
+                zero_warning_given = True
+                warn('Attention, working with "{}ms" delay in topologies where there are links with some delay can '
+                     'yield unexpected results! As a precaution "0ms" is changed to "0.1ms"\n'.format(props['latency']))
+            if props['bandwidth'] <= 0:
+                raise ValueError('Link has bandwidth smaller or equal to 0! \t{}<->{}'.format(src, dst))
+            links.append(Link(src, dst, props['latency'], props['bandwidth'], props.get('latency_group'),
+                              props.get('bandwidth_group'), props.get('max_queue_size')))
+
+        group_index = {}
+        for field in GROUP_FIELDS:
+            index = {}
+            for i, link in enumerate(links):
+                group = getattr(link, field)
+                if group is not None:
+                    index.setdefault(group, []).append(i)
+            group_index[field] = {group: tuple(ids) for group, ids in index.items()}
+
+        set_ = super(TopoConfig, self).__setattr__
+        set_('topology_id', str(raw['topology_id']))
+        set_('hosts', tuple(hosts))
+        set_('switches', tuple(switches))
+        set_('stp_switches', frozenset(stp_switches))
+        set_('links', tuple(links))
+        set_('group_index', group_index)
+        set_('_raw', raw)
+        self._set_host_pairings()
+        self._set_addressing()
+        set_('paths', find_paths(self.switches, self.links, self.pairings))
+        set_('buffer_sizing', dict(raw.get('buffer_sizing', {'policy': 'bdp'})))
+        set_('queue_sizes', size_queues(self.links, self.paths, self.buffer_sizing))
+        set_('link_events', compile_link_events(raw.get('link_events', []), self.links, self.group_index))
+        set_('mptcp', check_mptcp_settings(raw.get('mptcp', {})))
+        set_('background', compile_background(raw.get('background', []), self.hosts, self.switches, self.links))
+        for field in GROUP_FIELDS:
+            self.group_values(field.partition('_')[0])
+
+    def __setattr__(self, key, value):
+        raise AttributeError('TopoConfig is immutable, derive changed configs with the with_* methods.')
+
+    @classmethod
+    def from_file(cls, topo_name):
+        """
+        Read and compile topology `topologies/<topo_name>.json`, every topology is only compiled once per process.
+
+        :param topo_name:   name of topology
+        :return:            TopoConfig
+        """
+        file_name = Topologies_file.format(topo_name)
+        key = os.path.abspath(file_name)
+        if key not in _compiled_topologies:
+            if not os.path.isfile(file_name):
+                raise IOError('JSON topology file not found! {}'.format(file_name))
+            with open(file_name, 'r') as f:
+                _compiled_topologies[key] = cls(json.load(f))
+        return _compiled_topologies[key]
+
+    def _set_host_pairings(self):
+        """
+        Read pairings from JSON config, which clients talks to which server with what congestion control algorithm.
+        Note: Assumption is that only senders set a congestion control scheme
+        """
+        set_ = super(TopoConfig, self).__setattr__
+        clients, pairs, ccs = [], [], []
+        for node in (n for n in self._raw['nodes'] if node_type_of(n) == 'host'):
+            if 'server' in node['properties']:
+                if 'cc' not in node['properties']:
+                    raise ValueError('Client {} does not specify a congestion control.'.format(node['id']))
+                if str(node['properties']['server']) not in self.hosts:
+                    raise ValueError('Server of client {} does not exist.'.format(node['id']))
+                clients.append(str(node['id']))
+                pairs.append((str(node['id']), str(node['properties']['server'])))
+                ccs.append(str(node['properties']['cc']))
+
+        # make sure every host is included in some connection and all mininet hosts are utilized, hosts may also only
+        # send or receive background traffic
+        paired = set(itertools.chain.from_iterable(pairs))
+        paired.update(str(flow.get(end)) for flow in self._raw.get('background', []) for end in ('source', 'target'))
+        if not all(h in paired for h in self.hosts):
+            raise ValueError('Host {} not contained in any host pairings or background flows!'.format(
+                [h for h in self.hosts if h not in paired]))
+
+        set_('clients', tuple(clients))
+        set_('pairings', tuple(sorted(pairs)))
+        set_('ccs', dict(zip(clients, ccs)))
+
+    def _set_addressing(self):
+        """
+        Assign every host its numeric id used for addressing, given by the host property "host_id" or the number in
+        the host name (h<N>), and choose the address plan fitting the topology.
+        """
+        set_ = super(TopoConfig, self).__setattr__
+        host_ids = {}
+        for node in (n for n in self._raw['nodes'] if node_type_of(n) == 'host'):
+            digits = ''.join(c for c in str(node['id']) if c.isdigit())
+            host_id = node['properties'].get('host_id', int(digits) if digits else None)
+            if host_id is None:
+                raise ValueError('Host {} neither has a "host_id" nor a number in its name.'.format(node['id']))
+            host_ids[str(node['id'])] = int(host_id)
+        if len(set(host_ids.values())) != len(host_ids):
+            raise ValueError('Host ids have to be unique.')
+
+        n_interfaces = max([len(self.host_links(h)) for h in self.hosts] + [1])
+        set_('host_ids', host_ids)
+        set_('address_plan', AddressPlan.for_network(max(host_ids.values() or [1]), n_interfaces,
+                                                     self._raw.get('addressing')))
+
+    def _derive(self, **changes):
+        """ Shallow clone with some attributes replaced, skips validation. """
+        clone = object.__new__(type(self))
+        for slot in self.__slots__:
+            object.__setattr__(clone, slot, changes.get(slot, getattr(self, slot)))
+        return clone
+
+    def with_ccs(self, ccs):
+        """
+        Derive config where the clients use the given congestion controls.
+
+        :param ccs:     single congestion control name used by all clients or list with one name per client (in order
+                        of the JSON nodes)
+        :return:        TopoConfig
+        """
+        if not isinstance(ccs, (list, tuple)):
+            ccs = [ccs] * len(self.clients)
+        if len(ccs) != len(self.clients):
+            raise ValueError('Expected {} congestion controls, got {}.'.format(len(self.clients), ccs))
+        return self._derive(ccs=dict(zip(self.clients, (str(cc) for cc in ccs))))
+
+    def with_group_values(self, group_field, values):
+        """
+        Derive config where the links of some groups are changed.
+
+        :param group_field: 'latency_group' / 'bandwidth_group'
+        :param values:      dict mapping group name to either a value for the group field (e.g. {'a': 10.0}) or a dict
+                            of link properties {'bandwidth': 10, 'latency': 5.0, 'max_queue_size': 100}
+        :return:            TopoConfig
+        """
+        if group_field not in GROUP_FIELDS:
+            raise NotImplementedError(
+                'Only latency and bandwidth groups currently supported, "{}" not recognized.'.format(group_field))
+
+        links = list(self.links)
+        for group, value in values.items():
+            if group not in self.group_index[group_field]:
+                raise ValueError('No link belongs to {} "{}".'.format(group_field, group))
+            if not isinstance(value, dict):
+                value = {group_field.partition('_')[0]: value}
+            unknown = set(value) - set(LINK_VALUES)
+            if unknown:
+                raise ValueError('Cannot override link properties {}.'.format(sorted(unknown)))
+
+            for i in self.group_index[group_field][group]:
+                links[i] = links[i]._replace(**value)
+            info('Changing {} {} to {}\n'.format(group_field, group, value))
+        # latencies and rates change the BDP of all paths crossing the group, queues are sized again
+        return self._derive(links=tuple(links), queue_sizes=size_queues(links, self.paths, self.buffer_sizing))
+
+    def with_buffer_sizing(self, policy, **params):
+        """
+        Derive config with another buffer sizing policy, see `size_queues` for the policies and parameters.
+
+        :param policy:  'bdp' / 'bdp_sqrt_n' / 'fixed' / 'link'
+        :param params:  policy parameters, e.g. multiplier=2
+        :return:        TopoConfig
+        """
+        buffer_sizing = dict(params, policy=policy)
+        return self._derive(buffer_sizing=buffer_sizing,
+                            queue_sizes=size_queues(self.links, self.paths, buffer_sizing))
+
+    def with_mptcp(self, **settings):
+        """
+        Derive config with other MPTCP settings, settings set to None keep the value of the system.
+
+        :param settings:    any of MPTCP_SETTINGS, e.g. scheduler='redundant', path_manager='ndiffports', subflows=4
+        :return:            TopoConfig
+        """
+        return self._derive(mptcp=check_mptcp_settings(dict(self.mptcp, **settings)))
+
+    def groups(self, group_field):
+        """ Sorted unique group names for 'latency_group' / 'bandwidth_group'. """
+        return sorted(self.group_index[group_field])
+
+    def group_values(self, field):
+        """
+        Unique (group, value) tuples of all links belonging to a group.
+
+        :param field:   'latency' / 'bandwidth'
+        :return:        sorted list of tuples (group_name, value)
+        """
+        group_field = field + '_group'
+        group_set = set((group, getattr(self.links[ids[0]], field))
+                        for group, ids in self.group_index[group_field].items())
+        if any(getattr(self.links[i], field) != value for group, value in group_set
+               for i in self.group_index[group_field][group]):
+            raise RuntimeError(
+                'Groups with multiple values encountered, only one value allowed per group. {}'.format(group_set))
+        if len(group_set) > 2:
+            raise NotImplementedError(
+                'Not yet supporting more than two latency/bandwidth groups for links. {}'.format(group_set))
+        return sorted(group_set)
+
+    def host_links(self, host):
+        """ Links of a host in the order Mininet assigns interfaces, i.e. the i-th link is connected to eth<i>. """
+        return [link for link in self.links if host in (link.source, link.target)]
+
+    def path_summary(self):
+        """
+        Describe every client to server path with its bottleneck and base RTT.
+
+        :return:    list of dicts, one per path
+        """
+        summary = []
+        for path in self.paths:
+            bottleneck = path_bottleneck(self.links, path)
+            link = self.links[bottleneck]
+            summary.append({'client': path.client, 'server': path.server, 'interface': path.interface,
+                            'hops': [(self.links[i].source, self.links[i].target) for i in path.links],
+                            'bottleneck': (link.source, link.target), 'bandwidth': link.bandwidth,
+                            'rtt': round(path_rtt(self.links, path), 3), 'queue_size': self.queue_sizes[bottleneck]})
+        return summary
+
+    def to_json(self):
+        """ JSON/dict config equivalent to this compiled config. """
+        config = copy.deepcopy(self._raw)
+        for node in config['nodes']:
+            if str(node['id']) in self.ccs:
+                node['properties']['cc'] = self.ccs[str(node['id'])]
+        for json_link, link in zip(config['links'], self.links):
+            props = json_link['properties']
+            props['latency'], props['bandwidth'] = link.latency, link.bandwidth
+            if link.max_queue_size is not None:
+                props['max_queue_size'] = link.max_queue_size
+        config['buffer_sizing'] = dict(self.buffer_sizing)
+        if self.mptcp:
+            config['mptcp'] = dict(self.mptcp)
+        return config
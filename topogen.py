@@ -0,0 +1,220 @@
+"""
+Parametric topology generators producing JSON configs in the format of the hand written topologies, i.e. configs which
+can be stored in the topologies folder or compiled directly into a TopoConfig.
+
+Example:
+    python topogen.py dumbbell --pairs 100 --planes 2 -o topologies/dumbbell_100.json
+"""
+import json
+import os
+import random
+from argparse import ArgumentParser
+
+from topo_config import TopoConfig
+
+
+def new_config(topology_id, label):
+    """ Empty NetJSON network graph, the same header as the topology files. """
+    return {
+        'type': 'NetworkGraph',
+        'protocol': 'static',
+        'version': '1.0.0',
+        'revision': '',
+        'metric': None,
+        'router_id': '10.0.0.0',
+        'topology_id': topology_id,
+        'label': label,
+        'nodes': [],
+        'links': [],
+    }
+
+
+def add_host(config, host_id, server=None, cc='lia'):
+    """
+    Add host h<host_id> to config, a host with a server is a client running the given congestion control.
+
+    :return:    name of host
+    """
+    properties = {'server': 'h{}'.format(server), 'cc': cc} if server is not None else {}
+    config['nodes'].append({'id': 'h{}'.format(host_id), 'local_addresses': [], 'properties': properties})
+    return 'h{}'.format(host_id)
+
+
+def add_switch(config, stp=False):
+    """ Add next switch s<N> to config, switches in topologies with loops need the spanning tree protocol. """
+    name = 's{}'.format(1 + sum(1 for n in config['nodes'] if n['id'].startswith('s')))
+    config['nodes'].append({'id': name, 'properties': {'stp': True}} if stp else {'id': name})
+    return name
+
+
+def add_link(config, source, target, bandwidth, latency, group=None):
+    """
+    Add link to config, links belonging to a group get the same latency and bandwidth group and are changed together
+    during sweeps.
+    """
+    properties = {'latency': latency, 'latency_text': 'ms', 'bandwidth': bandwidth, 'bandwidth_text': 'Mbps'}
+    if group is not None:
+        properties['latency_group'] = properties['bandwidth_group'] = group
+    config['links'].append({'source': source, 'target': target, 'cost': 1.0, 'properties': properties})
+
+
+def set_local_addresses(config):
+    """ Fill in the local addresses of all hosts according to the address plan the topology compiles to. """
+    compiled = TopoConfig(config)
+    plan = compiled.address_plan
+    for node in config['nodes']:
+        if node['id'] in compiled.host_ids:
+            host_id = compiled.host_ids[node['id']]
+            node['local_addresses'] = [plan.ip(i, host_id) for i in range(len(compiled.host_links(node['id'])))]
+    return config
+
+
+def parallel_paths(n_paths, bandwidth=10, latency=10.0, groups=('a',), cc='lia', access_bandwidth=100,
+                   access_latency=0.1):
+    """
+    Single MPTCP host pair connected by n disjoint paths.
+      /--- s1 --- s2 ---\
+    h1       ...         h2
+      \--- s.. -- s.. --/
+
+    :param n_paths:     number of paths, i.e. subflows of the MPTCP connection
+    :param bandwidth:   bottleneck bandwidth of each path [Mbps]
+    :param latency:     bottleneck latency of each path [ms]
+    :param groups:      link groups assigned to the bottlenecks round robin, at most two
+    :return:            JSON config
+    """
+    config = new_config('parallel_{}'.format(n_paths), 'MPTCP host pair with {} disjoint paths'.format(n_paths))
+    client, server = add_host(config, 1, server=2, cc=cc), add_host(config, 2)
+    for i in range(n_paths):
+        s_cli, s_srv = add_switch(config), add_switch(config)
+        add_link(config, client, s_cli, access_bandwidth, access_latency)
+        add_link(config, s_cli, s_srv, bandwidth, latency, group=groups[i % len(groups)])
+        add_link(config, s_srv, server, access_bandwidth, access_latency)
+    return set_local_addresses(config)
+
+
+def dumbbell(k_pairs, n_planes=1, bandwidth=10, latency=10.0, groups=('a', 'b'), cc='lia', access_bandwidth=100,
+             access_latency=0.1):
+    """
+    K host pairs competing for the bottleneck of a dumbbell. With multiple planes every host is connected to one
+    dumbbell per plane, i.e. every pair runs an MPTCP connection with one subflow per plane.
+    h1                  h2
+       \              /
+    ..  s1 ------- s2  ..
+       /              \
+    h2k-1              h2k
+
+    :param k_pairs:     number of client server pairs
+    :param n_planes:    number of parallel dumbbells, i.e. interfaces per host
+    :param groups:      link groups assigned to the bottlenecks of the planes round robin, at most two
+    :return:            JSON config
+    """
+    config = new_config('dumbbell_{}x{}'.format(k_pairs, n_planes),
+                        'Dumbbell with {} competing pairs over {} planes'.format(k_pairs, n_planes))
+    clients = [add_host(config, 2 * i + 1, server=2 * i + 2, cc=cc) for i in range(k_pairs)]
+    servers = [add_host(config, 2 * i + 2) for i in range(k_pairs)]
+    for plane in range(n_planes):
+        s_cli, s_srv = add_switch(config), add_switch(config)
+        add_link(config, s_cli, s_srv, bandwidth, latency, group=groups[plane % len(groups)])
+        for client, server in zip(clients, servers):
+            add_link(config, client, s_cli, access_bandwidth, access_latency)
+            add_link(config, s_srv, server, access_bandwidth, access_latency)
+    return set_local_addresses(config)
+
+
+def fat_tree(k, bandwidth=10, latency=1.0, cc='lia', core_group='a'):
+    """
+    k-ary fat-tree with k pods of k/2 aggregation and k/2 edge switches, (k/2)^2 core switches and k^3/4 hosts. Every
+    host talks to the host in the same position of the opposite half of the tree. The tree contains loops, all
+    switches therefore run the spanning tree protocol, which also means only one of the equal cost paths is used.
+
+    :param k:           number of ports per switch, even
+    :param core_group:  link group of the aggregation to core links
+    :return:            JSON config
+    """
+    if k < 2 or k % 2:
+        raise ValueError('Fat-tree requires an even number of ports per switch, got {}.'.format(k))
+    half = k // 2
+    n_hosts = k ** 3 // 4
+
+    config = new_config('fat_tree_{}'.format(k), '{}-ary fat-tree with {} hosts'.format(k, n_hosts))
+    for i in range(n_hosts):
+        peer = (i + n_hosts // 2) % n_hosts
+        add_host(config, i + 1, server=peer + 1 if i < n_hosts // 2 else None, cc=cc)
+
+    cores = [add_switch(config, stp=True) for _ in range(half * half)]
+    host = 0
+    for _ in range(k):
+        aggs = [add_switch(config, stp=True) for _ in range(half)]
+        edges = [add_switch(config, stp=True) for _ in range(half)]
+        for a, agg in enumerate(aggs):
+            for c in range(half):
+                add_link(config, agg, cores[a * half + c], bandwidth, latency, group=core_group)
+            for edge in edges:
+                add_link(config, edge, agg, bandwidth, latency)
+        for edge in edges:
+            for _ in range(half):
+                host += 1
+                add_link(config, 'h{}'.format(host), edge, bandwidth, latency)
+    return set_local_addresses(config)
+
+
+def random_multihomed(n_pairs, n_planes=2, switches_per_plane=4, bandwidths=(5, 10, 20), latencies=(1.0, 10.0, 50.0),
+                      seed=0, cc='lia', access_bandwidth=100, access_latency=0.1):
+    """
+    Random multi-homed hosts. Each plane is a random tree of switches with random link bandwidths and latencies, every
+    host is attached to a random switch of every plane, i.e. every pair has one disjoint path per plane.
+
+    :param n_pairs:             number of client server pairs
+    :param n_planes:            number of planes, i.e. interfaces per host
+    :param switches_per_plane:  number of switches forming the tree of a plane
+    :param bandwidths:          choices for the bandwidth of switch links [Mbps]
+    :param latencies:           choices for the latency of switch links [ms]
+    :param seed:                seed of the random generator, the same seed yields the same topology
+    :return:                    JSON config
+    """
+    rand = random.Random(seed)
+    config = new_config('random_{}x{}_{}'.format(n_pairs, n_planes, seed),
+                        'Random multi-homed topology with {} pairs over {} planes'.format(n_pairs, n_planes))
+    hosts = []
+    for i in range(n_pairs):
+        hosts.append(add_host(config, 2 * i + 1, server=2 * i + 2, cc=cc))
+        hosts.append(add_host(config, 2 * i + 2))
+
+    for _ in range(n_planes):
+        plane = [add_switch(config) for _ in range(switches_per_plane)]
+        for j in range(1, switches_per_plane):
+            add_link(config, plane[rand.randrange(j)], plane[j], rand.choice(bandwidths), rand.choice(latencies))
+        for host in hosts:
+            add_link(config, host, rand.choice(plane), access_bandwidth, access_latency)
+    return set_local_addresses(config)
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description="Generate JSON topologies")
+    parser.add_argument('kind', choices=['parallel_paths', 'dumbbell', 'fat_tree', 'random_multihomed'])
+    parser.add_argument('--paths', type=int, default=2, help="Number of paths (parallel_paths)")
+    parser.add_argument('--pairs', type=int, default=2, help="Number of host pairs (dumbbell, random_multihomed)")
+    parser.add_argument('--planes', type=int, default=1, help="Interfaces per host (dumbbell, random_multihomed)")
+    parser.add_argument('--k', type=int, default=4, help="Ports per switch (fat_tree)")
+    parser.add_argument('--seed', type=int, default=0, help="Random seed (random_multihomed)")
+    parser.add_argument('--bw', type=float, default=10, help="Bottleneck bandwidth [Mbps]")
+    parser.add_argument('--delay', type=float, default=10.0, help="Bottleneck latency [ms]")
+    parser.add_argument('--cc', default='lia', help="Congestion control of the clients")
+    parser.add_argument('--outfile', '-o', help="Output file, the topology id is taken from its name", required=True)
+    args = parser.parse_args()
+
+    if args.kind == 'parallel_paths':
+        topo = parallel_paths(args.paths, bandwidth=args.bw, latency=args.delay, cc=args.cc)
+    elif args.kind == 'dumbbell':
+        topo = dumbbell(args.pairs, n_planes=args.planes, bandwidth=args.bw, latency=args.delay, cc=args.cc)
+    elif args.kind == 'fat_tree':
+        topo = fat_tree(args.k, bandwidth=args.bw, latency=args.delay, cc=args.cc)
+    else:
+        topo = random_multihomed(args.pairs, n_planes=args.planes, seed=args.seed, cc=args.cc)
+
+    topo['topology_id'] = os.path.splitext(os.path.basename(args.outfile))[0]
+    with open(args.outfile, 'w') as f:
+        json.dump(topo, f, indent=2)
+    print('Topology {} written, address plan: {}'.format(topo['topology_id'],
+                                                         TopoConfig(topo).address_plan.kind))
@@ -11,6 +11,17 @@ from mininet.util import errFail
 
 MPTCP_CCS = ['lia', 'olia', 'balia', 'wvegas']
 
+# sysctls of the MPTCP settings of an experiment, see topo_config.MPTCP_SETTINGS
+MPTCP_SYSCTLS = {'scheduler': 'net.mptcp.mptcp_scheduler', 'path_manager': 'net.mptcp.mptcp_path_manager',
+                 'checksum': 'net.mptcp.mptcp_checksum'}
+# kernel modules of the schedulers and path managers, loaded before they are selected
+MPTCP_MODULES = {'roundrobin': 'mptcp_rr', 'redundant': 'mptcp_redundant', 'blest': 'mptcp_blest',
+                 'fullmesh': 'mptcp_fullmesh', 'ndiffports': 'mptcp_ndiffports', 'binder': 'mptcp_binder'}
+SUBFLOWS_PARAMETER = '/sys/module/{}/parameters/num_subflows'
+
+_available_ccs = None
+_system_mptcp = None
+
 
 def check_system():
     """
@@ -43,8 +54,47 @@ def system_call(cmd, ignore_codes=None):
 
 
 def get_system_available_congestioncontrol_algos():
-    out, err, ret = errFail(['sysctl', '-n', 'net.ipv4.tcp_available_congestion_control'])
-    return out.strip().split()
+    """ Congestion control algorithms allowed by sysctl, the system is only probed once per process. """
+    global _available_ccs
+    if _available_ccs is None:
+        out, err, ret = errFail(['sysctl', '-n', 'net.ipv4.tcp_available_congestion_control'])
+        _available_ccs = out.strip().split()
+    return list(_available_ccs)
+
+
+def get_system_mptcp_settings():
+    """
+    MPTCP settings of the system before any experiment changed them, the system is only probed once per process.
+    Experiments restore the settings they do not set themselves.
+
+    :return:    dict with scheduler, path manager and checksum, subflows per path manager module are added by
+                `get_system_subflows` once the module is loaded
+    """
+    global _system_mptcp
+    if _system_mptcp is None:
+        _system_mptcp = {key: errFail(['sysctl', '-n', var])[0].strip() for key, var in MPTCP_SYSCTLS.items()}
+        _system_mptcp['subflows'] = {}
+    return _system_mptcp
+
+
+def get_system_subflows(path_manager):
+    """ Subflows per path of a loaded path manager module before any experiment changed them. """
+    subflows = get_system_mptcp_settings()['subflows']
+    if path_manager not in subflows:
+        with open(SUBFLOWS_PARAMETER.format(MPTCP_MODULES[path_manager])) as f:
+            subflows[path_manager] = int(f.read())
+    return subflows[path_manager]
+
+
+def load_mptcp_module(name):
+    """ Load the kernel module of an MPTCP scheduler or path manager, built in ones need no module. """
+    if name not in MPTCP_MODULES:
+        return
+    try:
+        errFail(['modprobe', MPTCP_MODULES[name]])
+    except Exception as e:
+        raise RuntimeError('MPTCP {} is not available on this kernel, loading {} failed: {}'.format(
+            name, MPTCP_MODULES[name], e))
 
 
 def popen_wait(popen_task, timeout=-1):
@@ -0,0 +1,383 @@
+"""
+Distributed sweeps over a shared directory, e.g. an NFS mount all experiment hosts see. The coordinator expands the
+sweep into tasks, workers on any number of hosts claim them, run the experiment into a private log tree and hand back
+a bundle of the log files which the coordinator merges into its log tree.
+
+    <queue>/tasks/<id>.json                 pending tasks, the id orders them as the sweep plan and identifies the
+                                            experiment, a reused queue does not mistake other plans for done
+    <queue>/claimed/<worker>/<id>.json      tasks a worker is running, claimed by an atomic rename
+    <queue>/workers/<worker>.json           heartbeat of a worker, claims of silent workers are put back
+    <queue>/results/<id>.tar.gz             log files of a finished task, relative to the log tree
+    <queue>/done/<id>.json                  outcome of a finished task, written after its bundle
+    <queue>/merged/<id>.json                outcome once the coordinator merged the bundle
+    <queue>/finished                        written by the coordinator after the last merge, workers exit
+
+    sudo python workqueue.py coordinator -q /mnt/queue --sweep de
+    sudo python workqueue.py worker -q /mnt/queue                   # on every experiment host
+
+With --simulate workers use the stand-in Mininet of the benchmarks and write synthetic logs instead of running
+experiments, several of them test the protocol on a single machine without root:
+
+    python workqueue.py coordinator -q /tmp/queue --sweep tp --topo two_paths --simulate --base_folder /tmp/logs
+    python workqueue.py worker -q /tmp/queue --simulate 1 & python workqueue.py worker -q /tmp/queue --simulate 1
+"""
+import sys
+
+if __name__ == '__main__' and '--simulate' in sys.argv:
+    # must happen before the first import of a module using Mininet
+    from benchmarks import fake_mininet
+    fake_mininet.install()
+
+import hashlib
+import itertools
+import json
+import os
+import shutil
+import socket
+import tarfile
+import tempfile
+import threading
+import time
+import traceback
+from argparse import ArgumentParser
+
+from mininet.log import setLogLevel, info, output, warn
+
+import fct
+import main as runner
+import progress
+import sweep
+import supervisor
+from MPMininetExp import MPMininetExp
+from MPTopoligies import JsonTopo
+from topo_config import TopoConfig
+
+FOLDERS = ('tasks', 'claimed', 'workers', 'results', 'done', 'merged')
+
+
+def write_json(file_name, data):
+    """ Write JSON so that readers never see a partial file, other hosts may read at any time. """
+    tmp = '{}.{}.tmp'.format(file_name, os.getpid())
+    with open(tmp, 'w') as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+    os.rename(tmp, file_name)
+
+
+def read_json(file_name):
+    with open(file_name) as f:
+        return json.load(f)
+
+
+class TaskQueue(object):
+    """ Shared directory protocol, every state change is a single rename, which is atomic on one file system. """
+    def __init__(self, folder):
+        self.folder = folder
+        for name in FOLDERS:
+            if not os.path.exists(self.path(name)):
+                os.makedirs(self.path(name))
+
+    def path(self, *parts):
+        return os.path.join(self.folder, *parts)
+
+    def ids(self, name):
+        """ Task ids in a state folder, for 'claimed' over all workers. """
+        if name == 'claimed':
+            return sorted(os.path.splitext(f)[0] for w in os.listdir(self.path(name))
+                          for f in os.listdir(self.path(name, w)) if f.endswith('.json'))
+        return sorted(os.path.splitext(f)[0] for f in os.listdir(self.path(name)) if f.endswith('.json'))
+
+    @property
+    def finished(self):
+        return os.path.isfile(self.path('finished'))
+
+    def submit(self, tasks):
+        """ Add tasks, tasks already known to the queue in any state are kept as they are. """
+        if self.finished:
+            os.remove(self.path('finished'))
+        known = set(itertools.chain.from_iterable(self.ids(name) for name in ('tasks', 'claimed', 'done', 'merged')))
+        for task in tasks:
+            if task['id'] not in known:
+                write_json(self.path('tasks', task['id'] + '.json'), task)
+
+    def claim(self, worker):
+        """ Claim the first pending task, None if there is none. """
+        folder = self.path('claimed', worker)
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+        for task_id in self.ids('tasks'):
+            claimed = os.path.join(folder, task_id + '.json')
+            try:
+                os.rename(self.path('tasks', task_id + '.json'), claimed)
+            except OSError:
+                continue  # another worker was faster
+            return read_json(claimed)
+        return None
+
+    def complete(self, worker, task, log_folder, outcome):
+        """ Hand back the log files of a task and its outcome. """
+        bundle = self.path('results', task['id'] + '.tar.gz')
+        with tarfile.open(bundle + '.tmp', 'w:gz') as tar:
+            for name in sorted(os.listdir(log_folder)):
+                tar.add(os.path.join(log_folder, name), arcname=name)
+        os.rename(bundle + '.tmp', bundle)
+        write_json(self.path('done', task['id'] + '.json'), dict(outcome, task=task))
+        os.remove(self.path('claimed', worker, task['id'] + '.json'))
+
+    def heartbeat(self, worker, **state):
+        write_json(self.path('workers', worker + '.json'), dict(state, time=time.time()))
+
+    def workers(self, timeout):
+        """ Names of the workers with a heartbeat within the timeout. """
+        now = time.time()
+        return [os.path.splitext(f)[0] for f in os.listdir(self.path('workers')) if f.endswith('.json') and
+                now - os.path.getmtime(self.path('workers', f)) <= timeout]
+
+    def requeue_stale(self, timeout):
+        """ Put back the tasks of workers without a heartbeat within the timeout, return the requeued ids. """
+        alive, requeued = set(self.workers(timeout)), []
+        for worker in os.listdir(self.path('claimed')):
+            if worker in alive:
+                continue
+            for name in os.listdir(self.path('claimed', worker)):
+                if not name.endswith('.json'):
+                    continue
+                claimed = self.path('claimed', worker, name)
+                task = read_json(claimed)
+                task['attempts'] = task.get('attempts', 0) + 1
+                write_json(claimed, task)
+                os.rename(claimed, self.path('tasks', name))
+                requeued.append(task['id'])
+                warn('Worker {} stopped responding, task {} is put back.\n'.format(worker, task['id']))
+        return requeued
+
+    def collect(self, base_folder):
+        """ Merge the bundles of finished tasks into the log tree, return their outcomes. """
+        outcomes = []
+        for task_id in self.ids('done'):
+            outcome = read_json(self.path('done', task_id + '.json'))
+            bundle = self.path('results', task_id + '.tar.gz')
+            with tarfile.open(bundle) as tar:
+                members = tar.getmembers()
+                unsafe = [m.name for m in members if os.path.isabs(m.name) or '..' in m.name.split('/')]
+                if unsafe:
+                    raise RuntimeError('Bundle {} contains paths outside the log tree: {}'.format(bundle, unsafe))
+                tar.extractall(base_folder, members)
+            write_json(self.path('merged', task_id + '.json'), outcome)
+            os.remove(self.path('done', task_id + '.json'))
+            os.remove(bundle)
+            outcomes.append(outcome)
+        return outcomes
+
+    def finish(self):
+        write_json(self.path('finished'), {'time': time.time()})
+
+
+def task_of(point, order, logs_dir):
+    """ JSON task of a plan point, the config travels as JSON and is compiled again by the worker. """
+    content = json.dumps([point.spec, point.config.to_json(), point.repetition, point.workload], sort_keys=True)
+    return {
+        'id': '{:06d}-{}'.format(order, hashlib.sha1(content.encode('utf-8')).hexdigest()[:12]),
+        'logs_dir': logs_dir, 'attempts': 0,
+        'config': point.config.to_json(), 'repetition': point.repetition, 'workload': point.workload,
+        'capture': point.capture, 'metrics': point.metrics, 'spec': point.spec, 'cost': point.cost,
+    }
+
+
+def point_of(task, configs=None):
+    """ Plan point of a task, configs shared by several tasks are compiled once if a cache dict is given. """
+    key = json.dumps(task['config'], sort_keys=True)
+    configs = {} if configs is None else configs
+    if key not in configs:
+        configs[key] = TopoConfig(task['config'])
+    return sweep.Point(configs[key], task['repetition'], task['workload'], task['capture'], task['metrics'],
+                       task['spec'], task['cost'])
+
+
+def coordinate(queue, plan, base_folder='./logs', poll=2.0, timeout=300.0, status=None, archives=None):
+    """
+    Submit a plan to the queue and merge the results until every task is done.
+
+    :param plan:        list of sweep.Point
+    :param base_folder: log tree the results are merged into, completed experiments in it are not submitted
+    :param timeout:     seconds without heartbeat after which the tasks of a worker are put back
+    :param status:      progress.Progress to report to
+    :param archives:    dict sweep name -> archive.Archive the merged results are moved into, None keeps the log tree
+    """
+    status = status or progress.Progress()
+    status.planned = len(plan)
+
+    tasks, topo = [], None
+    for order, point in enumerate(plan):
+        if topo is None or topo.config is not point.config:
+            topo = JsonTopo(point.config)
+        logs_dir, first_client = topo.get_logs_dir(), topo.get_host_pairings()[0][0]
+        if MPMininetExp.completed(os.path.join(fct.log_folder(base_folder, point.workload), logs_dir),
+                                  point.repetition, first_client) or \
+                archives is not None and \
+                runner.sweep_archive(archives, point.spec, base_folder).has(logs_dir, point.repetition):
+            status.finish()
+            continue
+        tasks.append(task_of(point, order, logs_dir))
+    queue.submit(tasks)
+    pending = set(task['id'] for task in tasks) - set(queue.ids('merged'))
+    output('Submitted {} tasks to {}, {} experiments are already done.\n'.format(
+        len(tasks), queue.folder, len(plan) - len(tasks)))
+
+    configs = {}
+    while pending:
+        for outcome in queue.collect(base_folder):
+            task = outcome['task']
+            pending.discard(task['id'])
+            if archives is not None:
+                # the coordinator is the only writer, SQLite locking is not reliable on network file systems
+                runner.archive_experiment(archives, point_of(task, configs), task['logs_dir'], outcome.get('flows'),
+                                          dict((k, v) for k, v in outcome.items() if k not in ('task', 'flows')),
+                                          base_folder=base_folder)
+            name = '{}/{}'.format(task['logs_dir'], task['repetition'])
+            status.finish(outcome.get('phases'), outcome.get('flows'), failed=outcome['failed'], name=name,
+                          duration=outcome['duration'])
+            if outcome.get('error'):
+                warn('Task {} failed on {}: {}\n'.format(name, outcome['worker'], outcome['error'].splitlines()[-1]))
+            else:
+                info('Task {} done on {}\n'.format(name, outcome['worker']))
+        queue.requeue_stale(timeout)
+        status.workers = max(1, len(queue.workers(timeout)))
+        if pending:
+            time.sleep(poll)
+    queue.finish()
+    output('All tasks of {} are merged into {}.\n'.format(queue.folder, base_folder))
+
+
+class Worker(object):
+    """ Claim tasks one after the other and run them until the coordinator marks the queue finished. """
+    def __init__(self, queue, name=None, retries=2, poll=2.0, heartbeat=10.0, simulate=None, fault_retries=2,
+                 backoff=10.0):
+        """
+        :param name:            unique name of the worker, per default host name and process id
+        :param retries:         repetitions of a run which saturated the host
+        :param fault_retries:   retries of a run which failed with an error, see supervisor.Supervisor
+        :param backoff:         seconds to wait before the first retry of a failed run
+        :param heartbeat:       seconds between heartbeats, has to be well below the timeout of the coordinator
+        :param simulate:        seconds a simulated experiment takes, None runs the experiments
+        """
+        self.queue, self.name = queue, name or '{}-{}'.format(socket.gethostname(), os.getpid())
+        self.retries, self.poll, self.interval, self.simulate = retries, poll, heartbeat, simulate
+        self.supervisor = supervisor.Supervisor(retries=fault_retries, backoff=backoff)
+        self.task, self.stopped = None, threading.Event()
+        self._configs = {}
+
+    def _beat(self):
+        while not self.stopped.wait(self.interval):
+            self.queue.heartbeat(self.name, host=socket.gethostname(), pid=os.getpid(),
+                                 task=self.task['id'] if self.task else None)
+
+    def run(self):
+        self.queue.heartbeat(self.name, host=socket.gethostname(), pid=os.getpid(), task=None)
+        beat = threading.Thread(target=self._beat)
+        beat.daemon = True
+        beat.start()
+        done = 0
+        try:
+            while True:
+                self.task = self.queue.claim(self.name)
+                if self.task is None:
+                    if self.queue.finished:
+                        break
+                    time.sleep(self.poll)
+                    continue
+                self.run_task(self.task)
+                self.task, done = None, done + 1
+        finally:
+            self.stopped.set()
+        output('Worker {} ran {} tasks.\n'.format(self.name, done))
+        return done
+
+    def run_task(self, task):
+        """ Run a task into a private log tree and hand back its logs, failures are reported and not raised. """
+        log_folder = tempfile.mkdtemp(prefix='mptcp_worker_')
+        start = time.time()
+        info('Worker {} runs task {} {}/{}\n'.format(self.name, task['id'], task['logs_dir'], task['repetition']))
+        try:
+            point = point_of(task, self._configs)
+            topo = JsonTopo(point.config)
+            if self.simulate is not None:
+                outcome = simulate(topo, point, log_folder, self.simulate)
+            else:
+                exp = runner.run_experiment(topo, point, retries=self.retries, base_folder=log_folder,
+                                            supervise=self.supervisor)
+                if exp is None:
+                    # the failures file is part of the handed back logs
+                    outcome = {'failed': True, 'error': self.supervisor.failures[-1]['traceback']}
+                else:
+                    outcome = {'failed': exp.saturated, 'phases': exp.phases,
+                               'flows': runner.flow_summary(exp, point.metrics) if exp.phases else None}
+        except Exception:
+            outcome = {'failed': True, 'error': traceback.format_exc()}
+        outcome.update(worker=self.name, host=socket.gethostname(), duration=time.time() - start)
+        try:
+            self.queue.complete(self.name, task, log_folder, outcome)
+        finally:
+            shutil.rmtree(log_folder)
+
+
+def simulate(topo, point, log_folder, seconds):
+    """ Stand-in for an experiment, writes an iperf log per client after the given time. """
+    from benchmarks import synthetic
+    out_folder = os.path.join(log_folder, topo.get_logs_dir())
+    os.makedirs(out_folder)
+    time.sleep(seconds)
+    flows = {}
+    for client, _ in topo.get_host_pairings():
+        iperf_file = '{}/{}_{}_iperf.csv'.format(out_folder, point.repetition, client)
+        synthetic.write_iperf_log(iperf_file, duration=point.workload['runtime'], seed=point.repetition)
+        flows[client] = {'throughput [Mbps]': progress.iperf_sender_throughput(iperf_file)}
+    return {'failed': False, 'phases': {'iperf': seconds}, 'flows': flows}
+
+
+def main():
+    parser = ArgumentParser(description="Run sweeps on several experiment hosts over a shared directory")
+    parser.add_argument('role', choices=['coordinator', 'worker'])
+    parser.add_argument('--queue', '-q', required=True, help="Shared queue directory")
+    parser.add_argument('--sweep', action='append', help="Coordinator: sweep spec to run, can be given multiple times")
+    parser.add_argument('--topo', help="Coordinator: restrict the sweeps to this topology")
+    parser.add_argument('--base_folder', default='./logs', help="Coordinator: log tree the results are merged into")
+    parser.add_argument('--timeout', type=float, default=300,
+                        help="Coordinator: seconds without heartbeat after which the tasks of a worker are put back")
+    parser.add_argument('--archive', action='store_true',
+                        help="Coordinator: move the merged logs into <base_folder>/<sweep>.sqlite")
+    parser.add_argument('--status_port', type=int, help="Coordinator: serve the sweep progress on this port")
+    parser.add_argument('--status_host', default='127.0.0.1', help="Coordinator: address to serve the progress on")
+    parser.add_argument('--name', help="Worker: unique worker name, per default host name and process id")
+    parser.add_argument('--retries', type=int, default=2,
+                        help="Worker: repeat experiments invalidated by a saturated host up to this many times")
+    parser.add_argument('--fault_retries', type=int, default=2,
+                        help="Worker: retry experiments which failed with an error up to this many times")
+    parser.add_argument('--backoff', type=float, default=10,
+                        help="Worker: seconds to wait before retrying a failed experiment, tripled per retry")
+    parser.add_argument('--simulate', type=float, nargs='?', const=1.0,
+                        help="Use the stand-in Mininet, workers write synthetic logs after SIMULATE seconds")
+    parser.add_argument('--poll', type=float, default=2, help="Seconds between looking for new tasks or results")
+    parser.add_argument('--log', choices=['info', 'debug', 'output', 'warning', 'error', 'critical'],
+                        help="Mininet logging level")
+    args = parser.parse_args()
+    if args.log:
+        setLogLevel(args.log)
+
+    queue = TaskQueue(args.queue)
+    if args.role == 'coordinator':
+        if not args.sweep:
+            parser.error('the coordinator requires at least one --sweep')
+        plan = sweep.expand([sweep.load_spec(name) for name in args.sweep],
+                            topologies=[args.topo] if args.topo else None)
+        status = progress.Progress()
+        if args.status_port:
+            status.serve(args.status_port, args.status_host)
+        coordinate(queue, plan, base_folder=args.base_folder, poll=args.poll, timeout=args.timeout, status=status,
+                   archives={} if args.archive else None)
+    else:
+        Worker(queue, name=args.name, retries=args.retries, poll=args.poll, simulate=args.simulate,
+               fault_retries=args.fault_retries, backoff=args.backoff).run()
+
+
+if __name__ == '__main__':
+    main()